@@ -0,0 +1,76 @@
+"""
+Running the blocking views under ASGI.
+
+Under uvicorn every sync view is run through ``sync_to_async`` with
+``thread_sensitive=True``, i.e. on a single thread per worker, so one slow
+scrape or Paystack call would still hold up every other request. The views
+that spend their time waiting on the network (and still depend on sync
+libraries: DRF, django-ratelimit, cloudscraper, the Supabase client) are
+wrapped with :func:`offload`, which makes them async views that run on a
+dedicated thread pool instead.
+
+Views that use the ORM pass ``db=True``. They get a smaller pool because
+each thread keeps its own persistent database connection (CONN_MAX_AGE).
+Stale connections are closed before and after each call, since the
+request_started/finished signals only clean up the main thread's connection.
+
+The pool thread also registers itself with the slow-request profiler
+(``bookhub.profiling``) while it runs the view.
+
+The native async views (search, new releases, book detail and its batch,
+genre books, the cover proxy) fetch through the httpx client in
+``scraper.async_fetch`` and run on the event loop itself. The cache, Redis
+and django-ratelimit clients they share with the sync code all block, so
+they await those calls through :func:`run_blocking`, on the same pool as
+the offloaded views.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .profiling import attached
+
+_executors = {}
+
+
+def _executor(db):
+    name = 'db' if db else 'io'
+    if name not in _executors:
+        size = settings.ASYNC_DB_VIEW_THREADS if db else settings.ASYNC_VIEW_THREADS
+        _executors[name] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"view-{name}")
+    return _executors[name]
+
+
+def _call_with_db(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _call(view, db, request, *args, **kwargs):
+    with attached():
+        if db:
+            return _call_with_db(view, request, *args, **kwargs)
+        return view(request, *args, **kwargs)
+
+
+def offload(view=None, *, db=False):
+    """Turn a blocking view into an async view that runs on the shared view thread pool."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            run = sync_to_async(_call, thread_sensitive=False, executor=_executor(db))
+            return await run(view, db, request, *args, **kwargs)
+        return wrapper
+
+    return decorator(view) if view is not None else decorator
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Await a blocking call from a native async view without stalling the event loop."""
+    return await sync_to_async(func, thread_sensitive=False, executor=_executor(False))(*args, **kwargs)
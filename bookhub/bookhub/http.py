@@ -0,0 +1,17 @@
+from django.http import HttpResponse
+
+from .renderers import dumps
+
+
+class JsonResponse(HttpResponse):
+    """Drop-in replacement for ``django.http.JsonResponse`` that serializes with orjson."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the safe parameter to False."
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+        # Like DRF's Response.data, for decorators that post-process the payload
+        self.data = data
@@ -0,0 +1,216 @@
+"""
+Prometheus metrics for the API, served at ``/metrics`` to scrapers holding METRICS_TOKEN.
+
+Under gunicorn every worker process writes its samples to
+PROMETHEUS_MULTIPROC_DIR (set in the Dockerfile and cleared on start by
+gunicorn.conf.py). The ``/metrics`` view merges them, so the scrape sees
+totals for the whole machine and not just the worker that answered. Without
+that variable (``runserver``) the default in-process registry is used.
+
+What's recorded:
+
+* ``http_request_duration_seconds`` — per route, method and status (MetricsMiddleware)
+* ``upstream_fetch_duration_seconds`` — scraper fetches by host and status
+* ``scraper_cache_events_total`` — hit / miss / stale per key family
+* ``parser_duration_seconds`` — per parser function
+* ``pdf_clean_duration_seconds`` / ``pdf_clean_pages`` — watermark removal
+* ``external_call_duration_seconds`` — Paystack and Supabase calls by operation and outcome
+"""
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .tracing import span
+
+# Only gunicorn.conf.py empties and recreates this directory; management commands, cron jobs
+# and the webhooks process import this module without it, and unlabelled metrics open their
+# sample files right away
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'API request latency',
+    ['route', 'method', 'status'],
+)
+UPSTREAM_FETCH = Histogram(
+    'upstream_fetch_duration_seconds', 'Upstream page fetch latency',
+    ['host', 'status'], buckets=UPSTREAM_BUCKETS,
+)
+CACHE_EVENTS = Counter(
+    'scraper_cache_events', 'Scraper cache lookups',
+    ['family', 'result'],
+)
+PARSE_TIME = Histogram(
+    'parser_duration_seconds', 'HTML parse time',
+    ['parser'], buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+PDF_CLEAN_TIME = Histogram(
+    'pdf_clean_duration_seconds', 'PDF watermark removal time',
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+PDF_CLEAN_PAGES = Histogram(
+    'pdf_clean_pages', 'Pages per cleaned PDF',
+    buckets=(10, 50, 100, 200, 400, 800, 1600),
+)
+EXTERNAL_CALL = Histogram(
+    'external_call_duration_seconds', 'Paystack / Supabase call latency',
+    ['service', 'operation', 'outcome'], buckets=UPSTREAM_BUCKETS,
+)
+
+# Cache keys embed queries, slugs and pages; collapse them to a bounded label set.
+# Order matters: the first matching prefix wins.
+CACHE_FAMILIES = (
+    ('lkg_', 'backup'),
+    ('genre_books_', 'genre_books'),
+    ('genre_detail_', 'genre_detail'),
+    ('search_results_', 'search'),
+    ('search_', 'search_html'),
+    ('books_', 'genre_html'),
+    ('book_', 'book_detail'),
+)
+
+
+def key_family(cache_key):
+    """``new_releases``, ``search``, ``book_detail``... for a cache key."""
+    cache_key = cache_key.split(':', 1)[0]
+    for prefix, family in CACHE_FAMILIES:
+        if cache_key.startswith(prefix):
+            return family
+    return cache_key
+
+
+def record_cache(cache_key, result):
+    """``result`` is ``hit``, ``miss``, ``stale`` (served a last-known-good copy) or ``coalesced`` (shared another caller's fetch)."""
+    CACHE_EVENTS.labels(key_family(cache_key), result).inc()
+
+
+@contextmanager
+def time_upstream(host):
+    """Time an upstream fetch; set ``state['status']`` inside the block."""
+    state = {'status': 'error'}
+    start = time.perf_counter()
+    try:
+        yield state
+    finally:
+        UPSTREAM_FETCH.labels(host, str(state['status'])).observe(time.perf_counter() - start)
+
+
+def timed_parser(func):
+    histogram = PARSE_TIME.labels(func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with histogram.time():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def external_call(service, operation=None):
+    """
+    Time and trace a Paystack/Supabase helper. The outcome is ``error`` when
+    it raises or returns a Paystack-style ``{"status": False}``.
+    """
+    def decorator(func):
+        name = operation or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            outcome = 'error'
+            start = time.perf_counter()
+            with span(f"{service}.{name}", **{'peer.service': service}) as current:
+                try:
+                    result = func(*args, **kwargs)
+                    if not (isinstance(result, dict) and result.get('status') is False):
+                        outcome = 'ok'
+                    return result
+                finally:
+                    current.set_attribute('outcome', outcome)
+                    EXTERNAL_CALL.labels(service, name, outcome).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class InstrumentedProxy:
+    """Wraps an SDK object (e.g. ``supabase.auth``) so every method call is timed."""
+
+    def __init__(self, target, service, prefix):
+        self._target = target
+        self._service = service
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        operation = f"{self._prefix}.{name}"
+        if name == 'admin':
+            return InstrumentedProxy(attr, self._service, operation)
+        if callable(attr):
+            return external_call(self._service, operation)(attr)
+        return attr
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match else 'unmatched'
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, start)
+        return response
+
+    def _observe(self, request, response, start):
+        route = _route(request)
+        if route == 'metrics':
+            return
+        REQUEST_LATENCY.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - start)
+
+
+def metrics_view(request):
+    # No token configured: the endpoint doesn't exist
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponseForbidden()
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,63 @@
+import gzip
+import re
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+_accepts_br = re.compile(r'\bbr\b')
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def preferred_encoding(request):
+    """'br', 'gzip' or None, from the request's Accept-Encoding header."""
+    accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if _accepts_br.search(accept):
+        return 'br'
+    if _accepts_gzip.search(accept):
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding, quality=None):
+    if encoding == 'br':
+        return brotli.compress(content, quality=quality or settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=quality or settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli (preferred) or gzip compression for API responses of at least
+    COMPRESSION_MIN_BYTES. Like Django's GZipMiddleware it skips streaming
+    responses and anything already encoded, and weakens strong ETags since
+    the bytes on the wire no longer match the identity representation.
+    MiddlewareMixin keeps it usable from the async (uvicorn) request path.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = preferred_encoding(request)
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,216 @@
+"""
+Opt-in sampling profiler for slow requests (PROFILING_ENABLED).
+
+While a request is in flight a background thread snapshots the stack of
+the thread running its view every PROFILING_INTERVAL_MS. Requests that end
+up slower than PROFILING_THRESHOLD_MS have their samples written as folded
+stacks (one ``frame;frame;frame count`` line per distinct stack, the input
+format of flamegraph.pl and speedscope) under
+``PROFILING_DIR/<url name>/``. Each endpoint keeps its newest
+PROFILING_MAX_PER_ENDPOINT profiles, none older than PROFILING_MAX_AGE.
+
+Under uvicorn the view runs on an ``offload`` pool thread, which registers
+itself through :func:`attached`. Native async views share the event loop
+thread with every other request and are not sampled.
+
+Staff (Django admin) users can list the profiles at ``/api/profiles/`` and
+download one from ``/api/profiles/<endpoint>/<name>``.
+"""
+import asyncio
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+
+from .http import JsonResponse
+from .tracing import trace_id_hex
+
+_current = contextvars.ContextVar('profile', default=None)
+
+_safe_name = re.compile(r'^[\w.-]+$')
+
+
+class Profile:
+    def __init__(self):
+        self.stacks = Counter()
+        self.threads = set()
+
+
+def fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """One per process; sleeps while no request is being profiled."""
+
+    def __init__(self, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.interval = interval
+        self.targets = {}
+        self.lock = threading.Lock()
+        self.busy = threading.Event()
+
+    def add(self, thread_id, profile):
+        with self.lock:
+            self.targets[thread_id] = profile
+            self.busy.set()
+
+    def remove(self, thread_id):
+        with self.lock:
+            self.targets.pop(thread_id, None)
+            if not self.targets:
+                self.busy.clear()
+
+    def run(self):
+        while True:
+            self.busy.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                targets = list(self.targets.items())
+            frames = sys._current_frames()
+            for thread_id, profile in targets:
+                if (frame := frames.get(thread_id)) is not None:
+                    profile.stacks[fold(frame)] += 1
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = Sampler(settings.PROFILING_INTERVAL_MS / 1000)
+                _sampler.start()
+    return _sampler
+
+
+@contextmanager
+def attached():
+    """Sample the calling thread for the request being profiled, if any."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler = get_sampler()
+    sampler.add(thread_id, profile)
+    try:
+        yield
+    finally:
+        sampler.remove(thread_id)
+
+
+def endpoint_dir(endpoint):
+    return Path(settings.PROFILING_DIR) / endpoint
+
+
+def prune(directory):
+    files = sorted(directory.glob('*.folded'), key=lambda p: p.stat().st_mtime, reverse=True)
+    cutoff = time.time() - settings.PROFILING_MAX_AGE
+    for index, path in enumerate(files):
+        if index >= settings.PROFILING_MAX_PER_ENDPOINT or path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+
+def save(endpoint, profile, elapsed_ms, trace_id):
+    directory = endpoint_dir(endpoint)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{elapsed_ms}ms-{trace_id or os.getpid()}.folded"
+    tmp = directory / f".{name}.tmp"
+    tmp.write_text(''.join(f"{stack} {count}\n" for stack, count in profile.stacks.most_common()))
+    os.replace(tmp, directory / name)
+    prune(directory)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with attached():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        if result := self._slow(request, profile, start):
+            save(*result)
+        return response
+
+    async def __acall__(self, request):
+        profile = Profile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        if result := self._slow(request, profile, start):
+            await asyncio.to_thread(save, *result)
+        return response
+
+    def _slow(self, request, profile, start):
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.url_name if match else None) or 'unmatched'
+        if elapsed_ms < settings.PROFILING_THRESHOLD_MS or not profile.stacks or endpoint.startswith('profile'):
+            return None
+        return endpoint, profile, elapsed_ms, trace_id_hex()
+
+
+@staff_member_required
+def profile_list(request):
+    root = Path(settings.PROFILING_DIR)
+    profiles = []
+    if root.is_dir():
+        for path in root.glob('*/*.folded'):
+            stat = path.stat()
+            profiles.append({
+                'endpoint': path.parent.name,
+                'name': path.name,
+                'size': stat.st_size,
+                'created': int(stat.st_mtime),
+                'url': request.build_absolute_uri(f"/api/profiles/{path.parent.name}/{path.name}"),
+            })
+    profiles.sort(key=lambda p: p['created'], reverse=True)
+    return JsonResponse({'count': len(profiles), 'results': profiles})
+
+
+@staff_member_required
+def profile_download(request, endpoint, name):
+    if not (_safe_name.match(endpoint) and _safe_name.match(name)) or not name.endswith('.folded'):
+        raise Http404
+    path = endpoint_dir(endpoint) / name
+    if not path.is_file():
+        raise Http404
+    return FileResponse(path.open('rb'), as_attachment=True, filename=name, content_type='text/plain')
@@ -0,0 +1,37 @@
+"""
+orjson-based JSON serialization for the API.
+
+``ORJSONRenderer`` replaces DRF's JSONRenderer (see REST_FRAMEWORK in
+settings) and ``bookhub.http.JsonResponse`` replaces Django's JsonResponse
+in the plain Django views. Both go through :func:`dumps`, which covers the
+same extra types as DjangoJSONEncoder: datetimes, UUIDs, Decimals and lazy
+translation strings.
+"""
+from decimal import Decimal
+
+import orjson
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    if isinstance(obj, (Decimal, Promise)):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    return orjson.dumps(data, default=_default, option=OPTIONS)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
@@ -40,8 +40,14 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'x-csrftoken',
     'x-requested-with',
+    'traceparent',
+    'tracestate',
 ]
 
+# Lets the frontend read the trace id of a slow response (bookhub/tracing.py)
+# and whether a listing came from the scrape cache (scraper/http_cache.py)
+CORS_EXPOSE_HEADERS = ['x-trace-id', 'x-cache']
+
 LIVE_URL = config('LIVE_URL', default=None)
 
 # CSRF Configuration - ADD THIS:
@@ -73,6 +79,66 @@ API_BASE_URL = config('API_BASE_URL')
 REQUEST_TIMEOUT = 10
 SCRAPE_CACHE_TIMEOUT = 60 * 60 * 4
 
+# BeautifulSoup backend for the scraper parsers: 'html.parser' or 'lxml' (see manage.py bench_parsers)
+HTML_PARSER = config('HTML_PARSER', default='html.parser')
+
+# Turn off django-ratelimit for local load tests against the upstream stub
+RATELIMIT_ENABLE = config('RATELIMIT_ENABLE', default=True, cast=bool)
+
+# Upstream politeness limits, enforced per host across all workers (scraper/throttle.py)
+UPSTREAM_RATE_LIMIT = config('UPSTREAM_RATE_LIMIT', default=2.0, cast=float)  # requests/second
+UPSTREAM_BURST = config('UPSTREAM_BURST', default=5, cast=int)
+UPSTREAM_MAX_CONCURRENCY = config('UPSTREAM_MAX_CONCURRENCY', default=4, cast=int)
+UPSTREAM_LEASE_SECONDS = 30  # a crashed worker's slot is reclaimed after this
+UPSTREAM_MAX_WAIT = config('UPSTREAM_MAX_WAIT', default=10, cast=float)
+UPSTREAM_BACKOFF_BASE = 5
+UPSTREAM_BACKOFF_MAX = 60 * 10
+
+# Circuit breaker around upstream fetches (scraper/breaker.py)
+UPSTREAM_BREAKER_THRESHOLD = config('UPSTREAM_BREAKER_THRESHOLD', default=5, cast=int)
+UPSTREAM_BREAKER_WINDOW = 60  # failures further apart than this don't add up
+UPSTREAM_BREAKER_COOLDOWN = config('UPSTREAM_BREAKER_COOLDOWN', default=30, cast=int)
+SCRAPE_BACKUP_TIMEOUT = 60 * 60 * 24 * 30  # last-known-good copies served in degraded mode
+
+# Bulk fetches through scraper/async_fetch.py (still bounded by the per-host limits above)
+ASYNC_FETCH_CONCURRENCY = config('ASYNC_FETCH_CONCURRENCY', default=8, cast=int)
+
+# Largest ?limit= accepted by the listing endpoints (scraper/pagination.py)
+LISTING_MAX_LIMIT = 100
+
+# Cover image proxy (/api/cover/, scraper/images.py)
+COVER_PROXY_ENABLED = config('COVER_PROXY_ENABLED', default=True, cast=bool)
+COVER_PROXY_BASE = config('COVER_PROXY_BASE', default=f"https://{BACKEND_URL}")
+COVER_PROXY_HOSTS = ('oceanofpdf.com', 'i0.wp.com', 'i1.wp.com', 'i2.wp.com')
+COVER_THUMB_WIDTHS = (160, 320, 640)
+COVER_THUMB_DEFAULT_WIDTH = 320
+COVER_CACHE_DIR = config('COVER_CACHE_DIR', default=os.path.join(BASE_DIR, 'cover_cache'))
+COVER_CACHE_MAX_BYTES = config('COVER_CACHE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+COVER_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+
+# Thread pools for the blocking views served under uvicorn (bookhub/async_views.py).
+# The ORM pool is small: every thread holds its own persistent DB connection.
+ASYNC_VIEW_THREADS = config('ASYNC_VIEW_THREADS', default=64, cast=int)
+ASYNC_DB_VIEW_THREADS = config('ASYNC_DB_VIEW_THREADS', default=8, cast=int)
+
+# POST /api/book-detail/batch/: max slugs per request and parallel upstream fetches for the misses
+BOOK_DETAIL_BATCH_MAX = config('BOOK_DETAIL_BATCH_MAX', default=40, cast=int)
+BOOK_DETAIL_BATCH_CONCURRENCY = config('BOOK_DETAIL_BATCH_CONCURRENCY', default=6, cast=int)
+
+# Cache warming (scraper/warming.py); keep CACHE_WARM_INTERVAL in step with the CRONJOBS entry
+SCRAPE_TTL_JITTER = 0.15  # parsed keys expire somewhere in the last 15% of their TTL
+CACHE_WARM_INTERVAL = 60 * 30
+CACHE_WARM_GENRES = config('CACHE_WARM_GENRES', default=20, cast=int)
+
+# Per-worker LRU in front of Redis for hot read-mostly keys (scraper/local_cache.py)
+LOCAL_CACHE_KEYS = ('genres_list', 'new_releases', 'magazines', 'genre_books_*')
+LOCAL_CACHE_TTL = config('LOCAL_CACHE_TTL', default=60, cast=int)
+LOCAL_CACHE_MAX_BYTES = config('LOCAL_CACHE_MAX_BYTES', default=16 * 1024 * 1024, cast=int)
+
+# Cache value codec (scraper/codec.py): values above this size are zstd-compressed
+CACHE_COMPRESS_MIN_BYTES = 1024
+CACHE_COMPRESS_LEVEL = 3
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -94,7 +160,11 @@ INSTALLED_APPS = [
 # MIDDLEWARE - MOVE CORS MIDDLEWARE TO TOP
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # ← SHOULD BE AT THE TOP
+    'bookhub.tracing.TracingMiddleware',
+    'bookhub.metrics.MetricsMiddleware',
+    'bookhub.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'bookhub.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -103,6 +173,94 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Response compression (bookhub/middleware.py); smaller bodies aren't worth the CPU
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_GZIP_LEVEL = 6
+
+# Per-user subscription access records behind /api/check-subscription/ (subscriptions/entitlements.py).
+# Writes invalidate them; the timeout only bounds the damage of a missed invalidation.
+ENTITLEMENT_CACHE_TIMEOUT = 60 * 10
+
+# Per-user saved card summaries behind the card management views (subscriptions/cards.py); writes invalidate them
+CARD_SUMMARY_CACHE_TIMEOUT = 60 * 10
+
+# Largest page of /api/subscription-timeline/ (subscriptions/ledger.py)
+SUBSCRIPTION_TIMELINE_MAX_LIMIT = 100
+
+# Paystack webhook processing (subscriptions/webhooks.py): background workers per process,
+# attempts before an event is dead-lettered, and the first retry delay (doubling each time)
+WEBHOOK_WORKERS = config('WEBHOOK_WORKERS', default=4, cast=int)
+WEBHOOK_MAX_ATTEMPTS = 6
+WEBHOOK_RETRY_BASE = 30
+
+# Trial-expiry billing (subscriptions/billing.py): subscriptions per chunk/checkpoint and parallel charges
+BILLING_CHUNK_SIZE = config('BILLING_CHUNK_SIZE', default=200, cast=int)
+BILLING_CONCURRENCY = config('BILLING_CONCURRENCY', default=8, cast=int)
+
+# Paystack API client (subscriptions/paystack.py). Point PAYSTACK_BASE_URL at `manage.py fake_paystack`
+# for offline tests. Only GETs are retried on timeouts/5xx; the pool should cover BILLING_CONCURRENCY.
+PAYSTACK_BASE_URL = config('PAYSTACK_BASE_URL', default='https://api.paystack.co')
+PAYSTACK_CONNECT_TIMEOUT = config('PAYSTACK_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYSTACK_READ_TIMEOUT = config('PAYSTACK_READ_TIMEOUT', default=20, cast=float)
+PAYSTACK_RETRIES = config('PAYSTACK_RETRIES', default=2, cast=int)
+PAYSTACK_POOL_SIZE = config('PAYSTACK_POOL_SIZE', default=16, cast=int)
+
+# Transaction verification cache (subscriptions/verification.py): terminal outcomes are kept for days,
+# pending ones a few seconds; other workers wait up to VERIFICATION_COALESCE_WAIT for an in-flight verify
+VERIFICATION_RESULT_TIMEOUT = 60 * 60 * 24 * 3
+VERIFICATION_PENDING_TIMEOUT = 5
+VERIFICATION_COALESCE_WAIT = 3
+
+# Prometheus scrape endpoint (bookhub/metrics.py): /metrics requires "Authorization: Bearer <token>"
+# and answers 404 while no token is set.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# OpenTelemetry tracing (bookhub/tracing.py). TRACING_EXPORTER is none, console or file;
+# ids are generated (for logs and the X-Trace-Id header) even when nothing is exported.
+TRACING_EXPORTER = config('TRACING_EXPORTER', default='none')
+TRACING_FILE = config('TRACING_FILE', default=str(BASE_DIR / 'traces' / 'spans-{pid}.jsonl'))
+TRACING_SAMPLE_RATIO = config('TRACING_SAMPLE_RATIO', default=1.0, cast=float)
+TRACING_SERVICE_NAME = config('TRACING_SERVICE_NAME', default='bookhub-api')
+
+# Sampling profiler for slow requests (bookhub/profiling.py), off unless PROFILING_ENABLED
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_THRESHOLD_MS = config('PROFILING_THRESHOLD_MS', default=2000, cast=int)
+PROFILING_INTERVAL_MS = config('PROFILING_INTERVAL_MS', default=10, cast=int)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_PER_ENDPOINT = config('PROFILING_MAX_PER_ENDPOINT', default=20, cast=int)
+PROFILING_MAX_AGE = 60 * 60 * 24 * 7
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_context': {'()': 'bookhub.tracing.TraceContextFilter'},
+    },
+    'formatters': {
+        'traced': {
+            'format': '%(asctime)s %(levelname)s %(name)s [trace_id=%(trace_id)s span_id=%(span_id)s] %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['trace_context'],
+            'formatter': 'traced',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': config('LOG_LEVEL', default='INFO'),
+    },
+}
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'bookhub.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
 
 ROOT_URLCONF = 'bookhub.urls'
 
@@ -124,6 +282,9 @@ TEMPLATES = [
 
 CRONJOBS = [
     ('0 0 * * *', 'django.core.management.call_command', ['handle_expired_trials']),
+    ('*/30 * * * *', 'django.core.management.call_command', ['warm_cache']),
+    ('* * * * *', 'django.core.management.call_command', ['process_webhooks']),
+    ('*/5 * * * *', 'django.core.management.call_command', ['expire_subscriptions']),
 ]
 
 WSGI_APPLICATION = 'bookhub.wsgi.application'
@@ -149,6 +310,8 @@ if SUPABASE_DB_URL:
             'HOST': url.hostname,
             'PORT': url.port or 6543,  # Use 6543 for pooler
             'CONN_MAX_AGE': 300,
+            # Named cursors (QuerySet.iterator()) don't survive the transaction pooler
+            'DISABLE_SERVER_SIDE_CURSORS': True,
             'OPTIONS': {
                 'connect_timeout': 10,
                 'sslmode': 'require',
@@ -169,6 +332,9 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # SQLite has no covering indexes: the timeline index (subscriptions.SubscriptionEvent) is
+    # created without its INCLUDE columns, which only matter for index-only scans on PostgreSQL
+    SILENCED_SYSTEM_CHECKS = ['models.W040']
 
 # DEBUG: Print final database config
 print("=== FINAL DATABASE CONFIG ===")
@@ -228,6 +394,8 @@ CACHES = {
     "LOCATION": REDIS_URL,
     "OPTIONS": {
         "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        "SERIALIZER": "scraper.codec.ScraperSerializer",
+        "COMPRESSOR": "scraper.codec.ScraperCompressor",
         "SSL": True,
         "ssl_cert_reqs": None,
     },
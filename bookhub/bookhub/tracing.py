@@ -0,0 +1,152 @@
+"""
+OpenTelemetry tracing: where the time of a slow request went.
+
+TracingMiddleware opens a server span per request (continuing an incoming
+W3C ``traceparent`` if there is one) and returns its id in ``X-Trace-Id``.
+Child spans cover upstream fetches, parsers, cache reads/writes, PDF
+redaction and the Paystack/Supabase calls; :class:`TraceContextFilter` puts
+the current ids on every log record.
+
+Where spans go is set by TRACING_EXPORTER:
+
+* ``none`` — ids are still generated for logs and headers, nothing is exported
+* ``console`` — one JSON span per line on stdout
+* ``file`` — the same, appended to TRACING_FILE (``{pid}`` expands to the worker pid)
+
+Only ``opentelemetry-sdk`` is needed; no collector has to be running.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+tracer = trace.get_tracer('bookhub')
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _span_line(span):
+    return json.dumps(json.loads(span.to_json()), separators=(',', ':')) + '\n'
+
+
+def configure():
+    """Install the tracer provider and exporter once per process."""
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        provider = TracerProvider(
+            resource=Resource.create({'service.name': settings.TRACING_SERVICE_NAME}),
+            sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+        )
+        if settings.TRACING_EXPORTER == 'console':
+            provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(formatter=_span_line)))
+        elif settings.TRACING_EXPORTER == 'file':
+            path = settings.TRACING_FILE.format(pid=os.getpid())
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            out = open(path, 'a', buffering=1)
+            provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(out=out, formatter=_span_line)))
+        trace.set_tracer_provider(provider)
+        _configured = True
+
+
+def trace_id_hex(span=None):
+    context = (span or trace.get_current_span()).get_span_context()
+    return format(context.trace_id, '032x') if context.is_valid else None
+
+
+def set_attributes(**attributes):
+    """Attach attributes to the current span (no-op outside a trace)."""
+    trace.get_current_span().set_attributes({k: v for k, v in attributes.items() if v is not None})
+
+
+@contextmanager
+def span(name, **attributes):
+    with tracer.start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None}) as current:
+        yield current
+
+
+def traced(name=None, **attributes):
+    """Run a sync or async function inside a span named ``name`` (default: its module and name)."""
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceContextFilter:
+    """Logging filter adding ``trace_id`` and ``span_id`` ("-" outside a request)."""
+
+    def filter(self, record):
+        context = trace.get_current_span().get_span_context()
+        record.trace_id = format(context.trace_id, '032x') if context.is_valid else '-'
+        record.span_id = format(context.span_id, '016x') if context.is_valid else '-'
+        return True
+
+
+class TracingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        configure()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self._span(request) as current:
+            response = self.get_response(request)
+            return self._finish(current, request, response)
+
+    async def __acall__(self, request):
+        with self._span(request) as current:
+            response = await self.get_response(request)
+            return self._finish(current, request, response)
+
+    def _span(self, request):
+        return tracer.start_as_current_span(
+            request.method,
+            context=propagate.extract(request.headers),
+            kind=SpanKind.SERVER,
+            attributes={'http.request.method': request.method, 'url.path': request.path},
+        )
+
+    def _finish(self, current, request, response):
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            current.update_name(f"{request.method} {match.route}")
+            current.set_attribute('http.route', match.route)
+        current.set_attribute('http.response.status_code', response.status_code)
+        if response.status_code >= 500:
+            current.set_status(Status(StatusCode.ERROR))
+        if trace_id := trace_id_hex(current):
+            response['X-Trace-Id'] = trace_id
+        return response
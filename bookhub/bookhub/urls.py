@@ -4,13 +4,15 @@ from scraper.views import (
     search,
     new_releases,
     book_detail,
+    book_detail_batch,
     download_proxy,
     test_download,
     magazines,
     genres,
     genre_books,
     genre_detail,
-    popular_genres
+    popular_genres,
+    cover_image
 )
 from django.contrib import admin
 from django.urls import path
@@ -43,15 +45,22 @@ from subscriptions.views import (
     set_default_card,
     remove_card,
     card_update_callback,
-    test_add_card
+    test_add_card,
+    subscription_timeline
     )
 from customers import google_oauth
+from bookhub.metrics import metrics_view
+from bookhub.profiling import profile_download, profile_list
 from customers.test_gauth import GoogleOAuthCallbackView, TestSupabaseConnectionView, GoogleOAuthInitView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/profiles/', profile_list, name='profile_list'),
+    path('api/profiles/<str:endpoint>/<str:name>', profile_download, name='profile_download'),
     path('api/search/', search, name='search'),
     path('api/new-releases/', new_releases, name='new_releases'),
+    path('api/book-detail/batch/', book_detail_batch, name='book_detail_batch'),
     path('api/book-detail/<path:book_slug>/', book_detail, name='book_detail'),
     path('api/download/', download_proxy, name='download_proxy'),
     # path('api/debug-scrape/', debug_scrape),
@@ -61,6 +70,7 @@ urlpatterns = [
     path('api/download-magazine/', download_magazine, name='download_magazine'),
     path('api/genres/', genres, name='genres'),
     path('api/genres/popular/', popular_genres, name='popular_genres'),
+    path('api/cover/', cover_image, name='cover_image'),
     path('api/genres/<str:genre_slug>/', genre_detail, name='genre_detail'),
     path('api/genres/<str:genre_slug>/books/', genre_books, name='genre_books'),
 
@@ -73,6 +83,7 @@ urlpatterns = [
     path('api/paystack-webhook/', paystack_webhook, name='paystack_webhook'),
     path("api/sub-starttrial/", start_trial, name="sub_start"),
     path("api/check-subscription/", check_subscription_status, name="check_subscription"),
+    path("api/subscription-timeline/", subscription_timeline, name="subscription_timeline"),
     path('api/payment-callback/', payment_callback, name='payment_callback'),
 
     # Subs endpoints
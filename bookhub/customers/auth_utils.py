@@ -1,7 +1,7 @@
 # auth_utils.py
 import jwt
 from functools import wraps
-from django.http import JsonResponse
+from bookhub.http import JsonResponse
 from django.conf import settings
 from jwt import InvalidTokenError
 import logging
@@ -1,7 +1,8 @@
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse
+from bookhub.http import JsonResponse
+from bookhub.async_views import offload
 from .supabase_client import get_supabase
 from django_ratelimit.decorators import ratelimit
 
@@ -37,6 +38,7 @@ def _set_session_cookies(response, session, remember_me=True):
 
 
 # authviews.py - Update your login function
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/m', block=False) 
@@ -90,6 +92,7 @@ def login(request):
         print(f"Login error: {e}")
         return JsonResponse({"error": "Server error"}, status=500)
 
+@offload
 @csrf_exempt
 @require_POST
 def logout(request):
@@ -107,6 +110,7 @@ def logout(request):
     return response
 
 
+@offload
 @csrf_exempt
 @require_POST
 def refresh_token(request):
@@ -124,6 +128,7 @@ def refresh_token(request):
     _set_session_cookies(response, session)
     return response
 
+@offload
 @csrf_exempt
 @require_POST
 def check_auth_status(request):
@@ -185,6 +190,7 @@ def check_auth_status(request):
     return JsonResponse({"authenticated": False}, status=200)
 
 from rest_framework.response import Response
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/m', block=False)
@@ -268,6 +274,7 @@ def change_password(request):
     
 
 # views.py
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/h', block=False)
@@ -336,11 +343,12 @@ from supabase_auth._sync.gotrue_client import SyncGoTrueClient
 
 import json
 import jwt
-from django.http import JsonResponse
+from bookhub.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from .supabase_client import get_supabase
 
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/h', block=False)
@@ -397,6 +405,7 @@ def reset_password(request):
         return JsonResponse({"error": str(e)}, status=500)
     
 
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/h', block=False)
@@ -462,6 +471,7 @@ def resend_confirmation_email(request):
             "message": "If your email is registered, a confirmation email has been sent"
         }, status=200)
 
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/h', block=False)
@@ -501,6 +511,7 @@ def check_email_confirmation(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@offload
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/h', block=False)
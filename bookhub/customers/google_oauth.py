@@ -4,7 +4,8 @@ import secrets
 import logging
 from urllib.parse import urlencode
 
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect
+from bookhub.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.models import User
@@ -4,6 +4,8 @@
 from supabase import create_client, Client
 from django.conf import settings
 
+from bookhub.metrics import InstrumentedProxy
+
 
 def get_supabase() -> Client | None:
     """
@@ -23,6 +25,8 @@ def get_supabase() -> Client | None:
             #     "storage_client_timeout": 60,
             # }
         )
+        # Time every auth / auth.admin call for the metrics endpoint
+        supabase.auth = InstrumentedProxy(supabase.auth, 'supabase', 'auth')
         return supabase
 
     except Exception as e:
@@ -1,5 +1,6 @@
 # views.py
-from django.http import JsonResponse
+from bookhub.http import JsonResponse
+from bookhub.async_views import offload
 from .auth_utils import verify_supabase_jwt
 import jwt
 import logging
@@ -7,6 +8,7 @@ import logging
 logger = logging.getLogger(__name__)
 from django_ratelimit.decorators import ratelimit
 
+@offload(db=True)
 @ratelimit(key='ip', rate='60/m', block=False)
 def me(request):
     logger.info("=== /api/me/ endpoint called ===")
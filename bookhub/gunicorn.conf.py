@@ -0,0 +1,22 @@
+"""
+Gunicorn hooks for the Prometheus multiprocess mode (bookhub/metrics.py).
+
+Each worker writes its samples to PROMETHEUS_MULTIPROC_DIR. The directory is
+emptied when the master starts, so counters don't carry over from a previous
+deploy, and a worker's live gauges are dropped when it exits.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
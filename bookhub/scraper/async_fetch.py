@@ -0,0 +1,217 @@
+"""
+Asyncio fetch engine for fan-out scraping.
+
+``amake_request`` mirrors :func:`scraper.utils.make_request` (same
+arguments, response object or ``None``) but runs on a pooled HTTP/2
+``httpx.AsyncClient``. ``fetch_many`` is the blocking entry point for bulk
+jobs: it fetches a list of URLs concurrently, bounded both locally by
+ASYNC_FETCH_CONCURRENCY and globally by the per-host limits in
+``scraper.throttle``.
+
+httpx cannot solve Cloudflare challenges, so a challenged URL is retried
+once through the cloudscraper-based ``make_request`` in a worker thread.
+
+The breaker and throttle bookkeeping talks to Redis through the sync
+client, so it also runs in worker threads, never on the event loop.
+
+``ascrape_html``, ``ascrape_book_details`` and ``aget_genre_by_slug`` are
+the async counterparts of the ``scrape_*`` helpers in ``scraper.utils``
+used by the native async views: same cache keys and return values, with
+the cache traffic awaited through :func:`bookhub.async_views.run_blocking`
+and the parsing done in a thread.
+"""
+import asyncio
+import logging
+import weakref
+
+import httpx
+from django.conf import settings
+
+from bookhub.async_views import run_blocking
+from bookhub.metrics import time_upstream
+from bookhub.tracing import set_attributes, traced
+
+from . import breaker
+from .caching import cache_lookup, cache_parsed, cache_store, get_parsed, last_known_good
+from .throttle import (
+    UpstreamThrottled,
+    async_upstream_slot,
+    get_host,
+    is_throttle_response,
+    register_success,
+    register_throttle,
+)
+from .utils import (
+    DEFAULT_HEADERS,
+    NOT_FOUND,
+    NOT_FOUND_STATUSES,
+    book_cache_key,
+    find_genre,
+    genres_page,
+    make_request,
+    parse_book_details,
+    parse_genres,
+    probe_upstream,
+)
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per event loop; httpx clients cannot be shared across loops.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=True,
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(15, connect=5),
+            limits=httpx.Limits(
+                max_connections=settings.ASYNC_FETCH_CONCURRENCY,
+                max_keepalive_connections=settings.ASYNC_FETCH_CONCURRENCY,
+            ),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def _record_throttle(host, retry_after):
+    register_throttle(host, retry_after)
+    breaker.record_failure(host)
+
+
+def _record_success(host):
+    register_success(host)
+    breaker.record_success(host)
+
+
+@traced('scraper.amake_request')
+async def amake_request(url, decode_brotli=False):
+    host = get_host(url)
+    if not await asyncio.to_thread(breaker.allow_request, host, probe_upstream):
+        print(f"Request skipped, circuit open for {host}: {url}")
+        return None
+
+    try:
+        async with async_upstream_slot(host):
+            with time_upstream(host) as fetch:
+                resp = await get_client().get(url)
+                fetch['status'] = resp.status_code
+            set_attributes(**{'server.address': host, 'http.response.status_code': resp.status_code})
+
+        if is_throttle_response(resp):
+            if resp.status_code == 403:
+                # Challenge page: let cloudscraper have a go before giving up
+                return await asyncio.to_thread(make_request, url, decode_brotli)
+            await asyncio.to_thread(_record_throttle, host, resp.headers.get("Retry-After"))
+            print(f"Request throttled by upstream: {resp.status_code} {url}")
+            return None
+
+        if resp.status_code >= 500:
+            await asyncio.to_thread(breaker.record_failure, host)
+        resp.raise_for_status()
+        await asyncio.to_thread(_record_success, host)
+
+        # httpx has already decoded the body; only the return type differs
+        if decode_brotli and resp.headers.get("Content-Encoding") == "br":
+            return resp.text
+
+        if resp.encoding is None:
+            resp.encoding = 'utf-8'
+        return resp
+
+    except UpstreamThrottled as e:
+        print(f"Request skipped, upstream busy: {e}")
+        return None
+    except httpx.HTTPStatusError as e:
+        print(f"Request failed: {e}")
+        return NOT_FOUND if e.response.status_code in NOT_FOUND_STATUSES else None
+    except Exception as e:
+        await asyncio.to_thread(breaker.record_failure, host)
+        print(f"Request failed: {e}")
+        return None
+
+
+async def afetch_many(urls, decode_brotli=False, concurrency=None):
+    """Fetch ``urls`` concurrently; results are returned in input order."""
+    semaphore = asyncio.Semaphore(concurrency or settings.ASYNC_FETCH_CONCURRENCY)
+
+    async def fetch(url):
+        async with semaphore:
+            return await amake_request(url, decode_brotli)
+
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+def fetch_many(urls, decode_brotli=False, concurrency=None):
+    """Blocking wrapper around :func:`afetch_many` for management commands and sync views."""
+    async def run():
+        try:
+            return await afetch_many(urls, decode_brotli, concurrency)
+        finally:
+            await close_client()
+
+    return asyncio.run(run())
+
+
+def _html(resp):
+    if resp is NOT_FOUND or resp is None:
+        return resp
+    return resp.content.decode('utf-8', errors='ignore')
+
+
+async def afetch_html_many(urls, concurrency=None):
+    """Like :func:`afetch_many` but returns decoded HTML strings (``None``/``NOT_FOUND`` as is)."""
+    return [_html(resp) for resp in await afetch_many(urls, concurrency=concurrency)]
+
+
+def fetch_html_many(urls, concurrency=None):
+    """Like :func:`fetch_many` but returns decoded HTML strings (``None``/``NOT_FOUND`` as is)."""
+    return [_html(resp) for resp in fetch_many(urls, concurrency=concurrency)]
+
+
+async def ascrape_html(cache_key, url):
+    """The page HTML cached under ``cache_key``, else fetched from ``url`` and cached; None when the fetch failed."""
+    if cached := await run_blocking(cache_lookup, cache_key):
+        return cached
+    html = _html(await amake_request(url))
+    if not html:
+        return None
+    await run_blocking(cache_store, cache_key, html, settings.SCRAPE_CACHE_TIMEOUT)
+    return html
+
+
+async def ascrape_book_details(book_url):
+    """Async :func:`scraper.utils.scrape_book_details`: None when the fetch failed, NOT_FOUND when there is no such book."""
+    cache_key = book_cache_key(book_url)
+    if cached := await run_blocking(cache_lookup, cache_key):
+        return cached
+
+    response = await amake_request(book_url)
+    if not response:
+        return response
+
+    details = await asyncio.to_thread(parse_book_details, response.text)
+    await run_blocking(cache_parsed, cache_key, details, settings.SCRAPE_CACHE_TIMEOUT)
+    return details
+
+
+async def aget_genre_by_slug(slug):
+    """Async :func:`scraper.utils.get_genre_by_slug`."""
+    genres = await run_blocking(get_parsed, 'genres_list')
+    if not genres:
+        if html_content := await ascrape_html(*genres_page()):
+            genres = await asyncio.to_thread(parse_genres, html_content)
+        else:
+            genres = await run_blocking(last_known_good, 'genres_list')
+    return find_genre(genres, slug)
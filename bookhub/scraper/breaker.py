@@ -0,0 +1,125 @@
+"""
+Circuit breaker around upstream fetches, shared across workers via Redis.
+
+Failures for a host are counted until it answers successfully or goes
+UPSTREAM_BREAKER_WINDOW seconds without failing. Once the count reaches
+UPSTREAM_BREAKER_THRESHOLD the breaker opens and every request to that host
+fails fast for UPSTREAM_BREAKER_COOLDOWN seconds. When the cooldown elapses
+a single background probe is sent; a successful probe closes the breaker, a
+failed one keeps it open for another cooldown. Until a probe succeeds the
+breaker stays open, however long that takes. Foreground requests never wait
+on the probe.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _key(host):
+    return f"upstream:breaker:{host}"
+
+
+def _probe_key(host):
+    return f"upstream:breaker_probe:{host}"
+
+
+def is_open(host):
+    """True while the breaker for ``host`` is rejecting requests."""
+    try:
+        opened_until = _redis().hget(_key(host), "opened_until")
+    except Exception as e:
+        logger.warning(f"Breaker state unavailable for {host}: {e}")
+        return False
+    return bool(opened_until)
+
+
+def allow_request(host, probe=None):
+    """
+    Return True when a request to ``host`` may be sent.
+
+    While open, returns False. If the cooldown has elapsed, ``probe`` (a
+    zero-argument callable returning True on success) is run once in a
+    background thread to decide whether to close the breaker.
+    """
+    try:
+        opened_until = _redis().hget(_key(host), "opened_until")
+    except Exception as e:
+        logger.warning(f"Breaker state unavailable for {host}: {e}")
+        return True
+
+    if not opened_until:
+        return True
+
+    if probe is not None and time.time() >= float(opened_until):
+        _start_probe(host, probe)
+    return False
+
+
+def record_success(host):
+    key = _key(host)
+    try:
+        # Almost every request succeeds with no breaker state to clear; don't write for those
+        conn = _redis()
+        if conn.exists(key):
+            conn.delete(key)
+    except Exception as e:
+        logger.warning(f"Could not reset breaker for {host}: {e}")
+
+
+def record_failure(host):
+    key = _key(host)
+    try:
+        conn = _redis()
+        failures = conn.hincrby(key, "failures", 1)
+        if failures >= settings.UPSTREAM_BREAKER_THRESHOLD:
+            _open(conn, host)
+        else:
+            # Failures only count towards tripping if they are close together
+            conn.expire(key, settings.UPSTREAM_BREAKER_WINDOW)
+    except Exception as e:
+        logger.warning(f"Could not record failure for {host}: {e}")
+
+
+def _open(conn, host):
+    cooldown = settings.UPSTREAM_BREAKER_COOLDOWN
+    key = _key(host)
+    if not conn.hget(key, "opened_until"):
+        logger.error(f"Circuit opened for {host} after repeated failures")
+    conn.hset(key, "opened_until", time.time() + cooldown)
+    # Drop the failure window's TTL: only a successful probe closes the breaker
+    conn.persist(key)
+
+
+def _start_probe(host, probe):
+    try:
+        if not _redis().set(_probe_key(host), 1, nx=True, ex=settings.UPSTREAM_BREAKER_COOLDOWN):
+            return  # another worker is already probing
+    except Exception:
+        return
+
+    def run():
+        try:
+            ok = probe()
+        except Exception as e:
+            logger.warning(f"Breaker probe for {host} raised: {e}")
+            ok = False
+
+        if ok:
+            logger.info(f"Circuit closed for {host}: probe succeeded")
+            record_success(host)
+        else:
+            try:
+                _open(_redis(), host)
+            except Exception as e:
+                logger.warning(f"Could not reopen breaker for {host}: {e}")
+
+    threading.Thread(target=run, name=f"breaker-probe-{host}", daemon=True).start()
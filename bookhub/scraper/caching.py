@@ -0,0 +1,104 @@
+"""
+Cache helpers for parsed scraper data.
+
+Every parsed payload is written twice: once under its regular key with the
+endpoint's TTL, and once under a long-lived ``lkg_`` (last-known-good) key.
+When the upstream is unavailable the views fall back to the backup copy and
+flag the response as degraded.
+
+Reads and writes of the hot listing keys go through the per-worker LRU in
+``scraper.local_cache``.
+
+TTLs get a little random jitter so keys written together (for example by
+the cache warmer) don't all expire at the same moment.
+
+Alongside each payload we store its version (a content hash plus the expiry
+time) under ``<key>:version``; ``scraper.http_cache`` turns it into ETag and
+Cache-Control headers without loading or serializing the payload itself.
+
+Lookups made through these helpers are counted (hit / miss / stale) in
+``bookhub.metrics``.
+"""
+import hashlib
+import random
+import time
+
+import orjson
+
+from django.conf import settings
+from django.core.cache import cache
+
+from bookhub.metrics import record_cache
+from bookhub.tracing import span
+
+from .local_cache import tiered_get, tiered_set
+
+# Server-side TTLs of the parsed listing keys, shared by the views and the cache warmer
+NEW_RELEASES_TIMEOUT = 60 * 60 * 8
+MAGAZINES_TIMEOUT = 60 * 60 * 24
+GENRES_TIMEOUT = 60 * 60 * 24 * 7
+GENRE_BOOKS_TIMEOUT = 60 * 60 * 24
+
+
+def genre_books_key(genre_slug, page):
+    return f'genre_books_{genre_slug}_page_{page}'
+
+
+def jittered(timeout):
+    return int(timeout * random.uniform(1 - settings.SCRAPE_TTL_JITTER, 1))
+
+
+def backup_key(cache_key):
+    return f"lkg_{cache_key}"
+
+
+def version_key(cache_key):
+    return f"{cache_key}:version"
+
+
+def payload_etag(data):
+    body = orjson.dumps(data, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def cache_parsed(cache_key, data, timeout):
+    """Store parsed data under its TTL and refresh the last-known-good copy."""
+    ttl = jittered(timeout)
+    tiered_set(cache_key, data, timeout=ttl)
+    tiered_set(version_key(cache_key), {'etag': payload_etag(data), 'expires': int(time.time()) + ttl}, timeout=ttl)
+    if data:
+        with span('cache.set', **{'cache.key': backup_key(cache_key)}):
+            cache.set(backup_key(cache_key), data, timeout=settings.SCRAPE_BACKUP_TIMEOUT)
+
+
+def get_parsed(cache_key):
+    value = tiered_get(cache_key)
+    record_cache(cache_key, 'hit' if value else 'miss')
+    return value
+
+
+def cache_lookup(cache_key):
+    """Plain ``cache.get`` for keys outside the tiered cache, counted in the metrics."""
+    with span('cache.get', **{'cache.key': cache_key}) as current:
+        value = cache.get(cache_key)
+        current.set_attribute('cache.hit', bool(value))
+    record_cache(cache_key, 'hit' if value else 'miss')
+    return value
+
+
+def cache_store(cache_key, value, timeout):
+    with span('cache.set', **{'cache.key': cache_key}):
+        cache.set(cache_key, value, timeout)
+
+
+def get_version(cache_key):
+    return tiered_get(version_key(cache_key))
+
+
+def last_known_good(cache_key):
+    with span('cache.get', **{'cache.key': backup_key(cache_key)}) as current:
+        value = cache.get(backup_key(cache_key))
+        current.set_attribute('cache.hit', value is not None)
+    if value is not None:
+        record_cache(cache_key, 'stale')
+    return value
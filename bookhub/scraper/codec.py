@@ -0,0 +1,138 @@
+"""
+Compact cache value codec, plugged into django-redis through the
+SERIALIZER and COMPRESSOR options in settings.CACHES.
+
+Serialized values carry a 4-byte header: ``b"BH"``, a schema version and a
+format byte. Anything orjson can encode losslessly (the lists of dicts and
+HTML strings the scraper caches) is stored as JSON; everything else falls
+back to pickle. Values must therefore round-trip through JSON to take the
+fast path: tuples come back as lists and UUIDs as strings, so cache those
+as lists/strings to begin with. Datetimes and dataclasses always go
+through pickle.
+
+Values larger than CACHE_COMPRESS_MIN_BYTES are zstd-compressed. Entries
+written before the codec (plain pickle, uncompressed) are still readable.
+
+Encode/decode counters are kept per process; ``codec_stats()`` returns
+them and ``manage.py cache_codec_report`` samples live keys.
+"""
+import pickle
+import threading
+import time
+
+import orjson
+import zstandard
+from django.conf import settings
+from django_redis.compressors.base import BaseCompressor
+from django_redis.exceptions import CompressorError
+from django_redis.serializers.base import BaseSerializer
+
+MAGIC = b"BH"
+SCHEMA_VERSION = 1
+FORMAT_JSON = 1
+FORMAT_PICKLE = 2
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+JSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+_stats_lock = threading.Lock()
+_stats = {
+    "encoded": 0,
+    "decoded": 0,
+    "pickle_fallbacks": 0,
+    "raw_bytes": 0,
+    "stored_bytes": 0,
+    "encode_seconds": 0.0,
+    "decode_seconds": 0.0,
+}
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+def codec_stats():
+    """Per-process totals plus the derived compression ratio and mean costs."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["compression_ratio"] = (stats["raw_bytes"] / stats["stored_bytes"]) if stats["stored_bytes"] else None
+    stats["avg_encode_ms"] = (stats["encode_seconds"] * 1000 / stats["encoded"]) if stats["encoded"] else None
+    stats["avg_decode_ms"] = (stats["decode_seconds"] * 1000 / stats["decoded"]) if stats["decoded"] else None
+    return stats
+
+
+def _reject(value):
+    raise TypeError
+
+
+def encode(value):
+    """Serialize ``value`` to header + JSON (or pickle) bytes."""
+    try:
+        body = orjson.dumps(value, default=_reject, option=JSON_OPTIONS)
+        fmt = FORMAT_JSON
+    except TypeError:
+        body = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        fmt = FORMAT_PICKLE
+        _record(pickle_fallbacks=1)
+    return MAGIC + bytes((SCHEMA_VERSION, fmt)) + body
+
+
+def decode(data):
+    if data[:2] != MAGIC:
+        # Written before the codec was enabled
+        return pickle.loads(data)
+
+    version, fmt = data[2], data[3]
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported cache schema version {version}")
+    if fmt == FORMAT_JSON:
+        return orjson.loads(data[4:])
+    return pickle.loads(data[4:])
+
+
+class ScraperSerializer(BaseSerializer):
+    def dumps(self, value):
+        start = time.perf_counter()
+        data = encode(value)
+        _record(encoded=1, raw_bytes=len(data), encode_seconds=time.perf_counter() - start)
+        return data
+
+    def loads(self, value):
+        start = time.perf_counter()
+        result = decode(value)
+        _record(decoded=1, decode_seconds=time.perf_counter() - start)
+        return result
+
+
+class ScraperCompressor(BaseCompressor):
+    def __init__(self, options):
+        super().__init__(options)
+        self.min_length = settings.CACHE_COMPRESS_MIN_BYTES
+        # zstandard contexts must not be used from two threads at once
+        self._local = threading.local()
+
+    def _contexts(self):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=settings.CACHE_COMPRESS_LEVEL)
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.compressor, self._local.decompressor
+
+    def compress(self, value):
+        start = time.perf_counter()
+        if len(value) > self.min_length:
+            value = self._contexts()[0].compress(value)
+        _record(stored_bytes=len(value), encode_seconds=time.perf_counter() - start)
+        return value
+
+    def decompress(self, value):
+        if value[:4] != ZSTD_MAGIC:
+            raise CompressorError("value is not zstd-compressed")
+        start = time.perf_counter()
+        try:
+            result = self._contexts()[1].decompress(value)
+        except zstandard.ZstdError as e:
+            raise CompressorError from e
+        _record(decode_seconds=time.perf_counter() - start)
+        return result
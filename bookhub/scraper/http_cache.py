@@ -0,0 +1,166 @@
+"""
+Conditional responses for the read-only scraper endpoints.
+
+:func:`conditional` wraps a view with a function that maps the request to
+the cache key its payload lives under. The ETag is built from the payload
+version stored by ``cache_parsed`` and the request's query parameters, so a
+matching ``If-None-Match`` is answered with a 304 before the view runs —
+no scraping, parsing or JSON rendering. ``max-age`` is the time left on the
+server-side key, so browsers and the CDN never hold a response longer than
+we do, and ``stale-while-revalidate`` covers the window while the cache
+warmer refreshes it.
+
+For the hot listing endpoints the rendered JSON is also stored, together
+with its brotli and gzip encodings, under ``<key>:body:<etag>``. Later
+requests for the same version are answered straight from those bytes.
+
+The ETag is strong, so the body must be the same whichever way the view
+produced it. Views say whether they answered from the parsed cache with the
+``X-Cache`` header (:data:`CACHE_HIT` / :data:`CACHE_MISS`), not in the body.
+
+Native async views are supported too; the cache lookups and the body
+encoding then run through :func:`bookhub.async_views.run_blocking`.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from bookhub.async_views import run_blocking
+from bookhub.http import JsonResponse
+from bookhub.middleware import compress, preferred_encoding
+from bookhub.renderers import dumps
+
+from .caching import get_version
+from .local_cache import tiered_get, tiered_set
+
+# Pre-compressed bodies are built once per payload version, so spend the CPU on ratio
+PRECOMPRESS_LEVELS = {'br': 11, 'gzip': 9}
+
+CACHE_STATUS_HEADER = 'X-Cache'
+CACHE_HIT = {CACHE_STATUS_HEADER: 'HIT'}
+CACHE_MISS = {CACHE_STATUS_HEADER: 'MISS'}
+
+
+def response_etag(request, version):
+    """Strong ETag for the payload version as rendered for this request's parameters."""
+    params = sorted((k, v) for k, values in request.GET.lists() for v in values)
+    variant = hashlib.blake2b(repr(params).encode(), digest_size=4).hexdigest()
+    return f'"{version["etag"]}-{variant}"'
+
+
+def etag_matches(request, etag):
+    # If-None-Match uses weak comparison; compressed responses carry W/ ETags
+    candidates = parse_etags(request.headers.get('If-None-Match', ''))
+    return '*' in candidates or etag in [c.removeprefix('W/') for c in candidates]
+
+
+def cache_control(version, timeout):
+    max_age = max(0, version['expires'] - int(time.time()))
+    return f"public, max-age={max_age}, stale-while-revalidate={int(timeout * 0.1)}"
+
+
+def body_key(cache_key, etag):
+    return f"{cache_key}:body:" + etag.strip('"')
+
+
+def encode_body(data):
+    content = dumps(data)
+    body = {'identity': content}
+    if len(content) >= settings.COMPRESSION_MIN_BYTES:
+        for encoding, level in PRECOMPRESS_LEVELS.items():
+            body[encoding] = compress(content, encoding, level)
+    return body
+
+
+def body_response(request, body, etag):
+    encoding = preferred_encoding(request)
+    response = HttpResponse(body.get(encoding, body['identity']), content_type='application/json')
+    if encoding in body:
+        response['Content-Encoding'] = encoding
+        response['ETag'] = f"W/{etag}"
+    else:
+        response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def conditional(get_cache_key, timeout, precompress_params=None):
+    """
+    ``get_cache_key(request, *args, **kwargs)`` returns the cache key the
+    view reads; ``timeout`` is that key's server-side TTL. Responses to
+    requests whose query parameters are all in ``precompress_params`` are
+    stored pre-serialized and pre-compressed (pass ``()`` for "no params").
+    """
+    def precompressible(request):
+        return precompress_params is not None and all(k in precompress_params for k in request.GET)
+
+    def not_modified_or_cached(request, cache_key):
+        version = get_version(cache_key)
+        if not version:
+            return None
+        etag = response_etag(request, version)
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = cache_control(version, timeout)
+            return response
+        if precompressible(request) and (body := tiered_get(body_key(cache_key, etag))):
+            response = body_response(request, body, etag)
+            response['Cache-Control'] = cache_control(version, timeout)
+            response[CACHE_STATUS_HEADER] = CACHE_HIT[CACHE_STATUS_HEADER]
+            return response
+        return None
+
+    def finish(request, response, cache_key):
+        data = getattr(response, 'data', None)
+        if response.status_code != 200 or (isinstance(data, dict) and data.get('degraded')):
+            response['Cache-Control'] = 'no-cache'
+            return response
+
+        # The view may just have (re)written the key
+        version = get_version(cache_key)
+        if not version:
+            return response
+
+        etag = response_etag(request, version)
+        if precompressible(request) and isinstance(response, (Response, JsonResponse)):
+            body = encode_body(data)
+            remaining = version['expires'] - int(time.time())
+            if remaining > 0:
+                tiered_set(body_key(cache_key, etag), body, timeout=remaining)
+            cache_status = response.get(CACHE_STATUS_HEADER)
+            response = body_response(request, body, etag)
+            if cache_status:
+                response[CACHE_STATUS_HEADER] = cache_status
+        else:
+            response['ETag'] = etag
+        response['Cache-Control'] = cache_control(version, timeout)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                cache_key = get_cache_key(request, *args, **kwargs)
+                if response := await run_blocking(not_modified_or_cached, request, cache_key):
+                    return response
+                response = await view(request, *args, **kwargs)
+                # Storing the body compresses it at the highest levels: not on the event loop
+                return await run_blocking(finish, request, response, cache_key)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            cache_key = get_cache_key(request, *args, **kwargs)
+            if response := not_modified_or_cached(request, cache_key):
+                return response
+            return finish(request, view(request, *args, **kwargs), cache_key)
+        return wrapper
+    return decorator
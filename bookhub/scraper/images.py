@@ -0,0 +1,157 @@
+"""
+Cover image proxy.
+
+Listing and detail payloads point their ``image``/``cover_image`` fields
+at ``/api/cover/`` (see ``scraper.utils.proxied_image_url``) instead of the
+upstream CDN. The proxy fetches each cover once, resizes it to one of COVER_THUMB_WIDTHS
+and encodes it as WebP or JPEG. Originals and thumbnails are kept in an
+on-disk LRU under COVER_CACHE_DIR, bounded by COVER_CACHE_MAX_BYTES and
+shared by every worker on the machine. Recency is tracked with file mtimes.
+
+Only hosts accepted by ``scraper.utils.allowed_image_source`` are fetched, so
+the endpoint can't be used as an open proxy.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+
+from .async_fetch import amake_request
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+class ImageTooLarge(Exception):
+    """The upstream cover decodes to more pixels than Pillow allows (a decompression bomb)."""
+
+
+_evict_lock = threading.Lock()
+_last_evict = 0.0
+
+
+def snap_width(width):
+    """The smallest configured width that is at least ``width`` (or the largest one)."""
+    widths = sorted(settings.COVER_THUMB_WIDTHS)
+    return next((w for w in widths if w >= width), widths[-1])
+
+
+def _path(*parts):
+    name = hashlib.sha256('|'.join(str(p) for p in parts).encode()).hexdigest()
+    return os.path.join(settings.COVER_CACHE_DIR, name[:2], name)
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)  # mark as recently used
+    except OSError:
+        pass
+    return data
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    _maybe_evict()
+
+
+def _maybe_evict():
+    """Drop least recently used files once the cache is over budget (checked at most once a minute)."""
+    global _last_evict
+    with _evict_lock:
+        if time.monotonic() - _last_evict < 60:
+            return
+        _last_evict = time.monotonic()
+
+    entries = []
+    total = 0
+    for root, _, files in os.walk(settings.COVER_CACHE_DIR):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+            total += stat.st_size
+    if total <= settings.COVER_CACHE_MAX_BYTES:
+        return
+
+    # Evict down to 90% so we don't walk the tree again on the next write
+    target = settings.COVER_CACHE_MAX_BYTES * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+async def _source_image(src):
+    path = _path('source', src)
+    data = await asyncio.to_thread(_read, path)
+    if data is not None:
+        return data
+
+    response = await amake_request(src)
+    if not response or not response.content:
+        return None
+    await asyncio.to_thread(_write, path, response.content)
+    return response.content
+
+
+def render_thumbnail(img_bytes, width, fmt):
+    pil_format, _, save_options = FORMATS[fmt]
+    with Image.open(io.BytesIO(img_bytes)) as img:
+        img = img.convert('RGB')
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format=pil_format, **save_options)
+    return out.getvalue()
+
+
+async def get_thumbnail(src, width, fmt):
+    """
+    ``(bytes, content_type, etag)`` for the cover at ``src`` resized to
+    ``width``, or ``None`` if it can't be fetched or decoded. Disk and
+    Pillow work runs in threads so the event loop stays free. Raises
+    :class:`ImageTooLarge` for covers Pillow refuses to decode.
+    """
+    path = _path('thumb', src, width, fmt)
+    data = await asyncio.to_thread(_read, path)
+    if data is None:
+        original = await _source_image(src)
+        if original is None:
+            return None
+        try:
+            data = await asyncio.to_thread(render_thumbnail, original, width, fmt)
+        except Image.DecompressionBombError as e:
+            logger.warning(f"Refusing to resize cover {src}: {e}")
+            raise ImageTooLarge(src) from e
+        except (UnidentifiedImageError, OSError) as e:
+            logger.warning(f"Could not resize cover {src}: {e}")
+            return None
+        await asyncio.to_thread(_write, path, data)
+
+    etag = f'"{hashlib.sha1(data).hexdigest()}"'
+    return data, FORMATS[fmt][1], etag
@@ -0,0 +1,158 @@
+"""
+Per-worker in-memory LRU in front of the Redis cache for hot, read-mostly keys.
+
+Only the keys named in LOCAL_CACHE_KEYS (exact names or ``fnmatch``
+patterns such as ``genre_books_*``) are held locally, together with their
+``<key>:version`` and ``<key>:body:<etag>`` entries. Names are matched up
+to the ``:``, so ``new_releases_html`` is not ``new_releases``. Entries live
+for at most LOCAL_CACHE_TTL seconds and the cache is bounded by the
+pickled size of its values (LOCAL_CACHE_MAX_BYTES). Writes made through
+:func:`tiered_set` are broadcast on a Redis pub/sub channel so every other
+worker drops its local copy straight away instead of waiting for the TTL.
+"""
+import logging
+import os
+from fnmatch import fnmatchcase
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from bookhub.tracing import span
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "scraper:cache-invalidate"
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class LocalLRU:
+    """Thread-safe LRU with per-entry expiry and a total size budget in bytes."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, size=None):
+        if size is None:
+            size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+
+local_cache = LocalLRU(settings.LOCAL_CACHE_MAX_BYTES, settings.LOCAL_CACHE_TTL)
+
+_listener_started = False
+_listener_lock = threading.Lock()
+
+
+def is_hot(key):
+    base = key.split(':', 1)[0]
+    return any(fnmatchcase(base, pattern) for pattern in settings.LOCAL_CACHE_KEYS)
+
+
+def _on_invalidation(data):
+    sender, _, key = data.decode().partition(":")
+    if sender != WORKER_ID:
+        local_cache.delete(key)
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything could have changed while we were not subscribed
+            local_cache.clear()
+            for message in pubsub.listen():
+                _on_invalidation(message["data"])
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener disconnected: {e}")
+            local_cache.clear()
+            time.sleep(5)
+
+
+def _ensure_listener():
+    global _listener_started
+    if _listener_started:
+        return
+    with _listener_lock:
+        if not _listener_started:
+            threading.Thread(target=_listen, name="local-cache-invalidation", daemon=True).start()
+            _listener_started = True
+
+
+def tiered_get(key):
+    """Read ``key`` from the local LRU, falling back to (and filling from) Redis."""
+    with span('cache.get', **{'cache.key': key}) as current:
+        if not is_hot(key):
+            value = cache.get(key)
+            current.set_attributes({'cache.tier': 'redis', 'cache.hit': value is not None})
+            return value
+
+        _ensure_listener()
+        value = local_cache.get(key)
+        if value is not None:
+            current.set_attributes({'cache.tier': 'local', 'cache.hit': True})
+            return value
+
+        value = cache.get(key)
+        if value is not None:
+            local_cache.set(key, value)
+        current.set_attributes({'cache.tier': 'redis', 'cache.hit': value is not None})
+        return value
+
+
+def tiered_set(key, value, timeout):
+    """Write ``key`` to Redis and tell other workers to drop their local copy."""
+    with span('cache.set', **{'cache.key': key}):
+        cache.set(key, value, timeout=timeout)
+    if not is_hot(key):
+        return
+
+    _ensure_listener()
+    try:
+        get_redis_connection("default").publish(INVALIDATION_CHANNEL, f"{WORKER_ID}:{key}")
+    except Exception as e:
+        logger.warning(f"Could not publish invalidation for {key}: {e}")
+    local_cache.set(key, value)
@@ -0,0 +1,200 @@
+import gc
+import hashlib
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import FeatureNotFound
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from scraper.stub_site import sample_pages
+from scraper.utils import (
+    get_total_pages_from_genre,
+    make_soup,
+    parse_book_details,
+    parse_books_from_genre,
+    parse_genres,
+    parse_magazines,
+    parse_new_releases,
+    parse_novels,
+    parse_search_results,
+)
+
+# Parsers to run for each page type (the route prefix of a corpus file name)
+PARSERS = {
+    'search': [('parse_search_results', parse_search_results)],
+    'new_releases': [('parse_new_releases', parse_new_releases)],
+    'magazines': [('parse_magazines', parse_magazines)],
+    'novels': [('parse_novels', parse_novels)],
+    'genres': [('parse_genres', parse_genres)],
+    'genre': [
+        ('parse_books_from_genre', lambda html: parse_books_from_genre(html, 'Fantasy')),
+        ('get_total_pages_from_genre', get_total_pages_from_genre),
+    ],
+    'book': [('parse_book_details', parse_book_details)],
+}
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'parser_baseline.json'
+
+# Settings the extracted records depend on (proxied cover URLs, upstream link checks),
+# fixed so the digests match the committed baseline on every machine
+PINNED_SETTINGS = {
+    'COVER_PROXY_ENABLED': True,
+    'COVER_PROXY_BASE': 'https://bookhub.invalid',
+    'COVER_THUMB_DEFAULT_WIDTH': 320,
+    'API_BASE_URL': 'https://oceanofpdf.com',
+}
+
+
+def digest(records):
+    return hashlib.sha256(json.dumps(records, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def load_corpus(directory):
+    """``<route>[-anything].html`` files from ``directory``, keyed like :func:`sample_pages`."""
+    pages = {}
+    for path in sorted(Path(directory).glob('*.html')):
+        route = path.stem.split('-')[0]
+        if route in PARSERS:
+            pages[path.stem] = (route, path.read_text(encoding='utf-8', errors='ignore'))
+    return pages
+
+
+def measure(parse, html, repeat):
+    parse(html)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = parse(html)
+        peak = tracemalloc.get_traced_memory()[1]
+        # The soup is full of reference cycles; collect it so only the records count as retained
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        # tracemalloc only sees blocks that are still alive, not every allocation made along the way
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ms': round(statistics.median(timings) * 1000, 3),
+        'peak_kb': round((peak - before) / 1024, 1),
+        'retained_kb': round((current - before) / 1024, 1),
+        'retained_blocks': blocks,
+        'digest': digest(result),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the HTML parsers in scraper/utils.py per page and per BeautifulSoup backend '
+        '(median time, peak and retained traced memory, retained allocation blocks) and compare '
+        'against a baseline file. Fails when a parser\'s extracted records change. Slowdowns and '
+        'memory growth are only reported, since they depend on the machine; pass --strict to fail '
+        'on them too when the baseline was saved on the same host.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=None, help='Directory of saved pages named <route>[-name].html. Defaults to the generated stub corpus.')
+        parser.add_argument('--backend', action='append', dest='backends', help="BeautifulSoup backend (repeatable). Default: html.parser and lxml.")
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per parser and page')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown / memory growth before reporting it')
+        parser.add_argument('--strict', action='store_true', help='Also fail on slowdowns and memory growth (baseline saved on this host)')
+
+    def handle(self, *args, **options):
+        pages = load_corpus(options['corpus']) if options['corpus'] else sample_pages()
+        if not pages:
+            raise CommandError(f"No pages found in {options['corpus']}")
+
+        results = {}
+        for backend in options['backends'] or ['html.parser', 'lxml']:
+            try:
+                with override_settings(HTML_PARSER=backend):
+                    make_soup('<p></p>')
+            except FeatureNotFound:
+                self.stdout.write(self.style.WARNING(f"Skipping backend {backend}: not installed"))
+                continue
+
+            self.stdout.write(f"\n{backend}")
+            self.stdout.write(f"{'page':<24}{'parser':<28}{'KB':>7}{'ms':>10}{'peak KB':>10}{'kept KB':>10}{'blocks':>8}  digest")
+            with override_settings(HTML_PARSER=backend, **PINNED_SETTINGS):
+                for name, (route, html) in pages.items():
+                    for parser_name, parse in PARSERS[route]:
+                        result = measure(parse, html, options['repeat'])
+                        results[f"{backend}|{name}|{parser_name}"] = result
+                        self.stdout.write(
+                            f"{name:<24}{parser_name:<28}{len(html) / 1024:>7.0f}{result['ms']:>10.2f}"
+                            f"{result['peak_kb']:>10.0f}{result['retained_kb']:>10.0f}{result['retained_blocks']:>8}  {result['digest']}"
+                        )
+
+        self._compare_backends(results)
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f"\nBaseline written to {baseline_path}"))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one"))
+            return
+
+        changed, slower = self._compare_baseline(results, json.loads(baseline_path.read_text()), options['tolerance'])
+        for problem in slower:
+            self.stdout.write((self.style.ERROR if options['strict'] else self.style.WARNING)(problem))
+        for problem in changed:
+            self.stdout.write(self.style.ERROR(problem))
+
+        problems = changed + slower if options['strict'] else changed
+        if problems:
+            raise CommandError(f"{len(problems)} parser regression(s) against {baseline_path}")
+        if slower:
+            self.stdout.write(self.style.WARNING(
+                f"\n{len(slower)} timing/memory difference(s) against {baseline_path}; these vary between "
+                f"machines, so they don't fail the run without --strict"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"\nExtracted records match {baseline_path}"))
+
+    def _compare_backends(self, results):
+        """Different backends can build slightly different trees; point out where the output diverges."""
+        by_page = {}
+        for key, result in results.items():
+            backend, name, parser_name = key.split('|')
+            by_page.setdefault((name, parser_name), {})[backend] = result['digest']
+        for (name, parser_name), digests in by_page.items():
+            if len(set(digests.values())) > 1:
+                self.stdout.write(self.style.WARNING(
+                    f"{parser_name} on {name} extracts different records per backend: {digests}"
+                ))
+
+    def _compare_baseline(self, results, baseline, tolerance):
+        """``(changed, slower)``: records that differ from the baseline, and slowdowns / memory growth past the tolerance."""
+        changed = []
+        slower = []
+        for key, result in results.items():
+            previous = baseline.get(key)
+            if previous is None:
+                continue
+            if result['digest'] != previous['digest']:
+                changed.append(f"{key}: extracted records changed ({previous['digest']} -> {result['digest']})")
+            if result['ms'] > previous['ms'] * (1 + tolerance):
+                slower.append(f"{key}: {previous['ms']:.2f} ms -> {result['ms']:.2f} ms")
+            if result['peak_kb'] > previous['peak_kb'] * (1 + tolerance):
+                slower.append(f"{key}: peak {previous['peak_kb']:.0f} KB -> {result['peak_kb']:.0f} KB")
+            if 'retained_blocks' in previous and result['retained_blocks'] > previous['retained_blocks'] * (1 + tolerance):
+                slower.append(f"{key}: {previous['retained_blocks']} -> {result['retained_blocks']} retained blocks")
+        return changed, slower
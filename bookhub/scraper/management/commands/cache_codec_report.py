@@ -0,0 +1,93 @@
+import pickle
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from scraper.codec import ScraperCompressor, codec_stats, decode, encode
+
+DEFAULT_PATTERNS = ['books_*', 'book_*', 'genres_html', 'new_releases*', 'magazines*', 'genre_books_*', 'genres_list']
+
+
+class Command(BaseCommand):
+    help = 'Report compression ratio and encode/decode cost of the cache codec on live scraper keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pattern',
+            action='append',
+            dest='patterns',
+            help='Key pattern to sample (repeatable). Defaults to the scraper key families.',
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=20,
+            help='Maximum number of keys to sample per pattern',
+        )
+
+    def handle(self, *args, **options):
+        patterns = options['patterns'] or DEFAULT_PATTERNS
+        conn = get_redis_connection("default")
+        compressor = ScraperCompressor({})
+
+        self.stdout.write(
+            f"{'pattern':<16}{'keys':>6}{'pickle KB':>12}{'codec KB':>11}{'ratio':>8}"
+            f"{'enc ms':>9}{'dec ms':>9}{'pickle dec ms':>15}"
+        )
+        for pattern in patterns:
+            keys = []
+            for key in cache.iter_keys(pattern):
+                keys.append(key)
+                if len(keys) >= options['sample']:
+                    break
+
+            pickled_bytes = codec_bytes = 0
+            encode_time = decode_time = pickle_decode_time = 0.0
+            sampled = 0
+            for key in keys:
+                raw = conn.get(cache.make_key(key))
+                if raw is None or raw.isdigit():
+                    continue
+                value = cache.get(key)
+                sampled += 1
+
+                legacy = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                start = time.perf_counter()
+                pickle.loads(legacy)
+                pickle_decode_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                stored = compressor.compress(encode(value))
+                encode_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                try:
+                    data = compressor.decompress(stored)
+                except Exception:
+                    data = stored
+                decode(data)
+                decode_time += time.perf_counter() - start
+
+                pickled_bytes += len(legacy)
+                codec_bytes += len(stored)
+
+            if not sampled:
+                self.stdout.write(f"{pattern:<16}{0:>6}")
+                continue
+
+            self.stdout.write(
+                f"{pattern:<16}{sampled:>6}{pickled_bytes / 1024:>12.1f}{codec_bytes / 1024:>11.1f}"
+                f"{pickled_bytes / codec_bytes:>8.2f}"
+                f"{encode_time * 1000 / sampled:>9.2f}{decode_time * 1000 / sampled:>9.2f}"
+                f"{pickle_decode_time * 1000 / sampled:>15.2f}"
+            )
+
+        stats = codec_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"This process: {stats['encoded']} encoded, {stats['decoded']} decoded, "
+                f"{stats['pickle_fallbacks']} pickle fallbacks"
+            )
+        )
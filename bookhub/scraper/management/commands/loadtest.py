@@ -0,0 +1,115 @@
+import random
+import statistics
+import threading
+import time
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper.stub_site import GENRES, slugify
+
+SCENARIOS = {
+    'search': lambda i: ('GET', f"/api/search/?s=term{i % 50}", None),
+    'new_releases': lambda i: ('GET', "/api/new-releases/", None),
+    'magazines': lambda i: ('GET', "/api/magazines/", None),
+    'genres': lambda i: ('GET', "/api/genres/", None),
+    'popular_genres': lambda i: ('GET', "/api/genres/popular/", None),
+    'genre_books': lambda i: ('GET', f"/api/genres/{slugify(GENRES[i % len(GENRES)])}/books/?page={i % 5 + 1}", None),
+    'book_detail': lambda i: ('GET', f"/api/book-detail/author-{i % 30}/pdf-epub-book-{i % 30}-download-{1000 + i % 30}/", None),
+    'book_detail_batch': lambda i: ('POST', "/api/book-detail/batch/", {
+        'slugs': [f"author-{n % 30}/pdf-epub-book-{n % 30}-download-{1000 + n % 30}" for n in range(i, i + 20)],
+    }),
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the scraper API endpoints with concurrent clients and report latency percentiles, '
+        'throughput and upstream calls per endpoint. Run the server with API_BASE_URL pointing at '
+        '`manage.py upstream_stub` and RATELIMIT_ENABLE=False.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', default='http://127.0.0.1:8000', help='Base URL of the Django server under test')
+        parser.add_argument('--stub', default='http://127.0.0.1:8765', help='Base URL of the upstream stub (for call counts)')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=sorted(SCENARIOS) + ['download'],
+                            help='Endpoint scenario to run (repeatable). Defaults to all GET scenarios.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--timeout', type=float, default=60)
+
+    def handle(self, *args, **options):
+        target = options['target'].rstrip('/')
+        stub = options['stub'].rstrip('/')
+        scenarios = dict(SCENARIOS)
+        scenarios['download'] = lambda i: ('POST', "/api/download/", {'url': f"{stub}/authors/author-{i % 10}/book-{i % 10}/"})
+        names = options['endpoints'] or sorted(SCENARIOS)
+
+        try:
+            requests.get(f"{stub}/__stats", timeout=5).raise_for_status()
+        except requests.RequestException as e:
+            raise CommandError(f"Upstream stub not reachable at {stub}: {e}")
+
+        self.stdout.write(
+            f"{'endpoint':<16}{'reqs':>6}{'errors':>8}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'upstream':>10}{'per req':>9}"
+        )
+        for name in names:
+            before = requests.get(f"{stub}/__stats", timeout=5).json()
+            latencies, errors, elapsed = self._run(target, scenarios[name], options)
+            after = requests.get(f"{stub}/__stats", timeout=5).json()
+
+            upstream = sum(after.values()) - sum(before.values())
+            total = len(latencies) + errors
+            self.stdout.write(
+                f"{name:<16}{total:>6}{errors:>8}{total / elapsed:>8.1f}"
+                f"{percentile(latencies, 50) * 1000:>9.1f}{percentile(latencies, 95) * 1000:>9.1f}"
+                f"{percentile(latencies, 99) * 1000:>9.1f}{upstream:>10}{upstream / max(total, 1):>9.2f}"
+            )
+            if latencies:
+                self.stdout.write(f"{'':<16}mean {statistics.mean(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+
+    def _run(self, target, scenario, options):
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+        counter = iter(range(options['requests']))
+
+        def worker():
+            nonlocal errors
+            session = requests.Session()
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                method, path, data = scenario(i)
+                start = time.perf_counter()
+                try:
+                    resp = session.request(method, f"{target}{path}", json=data, timeout=options['timeout'])
+                    ok = resp.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                duration = time.perf_counter() - start
+                with lock:
+                    if ok:
+                        latencies.append(duration)
+                    else:
+                        errors += 1
+                time.sleep(random.uniform(0, 0.005))
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors, time.perf_counter() - start
@@ -0,0 +1,44 @@
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from scraper.stub_site import StubHandler, StubState
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the upstream book site. Point API_BASE_URL at it '
+        '(e.g. API_BASE_URL=http://127.0.0.1:8765) to benchmark the scraper endpoints offline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.2, help='Fixed delay per request in seconds')
+        parser.add_argument('--jitter', type=float, default=0.1, help='Extra random delay of up to this many seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+        parser.add_argument('--fixtures', default=None, help='Directory of recorded pages (<route>.html) to serve instead of synthetic ones')
+        parser.add_argument('--pdf-pages', type=int, default=3, help='Page count of the served PDF files')
+
+    def handle(self, *args, **options):
+        base_url = f"http://{options['host']}:{options['port']}"
+        state = StubState(
+            base_url,
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            fixtures_dir=options['fixtures'],
+            pdf_pages=options['pdf_pages'],
+        )
+        handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        server.daemon_threads = True
+
+        self.stdout.write(self.style.SUCCESS(f"Upstream stub listening on {base_url}"))
+        self.stdout.write(f"Request counts: {base_url}/__stats (reset with {base_url}/__reset)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
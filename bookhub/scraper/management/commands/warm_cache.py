@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from scraper.warming import warm_cache
+
+
+class Command(BaseCommand):
+    help = 'Pre-populate hot scraper cache keys (new releases, magazines, genres, popular genre pages) before they expire'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--genres',
+            type=int,
+            default=None,
+            help='Number of hot genres to keep warm (defaults to CACHE_WARM_GENRES)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Refresh every hot key even if it is not close to expiry',
+        )
+
+    def handle(self, *args, **options):
+        summary = warm_cache(genre_limit=options['genres'], force=options['force'])
+
+        for key in summary['refreshed']:
+            self.stdout.write(f"Refreshed {key}")
+        for key in summary['failed']:
+            self.stdout.write(self.style.WARNING(f"Failed to refresh {key}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Cache warm completed: {len(summary['refreshed'])} refreshed, "
+                f"{len(summary['failed'])} failed, {summary['hot_genres']} hot genres checked"
+            )
+        )
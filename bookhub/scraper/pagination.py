@@ -0,0 +1,95 @@
+"""
+``limit``/``cursor`` pagination and ``fields=`` projection for the listing
+endpoints, applied to the cached parsed records.
+
+* ``limit`` — records per page, at most LISTING_MAX_LIMIT. Without it the
+  whole list is returned, as before.
+* ``cursor`` — the opaque ``next_cursor`` of the previous page.
+* ``fields`` — comma separated record keys to keep, e.g.
+  ``fields=title,image,link``. Unknown names are ignored.
+"""
+import base64
+import binascii
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from rest_framework.response import Response
+
+from bookhub.http import JsonResponse
+
+
+class InvalidListingParams(ValueError):
+    pass
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"o{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise InvalidListingParams('Invalid cursor')
+    if not raw.startswith('o') or not raw[1:].isdigit():
+        raise InvalidListingParams('Invalid cursor')
+    return int(raw[1:])
+
+
+def project(records, fields):
+    return [{key: record[key] for key in fields if key in record} for record in records]
+
+
+def listing_page(request, records):
+    """
+    Slice and project ``records`` according to the request's query params.
+    Returns the ``count``/``total``/``next_cursor``/``results`` part of the
+    response; raises :class:`InvalidListingParams` on bad input.
+    """
+    records = records or []
+    offset = 0
+    limit = None
+
+    if cursor := request.GET.get('cursor'):
+        offset = decode_cursor(cursor)
+    if (raw_limit := request.GET.get('limit')) is not None:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise InvalidListingParams('limit must be an integer')
+        if not 1 <= limit <= settings.LISTING_MAX_LIMIT:
+            raise InvalidListingParams(f'limit must be between 1 and {settings.LISTING_MAX_LIMIT}')
+
+    end = len(records) if limit is None else offset + limit
+    page = records[offset:end]
+
+    if fields := request.GET.get('fields'):
+        page = project(page, [f.strip() for f in fields.split(',') if f.strip()])
+
+    return {
+        'count': len(page),
+        'total': len(records),
+        'next_cursor': encode_cursor(end) if end < len(records) else None,
+        'results': page,
+    }
+
+
+def paginated(view):
+    """Turn :class:`InvalidListingParams` raised by ``listing_page`` into a 400."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            try:
+                return await view(request, *args, **kwargs)
+            except InvalidListingParams as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except InvalidListingParams as e:
+            return Response({'error': str(e)}, status=400)
+    return wrapper
@@ -0,0 +1,346 @@
+"""
+Local stand-in for the upstream book site, used for load tests and parser
+benchmarks.
+
+Pages are generated deterministically with the same markup the parsers in
+``scraper/utils.py`` expect (search results, new releases, magazines, the
+genre index, genre pages with pagination, book details with the
+``Fetching_Resource.php`` download form), or read from a directory of
+recorded pages. :class:`StubHandler` serves them over HTTP with
+configurable latency and error rate and counts every request per route.
+"""
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+GENRES = [
+    "Adult", "Children", "Contemporary", "Contemporary Romance", "Crime", "Fantasy",
+    "Fiction", "Historical", "Historical Fiction", "History", "Mystery", "Nonfiction",
+    "Paranormal", "Romance", "Science Fiction", "Suspense", "Thriller", "Young Adult",
+]
+
+WORDS = (
+    "shadow river crown empire silent garden winter fire glass city night ocean "
+    "secret storm letter forgotten house promise summer stone heart wild road"
+).split()
+
+# Recorded pages are looked up as <fixtures_dir>/<route>.html
+ROUTES = ("search", "new_releases", "magazines", "genres", "genre", "book", "fetch_resource", "pdf", "image")
+
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def _title(rng):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 5)))
+
+
+def _author(rng):
+    return f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()}"
+
+
+def _book_link(base, rng, title):
+    return f"{base}/authors/{slugify(_author(rng))}/pdf-epub-{slugify(title)}-download-{rng.randint(10**9, 10**10)}/"
+
+
+def _page(title, body):
+    # Pad with the kind of chrome a WordPress page carries so sizes stay realistic
+    chrome = "".join(
+        f'<li class="menu-item"><a href="/category/{slugify(g)}/">{g}</a></li>' for g in GENRES
+    )
+    return (
+        f"<!DOCTYPE html><html><head><title>{title}</title>"
+        f'<meta charset="utf-8"><link rel="stylesheet" href="/style.css"></head>'
+        f'<body><header><nav><ul class="menu">{chrome}</ul></nav></header>'
+        f'<main class="content">{body}</main>'
+        f'<footer><ul class="menu">{chrome}</ul></footer></body></html>'
+    )
+
+
+def search_page(base, query, count=20, seed=0):
+    rng = random.Random(f"search-{query}-{seed}")
+    articles = []
+    for i in range(count):
+        title = _title(rng)
+        link = _book_link(base, rng, title)
+        articles.append(
+            f'<article class="post"><h2 class="entry-title"><a href="{link}">{title}</a></h2>'
+            f'<img src="{base}/wp-content/uploads/cover-{i}.jpg" alt="{title}">'
+            f'<div class="entry-content"><p>{" ".join(rng.choice(WORDS) for _ in range(40))}</p></div></article>'
+        )
+    return _page(f"Search results for {query}", "".join(articles))
+
+
+def listing_page(base, kind, count=40, seed=0):
+    """New releases / magazines widgets (``a.title-image`` + ``.widget-event__info``)."""
+    rng = random.Random(f"{kind}-{seed}")
+    items = []
+    for i in range(count):
+        title = _title(rng)
+        link = _book_link(base, rng, title)
+        items.append(
+            f'<div class="widget-event"><a class="title-image" href="{link}">'
+            f'<img class="lazyload" data-src="{base}/wp-content/uploads/cover-{i}.jpg" src="data:image/gif;base64,R0lGOD">'
+            f'</a><div class="widget-event__info"><div class="title"><a href="{link}">{title}</a></div>'
+            f'<div class="meta">{rng.randint(1, 28)} days ago</div></div></div>'
+        )
+    return _page(kind.replace("_", " ").title(), "".join(items))
+
+
+def genres_page(base, seed=0):
+    rng = random.Random(f"genres-{seed}")
+    items = "".join(
+        f'<h3 class="h3genres"><a href="{base}/category/genres/{slugify(name)}/">{name}</a> ({rng.randint(50, 9000)})</h3>'
+        for name in GENRES
+    )
+    return _page("Books by Genre", items)
+
+
+def genre_page(base, slug, page=1, count=20, total_pages=50, seed=0):
+    rng = random.Random(f"genre-{slug}-{page}-{seed}")
+    articles = []
+    for i in range(count):
+        title = _title(rng)
+        author = _author(rng)
+        link = _book_link(base, rng, title)
+        articles.append(
+            f'<article class="post"><header class="entry-header">'
+            f'<a class="entry-image-link" href="{link}"><img data-src="{base}/wp-content/uploads/cover-{i}.jpg"></a>'
+            f'<h2 class="entry-title"><a class="entry-title-link" href="{link}">{title}</a></h2>'
+            f'<p class="entry-meta"><time class="entry-time">2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}</time></p></header>'
+            f'<div class="postmetainfo">Author: {author}\nLanguage: English\nGenre: {slug}</div>'
+            f'<div class="entry-content"><p>{" ".join(rng.choice(WORDS) for _ in range(60))} [Read more…]</p></div></article>'
+        )
+    links = "".join(
+        f'<a class="page-numbers" href="{base}/category/genres/{slug}/page/{n}/">{n}</a>'
+        for n in range(max(1, page - 2), min(total_pages, page + 2) + 1) if n != page
+    )
+    pagination = (
+        f'<div class="pagination"><span class="page-numbers current">{page}</span>{links}'
+        f'<a class="page-numbers" href="{base}/category/genres/{slug}/page/{total_pages}/">{total_pages}</a></div>'
+    )
+    return _page(f"{slug} - Page {page}", "".join(articles) + pagination)
+
+
+def book_page(base, slug, seed=0):
+    rng = random.Random(f"book-{slug}-{seed}")
+    title = _title(rng)
+    author = _author(rng)
+    description = "".join(f"<p>{' '.join(rng.choice(WORDS) for _ in range(50))}</p>" for _ in range(4))
+    details = "".join(
+        f"<li>{key}: {value}</li>" for key, value in (
+            ("Full Book Name", title), ("Author Name", author), ("Book Genre", rng.choice(GENRES)),
+            ("Series", _title(rng)), ("ISBN", rng.randint(10**12, 10**13)), ("Edition Language", "English"),
+            ("Date of Publication", f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}"), ("PDF File Size", f"{rng.randint(1, 9)}.{rng.randint(0, 9)} MB"),
+        )
+    )
+    filename = f"{slugify(title)}.pdf"
+    form = (
+        f'<form action="{base}/Fetching_Resource.php" method="post" class="pdf-button">'
+        f'<input type="hidden" name="id" value="{rng.randint(10**5, 10**6)}">'
+        f'<input type="hidden" name="filename" value="{filename}">'
+        f'<input type="image" src="/pdf.png" alt="Download PDF"></form>'
+    )
+    body = (
+        f'<article class="post"><h1 class="entry-title">{title}</h1>'
+        f'<time class="entry-time">2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}</time>'
+        f'<img class="aligncenter" src="{base}/wp-content/uploads/cover-{slugify(slug)}.jpg">'
+        f'<div class="entry-content"><p><strong>by</strong> {author}</p>{description}'
+        f'<h2>Brief Summary of {title}</h2><p>{" ".join(rng.choice(WORDS) for _ in range(80))}</p>'
+        f'<h2>eBook Details</h2><ul>{details}</ul>{form}</div></article>'
+    )
+    return _page(title, body)
+
+
+def sample_pages(base="https://oceanofpdf.com"):
+    """
+    A deterministic benchmark corpus, ``{name: (route, html)}``, with typical
+    and oversized variants of every page type the parsers handle.
+    """
+    pages = {}
+    for size, scale in (("typical", 1), ("large", 4)):
+        pages[f"search-{size}"] = ("search", search_page(base, "fantasy", count=20 * scale))
+        for kind in ("new_releases", "magazines", "novels"):
+            pages[f"{kind}-{size}"] = (kind, listing_page(base, kind, count=40 * scale))
+        pages[f"genre-{size}"] = ("genre", genre_page(base, "fantasy", page=3, count=20 * scale))
+    pages["genres"] = ("genres", genres_page(base))
+    for i in range(3):
+        pages[f"book-{i}"] = ("book", book_page(base, f"pdf-epub-sample-book-{i}-download"))
+    return pages
+
+
+def fetch_resource_page(base, filename):
+    return (
+        f'<html><head><meta http-equiv="refresh" content="0;url={base}/files/{filename}"></head>'
+        f'<body>Redirecting…</body></html>'
+    )
+
+
+def pdf_file(pages=3):
+    """A small valid PDF with the watermark strings ``remove_watermarks`` looks for."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    for i in range(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td (Page {i + 1} - Downloaded from OceanofPDF) Tj ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{obj}\nendobj\n".encode())
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def cover_image(name, width=600, height=900):
+    from PIL import Image
+
+    rng = random.Random(name)
+    img = Image.new("RGB", (width, height), tuple(rng.randint(0, 255) for _ in range(3)))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+class StubState:
+    """Behaviour knobs and per-route request counters shared by all handler threads."""
+
+    def __init__(self, base_url, latency=0.0, jitter=0.0, error_rate=0.0, fixtures_dir=None, pdf_pages=3):
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures_dir = fixtures_dir
+        self.pdf_pages = pdf_pages
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, route):
+        with self.lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+    def recorded(self, route):
+        if not self.fixtures_dir:
+            return None
+        try:
+            with open(f"{self.fixtures_dir}/{route}.html", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def route_for(path, query):
+    if path.startswith("/authors/"):
+        return "book"
+    if path == "/Fetching_Resource.php":
+        return "fetch_resource"
+    if path.startswith("/files/"):
+        return "pdf"
+    if path.startswith("/wp-content/uploads/"):
+        return "image"
+    if path.startswith("/new-releases"):
+        return "new_releases"
+    if path.startswith("/magazines-newspapers"):
+        return "magazines"
+    if path.startswith("/books-by-genre"):
+        return "genres"
+    if path.startswith("/category/"):
+        return "genre"
+    if "s" in query:
+        return "search"
+    return "home"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None  # set on a subclass by the upstream_stub command
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        state = self.state
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == "/__stats":
+            return self._send(200, json.dumps(state.snapshot()), "application/json")
+        if parsed.path == "/__reset":
+            state.reset()
+            return self._send(200, "{}", "application/json")
+
+        route = route_for(parsed.path, query)
+        state.count(route)
+
+        delay = state.latency + random.uniform(0, state.jitter)
+        if delay:
+            time.sleep(delay)
+        if state.error_rate and random.random() < state.error_rate:
+            return self._send(503, "Service Unavailable")
+
+        base = state.base_url
+        recorded = state.recorded(route)
+
+        if route == "search":
+            return self._send(200, recorded or search_page(base, query["s"][0]))
+        if route in ("new_releases", "magazines"):
+            return self._send(200, recorded or listing_page(base, route))
+        if route == "genres":
+            return self._send(200, recorded or genres_page(base))
+        if route == "genre":
+            match = re.match(r"/category/(?:genres/)?([^/]+)/(?:page/(\d+)/)?", parsed.path)
+            slug = match.group(1) if match else "fiction"
+            page = int(match.group(2)) if match and match.group(2) else 1
+            return self._send(200, recorded or genre_page(base, slug, page))
+        if route == "book":
+            return self._send(200, recorded or book_page(base, parsed.path.strip("/").split("/")[-1]))
+        if route == "fetch_resource":
+            length = int(self.headers.get("Content-Length") or 0)
+            form = parse_qs(self.rfile.read(length).decode()) if length else {}
+            filename = form.get("filename", ["book.pdf"])[0]
+            return self._send(200, fetch_resource_page(base, filename))
+        if route == "pdf":
+            return self._send(200, pdf_file(state.pdf_pages), "application/pdf")
+        if route == "image":
+            return self._send(200, cover_image(parsed.path), "image/jpeg")
+        return self._send(200, _page("Home", ""))
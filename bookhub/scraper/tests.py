@@ -1,3 +1,671 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import pickle
+from datetime import datetime, timezone
+from email.utils import formatdate
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import httpx
+import orjson
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django_redis.client import DefaultClient
+
+from bookhub.http import JsonResponse
+
+from . import async_fetch, breaker, codec, local_cache, throttle, views
+from .caching import cache_parsed, get_parsed
+from .http_cache import CACHE_HIT, conditional
+from .throttle import UpstreamThrottled, async_upstream_slot, backoff_remaining, register_success, register_throttle, upstream_slot
+
+
+class FakeClock:
+    """Stands in for the ``time`` module: sleeping just moves the clock on."""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeRedis:
+    """
+    Just enough of a Redis client for the throttle and breaker, with key
+    expiry driven by a :class:`FakeClock`. There is no Lua here, so ``eval``
+    runs a Python port of the two throttle scripts.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.expires = {}
+        self.scripts = {
+            throttle.TOKEN_BUCKET_SCRIPT: self._token_bucket,
+            throttle.SEMAPHORE_SCRIPT: self._semaphore,
+        }
+
+    def _get(self, key, default=None):
+        if key in self.expires and self.expires[key] <= self.clock.time():
+            self.delete(key)
+        return self.data.setdefault(key, default) if default is not None else self.data.get(key)
+
+    def exists(self, key):
+        return int(self._get(key) is not None)
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += self.data.pop(key, None) is not None
+            self.expires.pop(key, None)
+        return removed
+
+    def expire(self, key, seconds):
+        if self._get(key) is None:
+            return False
+        self.expires[key] = self.clock.time() + seconds
+        return True
+
+    def persist(self, key):
+        return self.expires.pop(key, None) is not None
+
+    def ttl(self, key):
+        if self._get(key) is None:
+            return -2
+        return self.expires[key] - self.clock.time() if key in self.expires else -1
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self._get(key) is not None:
+            return None
+        self.data[key] = str(value)
+        self.expires.pop(key, None)
+        if ex:
+            self.expire(key, ex)
+        return True
+
+    def hget(self, key, field):
+        return (self._get(key) or {}).get(field)
+
+    def hmget(self, key, *fields):
+        return [self.hget(key, field) for field in fields]
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = self._get(key, {})
+        for field, value in (mapping or {field: value}).items():
+            values[field] = str(value).encode()
+        return 1
+
+    def hincrby(self, key, field, amount=1):
+        values = self._get(key, {})
+        values[field] = str(int(values.get(field, 0)) + amount).encode()
+        return int(values[field])
+
+    def zadd(self, key, mapping):
+        self._get(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        return int((self._get(key) or {}).pop(member, None) is not None)
+
+    def zcard(self, key):
+        return len(self._get(key) or {})
+
+    def zremrangebyscore(self, key, low, high):
+        members = self._get(key) or {}
+        for member, score in list(members.items()):
+            if score <= high:
+                del members[member]
+
+    def eval(self, script, numkeys, *keys_and_args):
+        return self.scripts[script](*keys_and_args)
+
+    def _token_bucket(self, key, rate, burst, now):
+        tokens, ts = self.hmget(key, 'tokens', 'ts')
+        tokens = float(tokens) if tokens is not None else burst
+        ts = float(ts) if ts is not None else now
+        tokens = min(burst, tokens + max(0, now - ts) * rate)
+        wait = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.hset(key, mapping={'tokens': tokens, 'ts': now})
+        self.expire(key, -(-burst // rate) + 1)
+        return str(wait).encode()
+
+    def _semaphore(self, key, limit, now, lease, lease_id):
+        self.zremrangebyscore(key, '-inf', now)
+        if self.zcard(key) < limit:
+            self.zadd(key, {lease_id: now + lease})
+            self.expire(key, lease + 1)
+            return 1
+        return 0
+
+
+class FakeRedisMixin:
+    """Points the throttle (and breaker) at a :class:`FakeRedis` on a fake clock."""
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.redis = FakeRedis(self.clock)
+        for patcher in (
+            mock.patch.object(throttle, 'time', self.clock),
+            mock.patch.object(throttle, '_redis', lambda: self.redis),
+            mock.patch.object(breaker, 'time', self.clock),
+            mock.patch.object(breaker, '_redis', lambda: self.redis),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+HOST = 'upstream.test'
+
+
+@override_settings(UPSTREAM_RATE_LIMIT=2.0, UPSTREAM_BURST=2, UPSTREAM_MAX_CONCURRENCY=2, UPSTREAM_LEASE_SECONDS=30, UPSTREAM_MAX_WAIT=10)
+class ThrottleTests(FakeRedisMixin, SimpleTestCase):
+    def take(self, count):
+        reservations = [throttle._Reservation(HOST) for _ in range(count)]
+        return reservations, [r.poll() for r in reservations]
+
+    def test_token_bucket_allows_a_burst_then_paces_requests(self):
+        reservations, polls = self.take(3)
+
+        self.assertEqual(polls[:2], [(0, None), (0, None)])
+        self.assertEqual(polls[2], (0.5, "rate limit"))  # one token every 1/rate seconds
+        for reservation in reservations[:2]:
+            reservation.release()
+
+        self.clock.sleep(0.5)
+        self.assertEqual(reservations[2].poll(), (0, None))
+
+    @override_settings(UPSTREAM_BURST=10)
+    def test_semaphore_caps_requests_in_flight(self):
+        reservations, polls = self.take(3)
+
+        self.assertEqual(polls[:2], [(0, None), (0, None)])
+        wait, reason = polls[2]
+        self.assertEqual(reason, "too many concurrent requests")
+        self.assertLess(wait, 1)
+
+        # The token taken on the first try is kept; only the slot is retried
+        reservations[0].release()
+        self.assertEqual(reservations[2].poll(), (0, None))
+        self.assertEqual(self.redis.zcard(throttle._key("inflight", HOST)), 2)
+
+    @override_settings(UPSTREAM_BURST=10)
+    def test_lease_of_a_crashed_worker_is_reclaimed(self):
+        self.take(2)  # never released
+        _, [(wait, reason)] = self.take(1)
+        self.assertEqual(reason, "too many concurrent requests")
+
+        self.clock.sleep(31)
+        self.assertEqual(self.take(1)[1], [(0, None)])
+
+    def test_upstream_slot_waits_for_a_token_and_releases_the_slot(self):
+        start = self.clock.time()
+        for _ in range(3):
+            with upstream_slot(HOST):
+                self.assertEqual(self.redis.zcard(throttle._key("inflight", HOST)), 1)
+
+        self.assertEqual(self.clock.time() - start, 0.5)
+        self.assertEqual(self.redis.zcard(throttle._key("inflight", HOST)), 0)
+
+    def test_async_upstream_slot_releases_the_slot(self):
+        async def fetch():
+            async with async_upstream_slot(HOST):
+                return self.redis.zcard(throttle._key("inflight", HOST))
+
+        self.assertEqual(asyncio.run(fetch()), 1)
+        self.assertEqual(self.redis.zcard(throttle._key("inflight", HOST)), 0)
+
+    def test_retry_after_opens_the_backoff_window(self):
+        register_throttle(HOST, "120")
+
+        self.assertEqual(backoff_remaining(HOST), 120)
+        wait, reason = throttle._Reservation(HOST).poll()
+        self.assertEqual((wait, reason), (120, "backing off for 120.0s"))
+        # Longer than UPSTREAM_MAX_WAIT: give up instead of holding the request
+        with self.assertRaises(UpstreamThrottled):
+            with upstream_slot(HOST):
+                pass
+
+        self.clock.sleep(120)
+        self.assertEqual(backoff_remaining(HOST), 0)
+
+    def test_retry_after_http_date(self):
+        register_throttle(HOST, formatdate(self.clock.time() + 90, usegmt=True))
+        self.assertEqual(backoff_remaining(HOST), 90)
+
+    def test_backoff_grows_with_each_throttle_and_decays_on_success(self):
+        with mock.patch.object(throttle.random, 'uniform', lambda low, high: high):
+            register_throttle(HOST)
+            self.assertEqual(backoff_remaining(HOST), 5)
+            register_throttle(HOST)
+            self.assertEqual(backoff_remaining(HOST), 10)
+
+        register_success(HOST)
+        self.assertEqual(self.redis.hget(throttle._key("backoff", HOST), "level"), b"1")
+        register_success(HOST)
+        self.assertFalse(self.redis.exists(throttle._key("backoff", HOST)))
+
+    def test_fails_open_without_redis(self):
+        def unreachable():
+            raise ConnectionError("redis down")
+
+        with mock.patch.object(throttle, '_redis', unreachable):
+            register_throttle(HOST, "120")
+            self.assertEqual(backoff_remaining(HOST), 0)
+            self.assertEqual(throttle._Reservation(HOST).poll(), (0, None))
+            with upstream_slot(HOST):
+                pass
+
+
+class InlineThread:
+    """``threading.Thread`` that runs its target on ``start()``, so probes finish before the assertions."""
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+@override_settings(UPSTREAM_BREAKER_THRESHOLD=3, UPSTREAM_BREAKER_WINDOW=60, UPSTREAM_BREAKER_COOLDOWN=30)
+class BreakerTests(FakeRedisMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.probes = []
+        patcher = mock.patch.object(breaker.threading, 'Thread', InlineThread)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def probe(self, ok):
+        def run():
+            self.probes.append(ok)
+            return ok
+        return run
+
+    def trip(self):
+        for _ in range(3):
+            breaker.record_failure(HOST)
+
+    def test_opens_after_threshold_failures_within_the_window(self):
+        breaker.record_failure(HOST)
+        breaker.record_failure(HOST)
+        self.assertTrue(breaker.allow_request(HOST))
+
+        breaker.record_failure(HOST)
+        self.assertTrue(breaker.is_open(HOST))
+        self.assertFalse(breaker.allow_request(HOST, self.probe(True)))
+        self.assertEqual(self.probes, [])  # still cooling down
+
+    def test_failures_further_apart_than_the_window_do_not_add_up(self):
+        for _ in range(3):
+            breaker.record_failure(HOST)
+            self.clock.sleep(61)
+        self.assertFalse(breaker.is_open(HOST))
+
+    def test_success_resets_the_failure_count(self):
+        breaker.record_failure(HOST)
+        breaker.record_failure(HOST)
+        breaker.record_success(HOST)
+        breaker.record_failure(HOST)
+        self.assertFalse(breaker.is_open(HOST))
+
+    def test_successful_probe_after_the_cooldown_closes_it(self):
+        self.trip()
+        self.clock.sleep(30)
+
+        # The request that starts the probe is still refused
+        self.assertFalse(breaker.allow_request(HOST, self.probe(True)))
+        self.assertEqual(self.probes, [True])
+        self.assertTrue(breaker.allow_request(HOST))
+
+    def test_failed_probe_keeps_it_open_for_another_cooldown(self):
+        self.trip()
+        self.clock.sleep(30)
+        self.assertFalse(breaker.allow_request(HOST, self.probe(False)))
+        self.assertTrue(breaker.is_open(HOST))
+
+        # One probe per cooldown, however many requests come in
+        self.clock.sleep(29)
+        self.assertFalse(breaker.allow_request(HOST, self.probe(True)))
+        self.clock.sleep(1)
+        self.assertFalse(breaker.allow_request(HOST, self.probe(True)))
+        self.assertEqual(self.probes, [False, True])
+        self.assertTrue(breaker.allow_request(HOST))
+
+    def test_stays_open_until_a_probe_succeeds(self):
+        self.trip()
+        self.clock.sleep(60 * 60 * 24)
+        self.assertTrue(breaker.is_open(HOST))
+        self.assertEqual(self.redis.ttl(breaker._key(HOST)), -1)
+
+    def test_success_does_not_write_when_closed(self):
+        with mock.patch.object(self.redis, 'delete', wraps=self.redis.delete) as delete:
+            breaker.record_success(HOST)
+            delete.assert_not_called()
+
+            breaker.record_failure(HOST)
+            breaker.record_success(HOST)
+            delete.assert_called_once_with(breaker._key(HOST))
+
+    def test_fails_open_without_redis(self):
+        def unreachable():
+            raise ConnectionError("redis down")
+
+        with mock.patch.object(breaker, '_redis', unreachable):
+            self.trip()
+            self.assertTrue(breaker.allow_request(HOST, self.probe(True)))
+            self.assertFalse(breaker.is_open(HOST))
+
+
+class CacheCodecTests(SimpleTestCase):
+    """Round trips through django-redis' own encode/decode, as configured in settings.CACHES."""
+
+    def redis_client(self):
+        return DefaultClient("redis://127.0.0.1:6379/0", {"OPTIONS": {
+            "SERIALIZER": "scraper.codec.ScraperSerializer",
+            "COMPRESSOR": "scraper.codec.ScraperCompressor",
+        }}, None)
+
+    def round_trip(self, value):
+        client = self.redis_client()
+        return client.decode(client.encode(value))
+
+    def test_json_values_round_trip(self):
+        listing = [{"title": "Dune", "author": "Frank Herbert", "book_count": 3, "image": None}]
+        details = {"title": "Dune", "metadata": {"pages": "412"}, "download_options": listing}
+
+        self.assertEqual(self.round_trip(listing), listing)
+        self.assertEqual(self.round_trip(details), details)
+        self.assertEqual(self.round_trip("<html>…</html>"), "<html>…</html>")
+        self.assertEqual(codec.encode(details)[:4], b"BH" + bytes((codec.SCHEMA_VERSION, codec.FORMAT_JSON)))
+
+    def test_tuples_come_back_as_lists(self):
+        self.assertEqual(self.round_trip({"pair": (1, 2)}), {"pair": [1, 2]})
+
+    def test_datetimes_fall_back_to_pickle(self):
+        value = {"checked_at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)}
+        fallbacks = codec.codec_stats()["pickle_fallbacks"]
+
+        self.assertEqual(self.round_trip(value), value)
+        self.assertEqual(codec.encode(value)[3], codec.FORMAT_PICKLE)
+        self.assertEqual(codec.codec_stats()["pickle_fallbacks"], fallbacks + 2)
+
+    @override_settings(CACHE_COMPRESS_MIN_BYTES=64)
+    def test_only_values_above_the_threshold_are_compressed(self):
+        client = self.redis_client()
+        small, large = "x" * 10, "<li>book</li>" * 100
+
+        self.assertEqual(client.encode(small), codec.encode(small))
+        stored = client.encode(large)
+        self.assertEqual(stored[:4], codec.ZSTD_MAGIC)
+        self.assertLess(len(stored), len(large))
+        self.assertEqual(client.decode(stored), large)
+
+    def test_values_written_before_the_codec_are_readable(self):
+        value = {"title": "Dune", "fetched": datetime(2025, 5, 1, tzinfo=timezone.utc)}
+
+        # django-redis defaults: plain pickle, no compression
+        self.assertEqual(self.redis_client().decode(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), value)
+        self.assertEqual(self.redis_client().decode(b"42"), 42)
+
+    def test_unknown_schema_version_is_rejected(self):
+        with self.assertRaises(ValueError):
+            codec.decode(b"BH" + bytes((codec.SCHEMA_VERSION + 1, codec.FORMAT_JSON)) + b"{}")
+
+
+class LocalLRUTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(local_cache, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lru = local_cache.LocalLRU(max_bytes=100, ttl=60)
+
+    def test_entries_expire_after_the_ttl(self):
+        self.lru.set("a", "value", size=10)
+        self.clock.sleep(59)
+        self.assertEqual(self.lru.get("a"), "value")
+        self.clock.sleep(2)
+        self.assertIsNone(self.lru.get("a"))
+        self.assertEqual(self.lru._size, 0)
+
+    def test_least_recently_used_entries_are_evicted_to_stay_in_budget(self):
+        for key in "abc":
+            self.lru.set(key, key, size=40)
+
+        self.assertIsNone(self.lru.get("a"))
+        self.assertEqual(self.lru.get("b"), "b")  # now the most recently used
+        self.lru.set("d", "d", size=40)
+        self.assertIsNone(self.lru.get("c"))
+        self.assertEqual((self.lru.get("b"), self.lru.get("d")), ("b", "d"))
+        self.assertEqual(self.lru._size, 80)
+
+    def test_values_larger_than_the_budget_are_not_kept(self):
+        self.lru.set("big", "x" * 200)
+        self.assertIsNone(self.lru.get("big"))
+
+
+class PublishRecorder:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+@override_settings(LOCAL_CACHE_KEYS=('new_releases', 'genre_books_*'))
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.local_cache.clear()
+        self.redis = PublishRecorder()
+        for patcher in (
+            mock.patch.object(local_cache, 'get_redis_connection', lambda alias: self.redis),
+            mock.patch.object(local_cache, '_ensure_listener', lambda: None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(local_cache.local_cache.clear)
+
+    def test_hot_keys_are_matched_up_to_the_delimiter(self):
+        for key in ('new_releases', 'new_releases:version', 'new_releases:body:abc-123', 'genre_books_fiction_page_2'):
+            self.assertTrue(local_cache.is_hot(key), key)
+        for key in ('new_releases_html', 'lkg_new_releases', 'genre_books', 'magazines'):
+            self.assertFalse(local_cache.is_hot(key), key)
+
+    def test_hot_key_is_served_locally_until_another_worker_invalidates_it(self):
+        local_cache.tiered_set('new_releases', ['v1'], timeout=60)
+        self.assertEqual(self.redis.published, [(local_cache.INVALIDATION_CHANNEL, f"{local_cache.WORKER_ID}:new_releases")])
+
+        cache.set('new_releases', ['v2'])  # written by another worker
+        self.assertEqual(local_cache.tiered_get('new_releases'), ['v1'])
+
+        # Our own broadcast comes back to us too and must not drop the fresh copy
+        local_cache._on_invalidation(f"{local_cache.WORKER_ID}:new_releases".encode())
+        self.assertEqual(local_cache.tiered_get('new_releases'), ['v1'])
+
+        local_cache._on_invalidation(b"other-worker:new_releases")
+        self.assertEqual(local_cache.tiered_get('new_releases'), ['v2'])
+
+    def test_other_keys_go_straight_to_redis(self):
+        local_cache.tiered_set('new_releases_html', '<html>', timeout=60)
+        cache.set('new_releases_html', '<html>v2')
+
+        self.assertEqual(local_cache.tiered_get('new_releases_html'), '<html>v2')
+        self.assertEqual(self.redis.published, [])
+
+
+LISTING_KEY = 'conditional_listing'
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+class ConditionalTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.records = [{"title": f"Book {i}", "link": f"/books/{i}/"} for i in range(50)]
+        cache_parsed(LISTING_KEY, self.records, timeout=3600)
+        self.calls = 0
+
+        @conditional(lambda request: LISTING_KEY, 3600, precompress_params=())
+        def listing(request):
+            self.calls += 1
+            return JsonResponse({"results": get_parsed(LISTING_KEY)}, headers=CACHE_HIT)
+
+        self.view = listing
+
+    def get(self, path='/listing/', **headers):
+        return self.view(self.factory.get(path, headers=headers))
+
+    def test_matching_if_none_match_is_answered_with_304(self):
+        etag = self.get()['ETag']
+        calls = self.calls
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', '*'):
+            response = self.get(**{'If-None-Match': header})
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.calls, calls)  # the view never ran
+
+        # Exact tags only: a tag that merely contains ours is a different one
+        self.assertEqual(self.get(**{'If-None-Match': etag[:-1] + 'x"'}).status_code, 200)
+
+    def test_new_payload_version_changes_the_etag(self):
+        etag = self.get()['ETag']
+
+        cache_parsed(LISTING_KEY, self.records[:10], timeout=3600)
+        response = self.get(**{'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(orjson.loads(response.content)["results"], self.records[:10])
+
+    def test_etag_depends_on_the_query_parameters(self):
+        self.assertNotEqual(self.get()['ETag'], self.get('/listing/?limit=5')['ETag'])
+
+    def test_precompressed_body_matches_accept_encoding(self):
+        identity = self.get()
+        self.assertEqual(self.calls, 1)
+
+        br = self.get(**{'Accept-Encoding': 'gzip, deflate, br'})
+        gz = self.get(**{'Accept-Encoding': 'gzip'})
+        plain = self.get()
+
+        self.assertEqual(self.calls, 1)  # all served from the stored body
+        self.assertEqual((br['Content-Encoding'], br['ETag']), ('br', f"W/{identity['ETag']}"))
+        self.assertEqual(brotli.decompress(br.content), identity.content)
+        self.assertEqual(gz['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gz.content), identity.content)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual((plain.content, plain['ETag'], plain['X-Cache']), (identity.content, identity['ETag'], 'HIT'))
+        self.assertIn('Accept-Encoding', br['Vary'])
+
+    def test_async_views_are_supported(self):
+        @conditional(lambda request: LISTING_KEY, 3600, precompress_params=())
+        async def listing(request):
+            return JsonResponse({"results": get_parsed(LISTING_KEY)})
+
+        first = asyncio.run(listing(self.factory.get('/listing/')))
+        second = asyncio.run(listing(self.factory.get('/listing/', headers={'If-None-Match': first['ETag']})))
+
+        self.assertEqual((first.status_code, second.status_code), (200, 304))
+
+    def test_degraded_responses_are_not_cached(self):
+        @conditional(lambda request: LISTING_KEY, 3600)
+        def listing(request):
+            return JsonResponse({"degraded": True, "results": []})
+
+        response = listing(self.factory.get('/listing/'))
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_cover_etag_is_matched_exactly(self):
+        etag = '"0123abcd"'
+        thumbnail = mock.AsyncMock(return_value=(b"webp", "image/webp", etag))
+        with mock.patch.object(views, 'get_thumbnail', thumbnail), mock.patch.object(views, 'allowed_image_source', lambda src: True):
+            def cover(if_none_match):
+                request = self.factory.get('/api/cover/?src=https://img.test/a.jpg', headers={'If-None-Match': if_none_match})
+                return asyncio.run(views.cover_image(request)).status_code
+
+            self.assertEqual(cover(etag), 304)
+            self.assertEqual(cover(f'"other", W/{etag}'), 304)
+            self.assertEqual(cover('*'), 304)
+            # Contains our tag as a substring, but isn't a list of tags that includes it
+            self.assertEqual(cover('"prefix"0123abcd""'), 200)
+            self.assertEqual(cover('"0123abcd-large"'), 200)
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+class BookDetailBatchTests(SimpleTestCase):
+    def test_results_follow_the_request_order(self):
+        details = {"title": "Dune", "author": "Frank Herbert", "publish_date": "", "cover_image": "", "description": "",
+                   "summary": "", "metadata": {}, "download_options": []}
+        found = mock.AsyncMock(return_value={"a/dune": ("cached", details), "b/missing": ("not_found", None)})
+        slugs = ["a/dune", 42, "/b/missing/", "../etc/passwd", "a/dune"]
+        request = RequestFactory().post('/api/book-detail/batch/', {"slugs": slugs}, content_type='application/json')
+
+        with mock.patch.object(views, 'fetch_book_details_many', found):
+            response = asyncio.run(views.book_detail_batch(request))
+
+        found.assert_awaited_once_with(["a/dune", "b/missing"])
+        results = orjson.loads(response.content)["results"]
+        self.assertEqual(
+            [(item["slug"], item["status"]) for item in results],
+            [("a/dune", "cached"), (42, "invalid"), ("b/missing", "not_found"), ("../etc/passwd", "invalid")],
+        )
+        self.assertEqual(results[0]["data"]["title"], "Dune")
+
+
+class GenreBooksTests(SimpleTestCase):
+    def get(self, slug, genre):
+        request = RequestFactory().get(f'/api/genres/{slug}/')
+        with mock.patch.object(views, 'get_parsed', return_value=None), \
+                mock.patch.object(views, 'aget_genre_by_slug', mock.AsyncMock(return_value=genre)), \
+                mock.patch.object(views, 'ascrape_html', mock.AsyncMock(return_value='<html></html>')), \
+                mock.patch.object(views, 'cache_parsed'), \
+                mock.patch.object(views, 'record_genre_hit') as record:
+            response = asyncio.run(views.genre_books(request, genre_slug=slug))
+        return response, record
+
+    def test_unknown_slugs_are_not_counted(self):
+        response, record = self.get('not-a-genre', None)
+        self.assertEqual(response.status_code, 404)
+        record.assert_not_called()
+
+    def test_known_slugs_are_counted(self):
+        response, record = self.get('fantasy', {'name': 'Fantasy', 'url': f'https://{HOST}/category/genre/fantasy/'})
+        self.assertEqual(response.status_code, 200)
+        record.assert_called_once_with('fantasy')
+
+
+class AsyncFetchTests(FakeRedisMixin, SimpleTestCase):
+    def fetch(self, url, **kwargs):
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(self.upstream)) as client:
+                with mock.patch.object(async_fetch, 'get_client', lambda: client):
+                    return await async_fetch.amake_request(url, **kwargs)
+        return asyncio.run(run())
+
+    def upstream(self, request):
+        if request.url.path == '/gone/':
+            return httpx.Response(404)
+        body = brotli.compress('<html>Café</html>'.encode())
+        return httpx.Response(200, headers={'Content-Encoding': 'br', 'Content-Type': 'text/html; charset=utf-8'}, content=body)
+
+    def test_brotli_pages_are_decoded_once(self):
+        self.assertEqual(self.fetch(f'https://{HOST}/page/', decode_brotli=True), '<html>Café</html>')
+        self.assertEqual(self.fetch(f'https://{HOST}/page/').text, '<html>Café</html>')
+
+    def test_missing_pages_are_not_found_rather_than_failures(self):
+        self.assertIs(self.fetch(f'https://{HOST}/gone/'), async_fetch.NOT_FOUND)
+        self.assertFalse(breaker.is_open(HOST))
@@ -0,0 +1,252 @@
+"""
+Per-host throttling for upstream requests, shared across workers via Redis.
+
+Three independent guards are applied before every upstream fetch:
+
+* a token bucket that caps the sustained request rate per host,
+* a lease-based semaphore that caps concurrent in-flight requests per host,
+* an adaptive backoff window that opens when the upstream answers with
+  429/503 or a Cloudflare challenge, honouring ``Retry-After``.
+
+If Redis is unreachable the guards fail open so scraping keeps working.
+The Redis client is sync: :func:`async_upstream_slot` makes its calls from
+worker threads so the event loop never blocks on them.
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+CHALLENGE_MARKERS = (b"cf-chl", b"Just a moment...", b"challenge-platform")
+
+# Refill the bucket for the elapsed time and take one token. Returns the
+# number of seconds to wait before a token is available ("0" on success).
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Drop expired leases, then take a slot if one is free.
+SEMAPHORE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local lease = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now + lease, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], math.ceil(lease) + 1)
+    return 1
+end
+return 0
+"""
+
+
+class UpstreamThrottled(Exception):
+    """Raised when a request cannot be sent within UPSTREAM_MAX_WAIT."""
+
+
+def get_host(url):
+    return urlparse(url).netloc.lower()
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _key(kind, host):
+    return f"upstream:{kind}:{host}"
+
+
+def is_throttle_response(resp):
+    """True for 429/503 answers and Cloudflare challenge pages."""
+    if resp is None:
+        return False
+    if resp.status_code in THROTTLE_STATUSES:
+        return True
+    if resp.status_code == 403:
+        head = resp.content[:4096] if resp.content else b""
+        return any(marker in head for marker in CHALLENGE_MARKERS)
+    return False
+
+
+def parse_retry_after(value):
+    """Return Retry-After in seconds (delta-seconds or HTTP-date form)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_remaining(host):
+    """Seconds left in the host's backoff window (0 when not backing off)."""
+    try:
+        until = _redis().hget(_key("backoff", host), "until")
+    except Exception as e:
+        logger.warning(f"Throttle state unavailable for {host}: {e}")
+        return 0.0
+    if not until:
+        return 0.0
+    return max(0.0, float(until) - time.time())
+
+
+def register_throttle(host, retry_after=None):
+    """Open (or widen) the backoff window after a throttled response."""
+    key = _key("backoff", host)
+    try:
+        conn = _redis()
+        level = conn.hincrby(key, "level", 1)
+        level = min(level, 10)
+        delay = min(settings.UPSTREAM_BACKOFF_MAX, settings.UPSTREAM_BACKOFF_BASE * (2 ** (level - 1)))
+        # Jitter keeps workers from retrying in lockstep once the window closes
+        delay = random.uniform(delay / 2, delay)
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        conn.hset(key, "until", time.time() + delay)
+        conn.expire(key, int(delay + settings.UPSTREAM_BACKOFF_MAX))
+        logger.warning(f"Upstream {host} throttled us; backing off {delay:.1f}s (level {level})")
+    except Exception as e:
+        logger.warning(f"Could not record throttle for {host}: {e}")
+
+
+def register_success(host):
+    """Let the backoff level decay once the upstream answers normally again."""
+    key = _key("backoff", host)
+    try:
+        conn = _redis()
+        if conn.exists(key) and conn.hincrby(key, "level", -1) <= 0:
+            conn.delete(key)
+    except Exception as e:
+        logger.warning(f"Could not record success for {host}: {e}")
+
+
+def _take_token(conn, host):
+    wait = conn.eval(
+        TOKEN_BUCKET_SCRIPT, 1, _key("bucket", host),
+        settings.UPSTREAM_RATE_LIMIT, settings.UPSTREAM_BURST, time.time(),
+    )
+    return float(wait)
+
+
+def _take_slot(conn, host, lease_id):
+    return conn.eval(
+        SEMAPHORE_SCRIPT, 1, _key("inflight", host),
+        settings.UPSTREAM_MAX_CONCURRENCY, time.time(), settings.UPSTREAM_LEASE_SECONDS, lease_id,
+    ) == 1
+
+
+class _Reservation:
+    """
+    Non-blocking acquisition state shared by the sync and async slot
+    context managers. ``poll`` never sleeps; callers sleep for the returned
+    number of seconds and poll again.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.lease_id = uuid.uuid4().hex
+        self.deadline = time.monotonic() + settings.UPSTREAM_MAX_WAIT
+        self.has_token = False
+        self.acquired = False
+        self.conn = None
+
+    def poll(self):
+        """Return ``(seconds_to_wait, reason)``; ``(0, None)`` once the slot is held."""
+        try:
+            if self.conn is None:
+                self.conn = _redis()
+
+            remaining = backoff_remaining(self.host)
+            if remaining:
+                return remaining, f"backing off for {remaining:.1f}s"
+
+            if not self.has_token:
+                wait = _take_token(self.conn, self.host)
+                if wait > 0:
+                    return wait, "rate limit"
+                self.has_token = True
+
+            if not _take_slot(self.conn, self.host, self.lease_id):
+                return random.uniform(0.05, 0.25), "too many concurrent requests"
+            self.acquired = True
+        except Exception as e:
+            logger.warning(f"Throttle unavailable for {self.host}, continuing unthrottled: {e}")
+        return 0, None
+
+    def check_wait(self, seconds, reason):
+        if time.monotonic() + seconds > self.deadline:
+            raise UpstreamThrottled(f"{self.host}: {reason}")
+
+    def release(self):
+        if self.acquired:
+            try:
+                self.conn.zrem(_key("inflight", self.host), self.lease_id)
+            except Exception:
+                pass
+
+
+@contextmanager
+def upstream_slot(host):
+    """
+    Block until the host's backoff window, token bucket and concurrency
+    limit all allow another request, then hold a slot for the duration.
+    """
+    reservation = _Reservation(host)
+    while True:
+        wait, reason = reservation.poll()
+        if not wait:
+            break
+        reservation.check_wait(wait, reason)
+        time.sleep(wait)
+
+    try:
+        yield
+    finally:
+        reservation.release()
+
+
+@asynccontextmanager
+async def async_upstream_slot(host):
+    """Async counterpart of :func:`upstream_slot` that yields to the event loop while waiting."""
+    reservation = _Reservation(host)
+    while True:
+        wait, reason = await asyncio.to_thread(reservation.poll)
+        if not wait:
+            break
+        reservation.check_wait(wait, reason)
+        await asyncio.sleep(wait)
+
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(reservation.release)
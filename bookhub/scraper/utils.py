@@ -5,30 +5,100 @@ from django.conf import settings
 from django.core.cache import cache
 import time
 import random
-from urllib.parse import quote
+import hashlib
+from urllib.parse import quote, urlencode, urlparse
 import cloudscraper
+from cloudscraper.exceptions import CloudflareChallengeError
 import brotli
+from bookhub.metrics import time_upstream, timed_parser
+from bookhub.tracing import set_attributes, traced
+
+from . import breaker
+from .caching import cache_lookup, cache_parsed, cache_store, get_parsed, last_known_good
+from .throttle import (
+    UpstreamThrottled,
+    get_host,
+    is_throttle_response,
+    register_success,
+    register_throttle,
+    upstream_slot,
+)
 
 
 ua=UserAgent()
 
-def make_request(url, decode_brotli=False):
-    try:
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/115.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate, br",
+}
+
+# Upstream answers that mean the page doesn't exist, as opposed to a failed fetch
+NOT_FOUND_STATUSES = (404, 410)
+
+
+class _NotFound:
+    """Falsy marker the fetch helpers return for NOT_FOUND_STATUSES, where other failures give None."""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'NOT_FOUND'
+
+
+NOT_FOUND = _NotFound()
+
+
+def _fetch(url):
+    """Send one throttled GET to the upstream and return the raw response."""
+    host = get_host(url)
+    with upstream_slot(host):
         scraper = cloudscraper.create_scraper(
             browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False}
         )
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/115.0.0.0 Safari/537.36"
-            ),
-            "Accept-Language": "en-US,en;q=0.9",
-            "Accept-Encoding": "gzip, deflate, br",
-        }
-
-        resp = scraper.get(url, headers=headers, timeout=15)
+        with time_upstream(host) as fetch:
+            resp = scraper.get(url, headers=DEFAULT_HEADERS, timeout=15)
+            fetch['status'] = resp.status_code
+        set_attributes(**{'server.address': host, 'http.response.status_code': resp.status_code})
+        return resp
+
+
+def probe_upstream():
+    """Background health check used by the circuit breaker to close again."""
+    resp = _fetch(f"{settings.API_BASE_URL}/")
+    return resp.status_code < 500 and not is_throttle_response(resp)
+
+
+def upstream_available():
+    return not breaker.is_open(get_host(settings.API_BASE_URL))
+
+
+@traced('scraper.make_request')
+def make_request(url, decode_brotli=False):
+    host = get_host(url)
+    if not breaker.allow_request(host, probe=probe_upstream):
+        print(f"Request skipped, circuit open for {host}: {url}")
+        return None
+
+    try:
+        resp = _fetch(url)
+
+        if is_throttle_response(resp):
+            register_throttle(host, resp.headers.get("Retry-After"))
+            breaker.record_failure(host)
+            print(f"Request throttled by upstream: {resp.status_code} {url}")
+            return None
+
+        if resp.status_code >= 500:
+            breaker.record_failure(host)
         resp.raise_for_status()
+        register_success(host)
+        breaker.record_success(host)
 
         if decode_brotli and resp.headers.get("Content-Encoding") == "br":
             decoded = brotli.decompress(resp.content).decode('utf-8', errors='ignore')
@@ -39,35 +109,99 @@ def make_request(url, decode_brotli=False):
             resp.encoding = 'utf-8'
         return resp
 
+    except UpstreamThrottled as e:
+        print(f"Request skipped, upstream busy: {e}")
+        return None
+    except CloudflareChallengeError as e:
+        register_throttle(host)
+        breaker.record_failure(host)
+        print(f"Request failed: {e}")
+        return None
+    except requests.exceptions.HTTPError as e:
+        print(f"Request failed: {e}")
+        if e.response is not None and e.response.status_code in NOT_FOUND_STATUSES:
+            return NOT_FOUND
+        return None
     except Exception as e:
+        breaker.record_failure(host)
         print(f"Request failed: {e}")
         return None
+
+def search_page(query):
+    """``(cache_key, url)`` of the raw search results page; the async views share these with ``scrape_search``."""
+    return f"search_{query.lower().replace(' ', '_')}", f"{settings.API_BASE_URL}/?s={quote(query)}"
+
+
 def scrape_search(query):
     query = query.strip()
     if not query:
         return []
-    cache_key = f"search_{query.lower().replace(' ', '_')}"
+    cache_key, url = search_page(query)
 
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return cached
 
-    url = f"{settings.API_BASE_URL}/?s={quote(query)}"
     response = make_request(url)
 
-    return response.content.decode('utf-8', errors='')
+    if not response:
+        return None
+
+    html_content = response.content.decode('utf-8', errors='ignore')
+    cache_store(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
+    return html_content
+
+def is_upstream_url(url):
+    """True for OceanofPDF links and links on the configured API_BASE_URL (e.g. the load-test stub)."""
+    return 'oceanofpdf.com' in url or url.startswith(settings.API_BASE_URL)
+
+
+def allowed_image_source(url):
+    """True for http(s) images on COVER_PROXY_HOSTS or the API_BASE_URL host."""
+    if not url or urlparse(url).scheme not in ('http', 'https'):
+        return False
+    host = get_host(url)
+    allowed = set(settings.COVER_PROXY_HOSTS) | {get_host(settings.API_BASE_URL)}
+    return any(host == h or host.endswith(f".{h}") for h in allowed)
+
+
+def proxied_image_url(url, width=None):
+    """URL of the cover proxy thumbnail for ``url``; anything it won't proxy is returned unchanged."""
+    if not settings.COVER_PROXY_ENABLED or not allowed_image_source(url):
+        return url
+    query = urlencode({'src': url, 'w': width or settings.COVER_THUMB_DEFAULT_WIDTH})
+    return f"{settings.COVER_PROXY_BASE}/api/cover/?{query}"
+
+
+def book_cache_key(book_url):
+    return f"book_{book_url.rstrip('/').split('/')[-1]}"
+
+def make_soup(html):
+    """Parse ``html`` with the configured backend (settings.HTML_PARSER)."""
+    return BeautifulSoup(html, settings.HTML_PARSER)
+
 
 def scrape_book_details(book_url):
-    """Enhanced book details extraction with safety checks"""
-    cache_key = f"book_{book_url.split('/')[-2]}"
+    """
+    Enhanced book details extraction with safety checks. Returns None when
+    the fetch failed and NOT_FOUND when the upstream has no such book.
+    """
+    cache_key = book_cache_key(book_url)
     
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return cached
     
     response = make_request(book_url)
     if not response:
-        return None
+        return response
     
-    soup = BeautifulSoup(response.text, 'html.parser')
+    details = parse_book_details(response.text)
+    cache_parsed(cache_key, details, settings.SCRAPE_CACHE_TIMEOUT)
+    return details
+
+@traced()
+@timed_parser
+def parse_book_details(html):
+    soup = make_soup(html)
     entry_content = soup.find('div', class_='entry-content')
     
     # Extract core information with safety checks
@@ -89,8 +223,6 @@ def scrape_book_details(book_url):
         'publish_date': details['publish_date'],
         'cover_image': details['cover_image']
     }
-    
-    cache.set(cache_key, details, settings.SCRAPE_CACHE_TIMEOUT)
     return details
 
 # Helper functions
@@ -105,7 +237,7 @@ def extract_author(entry_content):
 
 def extract_cover_image(soup):
     img = soup.find('img', class_='aligncenter')
-    return img['src'] if img and 'src' in img.attrs else None
+    return proxied_image_url(img['src'], max(settings.COVER_THUMB_WIDTHS)) if img and 'src' in img.attrs else None
 
 def extract_description(entry_content):
     if not entry_content:
@@ -168,13 +300,16 @@ def extract_download_options(soup):
     
     return options
 
+def new_releases_page():
+    return "new_releases_html", f"{settings.API_BASE_URL}/new-releases/"
+
+
 def scrape_new_releases():
-    cache_key = "new_releases"
+    cache_key, url = new_releases_page()
 
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return cached
 
-    url = f"{settings.API_BASE_URL}/new-releases/"
     response = make_request(url)
 
     if not response:
@@ -182,12 +317,14 @@ def scrape_new_releases():
 
     html_content = response.content.decode('utf-8', errors='ignore')
 
-    cache.set(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
+    cache_store(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
     return html_content
 
 import re
+@traced()
+@timed_parser
 def parse_search_results(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     books = []
 
     for article in soup.select("article"):  # Each book is inside an <article> tag
@@ -195,7 +332,7 @@ def parse_search_results(html):
         img_tag = article.select_one("img")
         link = title_tag["href"] if title_tag else None
         title = title_tag.get_text(strip=True) if title_tag else None
-        image = img_tag["src"] if img_tag else None
+        image = proxied_image_url(img_tag["src"]) if img_tag else None
 
         author = "Unknown Author"
         if link:
@@ -215,7 +352,7 @@ def parse_search_results(html):
     return books
 
 # def parse_new_releases(html):
-#     soup = BeautifulSoup(html, "html.parser")
+#     soup = make_soup(html)
 #     books = []
 
 #     for item in soup.select("a.title-image"):  # selects all book cover links
@@ -256,8 +393,10 @@ def parse_search_results(html):
 
 #     return books
 
+@traced()
+@timed_parser
 def parse_new_releases(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     books = []
 
     for item in soup.select("a.title-image"):
@@ -286,7 +425,7 @@ def parse_new_releases(html):
         books.append({
             "title": title,
             "link": link,
-            "image": image,
+            "image": proxied_image_url(image),
             "author": author,
         })
 
@@ -295,7 +434,7 @@ def parse_new_releases(html):
 def scrape_magazines():
     cache_key = "magazines_html"
 
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return cached
 
     url = f"{settings.API_BASE_URL}/magazines-newspapers/"
@@ -306,12 +445,14 @@ def scrape_magazines():
 
     html_content = response.content.decode('utf-8', errors='ignore')
 
-    cache.set(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
+    cache_store(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
     return html_content
 
 
+@traced()
+@timed_parser
 def parse_magazines(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     books = []
 
     for item in soup.select("a.title-image"):
@@ -340,7 +481,7 @@ def parse_magazines(html):
         books.append({
             "title": title,
             "link": link,
-            "image": image,
+            "image": proxied_image_url(image),
             "author": author,
         })
 
@@ -349,7 +490,7 @@ def parse_magazines(html):
 def scrape_novels():
     cache_key = "novels_html"
 
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return cached
 
     url = f"{settings.API_BASE_URL}/webnovels/"
@@ -360,12 +501,14 @@ def scrape_novels():
 
     html_content = response.content.decode('utf-8', errors='ignore')
 
-    cache.set(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
+    cache_store(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
     return html_content
 
 
+@traced()
+@timed_parser
 def parse_novels(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     books = []
 
     for item in soup.select("a.title-image"):
@@ -394,34 +537,39 @@ def parse_novels(html):
         books.append({
             "title": title,
             "link": link,
-            "image": image,
+            "image": proxied_image_url(image),
             "author": author,
         })
 
     return books
 
+def genres_page():
+    # This is the main link you provided
+    return "genres_html", settings.API_BASE_URL + "/books-by-genre/"
+
+
 def scrape_genres():
     """Scrape genres from Ocean of PDF"""
-    cache_key = "genres_html"
+    cache_key, url = genres_page()
     
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return cached
     
-    # This is the main link you provided
-    url = settings.API_BASE_URL + "/books-by-genre/"
     response = make_request(url)
     
     if not response:
         return None
     
     html_content = response.content.decode('utf-8', errors='ignore')
-    cache.set(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
+    cache_store(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
     return html_content
 
 
+@traced()
+@timed_parser
 def parse_genres(html):
     """Parse genres from HTML content with the specific Ocean of PDF structure"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     genres = []
     
     # Find all h3 elements with class h3genres (based on your HTML sample)
@@ -468,8 +616,8 @@ def parse_genres(html):
     # Sort alphabetically by name
     return sorted(genres, key=lambda x: x['name'])
 
-def scrape_books_by_genre(genre_url, page=1):
-    """Scrape books from a specific genre URL"""
+def genre_page(genre_url, page=1):
+    """``(cache_key, url)`` of one page of a genre listing."""
     try:
         page = int(page)
         if page < 1:
@@ -477,11 +625,9 @@ def scrape_books_by_genre(genre_url, page=1):
     except (ValueError, TypeError):
         page = 1
 
-    cache_key = f"books_{hash(genre_url)}_page_{page}"
+    # hash() is salted per process, so use a stable digest that all workers agree on
+    cache_key = f"books_{hashlib.md5(genre_url.encode()).hexdigest()}_page_{page}"
 
-    if cached := cache.get(cache_key):
-        return cached
-    
     # Handle pagination using Ocean of PDF's structure
     if page > 1:
         if genre_url.endswith('/'):
@@ -490,6 +636,15 @@ def scrape_books_by_genre(genre_url, page=1):
             url = f"{genre_url}/page/{page}/"
     else:
         url = genre_url
+    return cache_key, url
+
+
+def scrape_books_by_genre(genre_url, page=1):
+    """Scrape books from a specific genre URL"""
+    cache_key, url = genre_page(genre_url, page)
+
+    if cached := cache_lookup(cache_key):
+        return cached
     
     response = make_request(url)
     
@@ -497,13 +652,15 @@ def scrape_books_by_genre(genre_url, page=1):
         return None
     
     html_content = response.content.decode('utf-8', errors='ignore')
-    cache.set(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
+    cache_store(cache_key, html_content, settings.SCRAPE_CACHE_TIMEOUT)
     return html_content
 
 
+@traced()
+@timed_parser
 def parse_books_from_genre(html, genre_name):
     """Parse books from genre page HTML using exact Ocean of PDF structure"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     books = []
     
     # Use the exact selector for Ocean of PDF book articles
@@ -535,7 +692,8 @@ def parse_books_from_genre(html, genre_name):
             image = img_element.get('data-src') or img_element.get('src')
             # Ensure absolute URL
             if image and not image.startswith('http'):
-                image = f"{settings.BASE_URL}{image}"
+                image = f"{settings.API_BASE_URL}{image}"
+            image = proxied_image_url(image)
         
         # Extract description from .entry-content
         description = None
@@ -553,7 +711,7 @@ def parse_books_from_genre(html, genre_name):
         
         books.append({
             "title": title,
-            "link": link if link.startswith('http') else f"{settings.BASE_URL}{link}",
+            "link": link if link.startswith('http') else f"{settings.API_BASE_URL}{link}",
             "author": author,
             "image": image,
             "description": description,
@@ -565,9 +723,11 @@ def parse_books_from_genre(html, genre_name):
     return books
 
 
+@traced()
+@timed_parser
 def get_total_pages_from_genre(html):
     """Extract total pages from pagination elements"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     
     # Look for pagination in various locations
     pagination_elements = soup.select("div.pagination, nav.pagination, .page-numbers, .nav-links")
@@ -594,12 +754,22 @@ def get_total_pages_from_genre(html):
 
 def get_genre_by_slug(slug):
     """Get a specific genre by its slug"""
-    html_content = scrape_genres()
-    if not html_content:
+    # The parsed list is usually already cached (and held in memory) by /api/genres/
+    genres = get_parsed('genres_list')
+    if not genres:
+        html_content = scrape_genres()
+        if html_content:
+            genres = parse_genres(html_content)
+        else:
+            # Genre URLs rarely change, so the backup list is good enough while the upstream is down
+            genres = last_known_good('genres_list')
+    return find_genre(genres, slug)
+
+
+def find_genre(genres, slug):
+    if not genres:
         return None
-    
-    genres = parse_genres(html_content)
     for genre in genres:
         if genre['slug'] == slug:
             return genre
-    return None
\ No newline at end of file
+    return None
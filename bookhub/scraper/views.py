@@ -1,11 +1,36 @@
 from django.shortcuts import render
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .utils import scrape_search, scrape_book_details, scrape_new_releases, parse_search_results, parse_new_releases, scrape_magazines, parse_magazines, scrape_novels, parse_novels
+from .utils import search_page, new_releases_page, genre_page, parse_search_results, parse_new_releases, scrape_magazines, parse_magazines, scrape_novels, parse_novels, book_cache_key, is_upstream_url, parse_book_details, allowed_image_source
+from .async_fetch import afetch_html_many, aget_genre_by_slug, ascrape_book_details, ascrape_html
+from .images import FORMATS, ImageTooLarge, get_thumbnail, snap_width
+from .caching import (
+    GENRE_BOOKS_TIMEOUT,
+    GENRES_TIMEOUT,
+    MAGAZINES_TIMEOUT,
+    NEW_RELEASES_TIMEOUT,
+    cache_lookup,
+    cache_parsed,
+    genre_books_key,
+    get_parsed,
+    last_known_good,
+)
+from .warming import record_genre_hit
+from .http_cache import CACHE_HIT, CACHE_MISS, conditional, etag_matches
+from .pagination import listing_page, paginated
 from django.core.cache import cache
+from django.views.decorators.http import require_GET, require_POST
+from django_ratelimit.core import is_ratelimited
+from bookhub.async_views import offload, run_blocking
+from bookhub.http import JsonResponse
+from bookhub.metrics import PDF_CLEAN_PAGES, PDF_CLEAN_TIME, record_cache
+from bookhub.tracing import set_attributes, span, traced
+import asyncio
+import json
 import requests
-from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect
 from io import BytesIO
+from functools import wraps
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
@@ -25,77 +50,146 @@ from .utils import scrape_genres, parse_genres, parse_books_from_genre, scrape_b
 
 logger = logging.getLogger(__name__)
 
-@ratelimit(key='ip', rate='10/m', method='ALL', block=True)
-@api_view(['GET'])
-def search(request):
+
+def degraded_response(cache_key, payload, request=None, response_class=Response):
+    """
+    Serve the last-known-good copy of ``cache_key`` when the upstream
+    could not be scraped, or a 503 when no copy exists yet. Pass
+    ``request`` to apply the listing pagination/projection params, and
+    ``response_class=JsonResponse`` from views that don't go through DRF.
+    """
+    backup = last_known_good(cache_key)
+    if backup is None:
+        logger.warning(f"Upstream unavailable and no backup for {cache_key}")
+        return response_class({
+            **payload,
+            'error': 'Upstream source is temporarily unavailable',
+            'degraded': True,
+            'count': 0,
+            'results': []
+        }, status=503)
+
+    logger.warning(f"Serving last-known-good data for {cache_key}")
+    page = listing_page(request, backup) if request is not None else {'count': len(backup), 'results': backup}
+    return response_class({
+        **payload,
+        'degraded': True,
+        **page
+    }, headers=CACHE_HIT)
+
+
+def search_cache_key(query):
+    return f"search_results_{query.lower().replace(' ', '_')}"
+
+
+def book_url_for(book_slug):
+    return f"{settings.API_BASE_URL}/authors/{book_slug}/"
+
+
+def async_ratelimit(group, rate):
+    """``ratelimit(key='ip', block=True)`` for native async views, answering 429."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if await run_blocking(is_ratelimited, request, group=group, key='ip', rate=rate, increment=True):
+                return JsonResponse({'error': 'Too many requests'}, status=429)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def page_param(request):
+    """The ``page`` query parameter as a positive integer (1 when missing or invalid)."""
+    try:
+        page = int(request.GET.get('page', '1'))
+    except (ValueError, TypeError):
+        return 1
+    return max(page, 1)
+
+
+@require_GET
+@async_ratelimit('scraper.search', '10/m')
+@conditional(lambda request: search_cache_key(request.GET.get('s', '').strip()), settings.SCRAPE_CACHE_TIMEOUT)
+@paginated
+async def search(request):
     query = request.GET.get('s', '').strip()
     
     if not query:
-        return Response({'error': 'Query parameter "s" is required'}, status=400)
+        return JsonResponse({'error': 'Query parameter "s" is required'}, status=400)
 
-    results = scrape_search(query)
-    # html = results.content.decode('utf-8', errors='replace')
-    parsed_results = parse_search_results(results)
-    return Response({'query': query, 'results': parsed_results if parsed_results else []})
+    cache_key = search_cache_key(query)
+    results = await ascrape_html(*search_page(query))
+    if results is None:
+        return await run_blocking(degraded_response, cache_key, {'query': query}, request, response_class=JsonResponse)
 
+    parsed_results = await asyncio.to_thread(parse_search_results, results)
+    await run_blocking(cache_parsed, cache_key, parsed_results, settings.SCRAPE_CACHE_TIMEOUT)
+    return JsonResponse({'query': query, **listing_page(request, parsed_results)})
 
 
-@api_view(['GET'])
-@ratelimit(key='ip', rate='20/m', block=True)
-def new_releases(request):
+
+@require_GET
+@async_ratelimit('scraper.new_releases', '20/m')
+@conditional(lambda request: 'new_releases', NEW_RELEASES_TIMEOUT, precompress_params=())
+@paginated
+async def new_releases(request):
     cache_key = 'new_releases'
     
-    cached = cache.get(cache_key)
+    cached = await run_blocking(get_parsed, cache_key)
     if cached:
         logger.info("Serving new releases from cache")
-        return Response(
+        return JsonResponse(
             {
-            'source': 'OceanofPF New Releases',
-            'count': len(cached),
-            'cached': True,
-            'results': cached,
-            
-        }
+            'source': 'OceanofPDF New Releases',
+            **listing_page(request, cached)
+        },
+            headers=CACHE_HIT
         )
     logger.info("Cache miss — scraping new releases")
-    results = scrape_new_releases()
-    parsed_results = parse_new_releases(results)
-    cache.set(cache_key, parsed_results, timeout=60 * 60 * 8)
+    results = await ascrape_html(*new_releases_page())
+    if results is None:
+        return await run_blocking(degraded_response, cache_key, {'source': 'OceanofPDF New Releases'}, request, response_class=JsonResponse)
 
-    return Response(
+    parsed_results = await asyncio.to_thread(parse_new_releases, results)
+    await run_blocking(cache_parsed, cache_key, parsed_results, timeout=NEW_RELEASES_TIMEOUT)
+
+    return JsonResponse(
         {
             'source': 'OceanofPDF New Releases',
-            'cached': False,
-            'count': len(parsed_results),
-            'results': parsed_results
-        }
+            **listing_page(request, parsed_results)
+        },
+        headers=CACHE_MISS
     )
 
+@offload
 @api_view(['GET'])
 @ratelimit(key='ip', rate='20/m', block=True)
+@conditional(lambda request: 'magazines', MAGAZINES_TIMEOUT, precompress_params=())
+@paginated
 def magazines(request):
     cache_key = 'magazines'
 
-    if cached := cache.get(cache_key):
+    if cached := get_parsed(cache_key):
         return Response(
             {
-            'source': 'OceanofPF Magazines',
-            'cached': True,
-            'count': len(cached),
-            'results': cached
-        }
+            'source': 'OceanofPDF Magazines',
+            **listing_page(request, cached)
+        },
+            headers=CACHE_HIT
         )
     results = scrape_magazines()
+    if results is None:
+        return degraded_response(cache_key, {'source': 'OceanofPDF Magazines'}, request)
+
     parsed_results = parse_magazines(results)
-    cache.set(cache_key, parsed_results, timeout=60 * 60 * 24)
+    cache_parsed(cache_key, parsed_results, timeout=MAGAZINES_TIMEOUT)
 
     return Response(
         {
-            'source': 'OceanofPDF New Releases',
-            'cached': False,
-            'count': len(parsed_results),
-            'results': parsed_results
-        }
+            'source': 'OceanofPDF Magazines',
+            **listing_page(request, parsed_results)
+        },
+        headers=CACHE_MISS
     )
 
 
@@ -103,7 +197,7 @@ def magazines(request):
 def mynovels(request):
     cache_key = 'my_novels'
 
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return Response(
             {
             'source': 'OceanofPF Magazines',
@@ -124,45 +218,153 @@ def mynovels(request):
     )
 
 
-@api_view(['GET'])
-@ratelimit(key='ip', rate='10/m', block=True)
-def book_detail(request, book_slug):
+def book_detail_payload(details):
+    """Transform scraped book details for the frontend."""
+    return {
+        'title': details['title'],
+        'author': details['author'],
+        'publish_date': details['publish_date'],
+        'cover_image': details['cover_image'],
+        'description': details['description'],
+        'summary': details['summary'],
+        'metadata': details['metadata'],
+        'download_options': [
+            {
+                'type': option['type'],
+                'method': option['method'],
+                'url': '/api/download-proxy/' if option['method'] == 'POST' else option.get('url'),
+                'data': option.get('inputs', {}),
+                'filename': option.get('filename')
+            }
+            for option in details['download_options']
+        ]
+    }
+
+
+@require_GET
+@async_ratelimit('scraper.book_detail', '10/m')
+@conditional(lambda request, book_slug: book_cache_key(book_url_for(book_slug)), settings.SCRAPE_CACHE_TIMEOUT)
+async def book_detail(request, book_slug):
     """Enhanced book detail endpoint with safety checks"""
     try:
-        book_url = f"{settings.API_BASE_URL}/authors/{book_slug}/"
-        details = scrape_book_details(book_url)
-        
+        book_url = book_url_for(book_slug)
+        details = await ascrape_book_details(book_url)
+        degraded = False
+
+        if details is None:
+            # Timed out, throttled, 5xx or circuit open: fall back to the last known good copy
+            details = await run_blocking(last_known_good, book_cache_key(book_url))
+            if not details:
+                return JsonResponse({'error': 'Upstream source is temporarily unavailable', 'degraded': True}, status=503)
+            degraded = True
+
         if not details:
-            return Response({'error': 'Book not found'}, status=404)
-        
-        # Transform for frontend
-        response_data = {
-            'title': details['title'],
-            'author': details['author'],
-            'publish_date': details['publish_date'],
-            'cover_image': details['cover_image'],
-            'description': details['description'],
-            'summary': details['summary'],
-            'metadata': details['metadata'],
-            'download_options': [
-                {
-                    'type': option['type'],
-                    'method': option['method'],
-                    'url': '/api/download-proxy/' if option['method'] == 'POST' else option.get('url'),
-                    'data': option.get('inputs', {}),
-                    'filename': option.get('filename')
-                }
-                for option in details['download_options']
-            ]
-        }
+            return JsonResponse({'error': 'Book not found'}, status=404)
         
-        return Response({
+        response_data = book_detail_payload(details)
+
+        return JsonResponse({
             'status': 'success',
+            'degraded': degraded,
             'data': response_data
         })
         
     except Exception as e:
-        return Response({'error': str(e)}, status=500)
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+async def fetch_book_details_many(book_slugs):
+    """
+    Book details for many slugs: cached entries in one ``get_many`` round trip,
+    the rest fetched concurrently. Returns ``{slug: (status, details)}`` where
+    status is ``cached``, ``fetched``, ``degraded``, ``not_found`` or ``unavailable``.
+    """
+    urls = {slug: book_url_for(slug) for slug in book_slugs}
+    keys = {slug: book_cache_key(url) for slug, url in urls.items()}
+    with span('cache.get_many', **{'cache.keys': len(keys)}):
+        cached = await run_blocking(cache.get_many, list(keys.values()))
+
+    results = {}
+    missing = []
+    for slug in book_slugs:
+        details = cached.get(keys[slug])
+        record_cache(keys[slug], 'hit' if details else 'miss')
+        if details:
+            results[slug] = ('cached', details)
+        else:
+            missing.append(slug)
+    if not missing:
+        return results
+
+    pages = await afetch_html_many([urls[slug] for slug in missing], concurrency=settings.BOOK_DETAIL_BATCH_CONCURRENCY)
+    # Parsing is CPU-bound; keep it off the event loop
+    parsed = await asyncio.to_thread(lambda: [parse_book_details(html) if html else None for html in pages])
+
+    for slug, html, details in zip(missing, pages, parsed):
+        if details and details['title']:
+            await run_blocking(cache_parsed, keys[slug], details, settings.SCRAPE_CACHE_TIMEOUT)
+            results[slug] = ('fetched', details)
+        elif html is None:
+            # Any failed fetch is served from the last known good copy when there is one
+            backup = await run_blocking(last_known_good, keys[slug])
+            results[slug] = ('degraded', backup) if backup else ('unavailable', None)
+        else:
+            results[slug] = ('not_found', None)
+    return results
+
+
+@csrf_exempt
+@require_POST
+async def book_detail_batch(request):
+    """
+    Details for up to BOOK_DETAIL_BATCH_MAX books in one request.
+
+    Body: ``{"slugs": ["<author>/<book>", ...]}``. Every requested slug gets an
+    entry in ``results`` with its own status; missing books don't fail the batch.
+    """
+    if await run_blocking(is_ratelimited, request, group='scraper.book_detail_batch', key='ip', rate='10/m', increment=True):
+        return JsonResponse({'error': 'Too many requests'}, status=429)
+
+    try:
+        slugs = json.loads(request.body).get('slugs')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(slugs, list) or not slugs:
+        return JsonResponse({'error': 'slugs must be a non-empty list'}, status=400)
+    if len(slugs) > settings.BOOK_DETAIL_BATCH_MAX:
+        return JsonResponse({'error': f'At most {settings.BOOK_DETAIL_BATCH_MAX} slugs per request'}, status=400)
+
+    # Keep request order and drop duplicates; anything that isn't a plain slug path is
+    # answered as invalid in its place
+    requested = []
+    for slug in slugs:
+        if not isinstance(slug, str) or not slug.strip('/') or '..' in slug or '://' in slug:
+            requested.append((slug, False))
+        elif (slug.strip('/'), True) not in requested:
+            requested.append((slug.strip('/'), True))
+
+    try:
+        found = await fetch_book_details_many([slug for slug, valid in requested if valid])
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+    results = []
+    for slug, valid in requested:
+        if not valid:
+            results.append({'slug': slug, 'status': 'invalid'})
+            continue
+        item_status, details = found[slug]
+        item = {'slug': slug, 'status': item_status}
+        if details:
+            item['data'] = book_detail_payload(details)
+        results.append(item)
+
+    return JsonResponse({
+        'status': 'success',
+        'degraded': any(item['status'] in ('degraded', 'unavailable') for item in results),
+        'count': len(results),
+        'results': results
+    })
 
 
 # Configure in settings.py:
@@ -175,6 +377,7 @@ def extract_meta_refresh_url(html):
     return match.group(1) if match else None
 
 
+@offload
 @api_view(['POST'])
 @ratelimit(key='ip', rate='20/h', block=True)
 def download_proxy(request):
@@ -193,7 +396,7 @@ def download_proxy(request):
     try:
         # 1. Validate input
         book_url = request.data.get('url')
-        if not book_url or 'oceanofpdf.com' not in book_url:
+        if not book_url or not is_upstream_url(book_url):
             raise ValueError("Valid OceanofPDF URL required")
 
         # 2. Configure scraper
@@ -403,46 +606,61 @@ from rest_framework.response import Response
 import fitz  # PyMuPDF
 import io
 
+# Pages redacted per tracing span; one span per page would swamp the exporter
+REDACT_SPAN_PAGES = 25
+
+
+def redact_page(page):
+    # Search watermarkss
+    watermark_texts = [
+        "OceanofPDF", "oceanofpdf.com",
+        "www.oceanofpdf.com", "Downloaded from",
+        "Ocean of PDF"
+    ]
+    
+    # First pass: TO Remove all links
+    for link in page.get_links():
+        if "oceanofpdf" in str(link.get("uri", "")).lower():
+            page.delete_link(link)
+    
+    # Second pass: Redact alltext instances
+    for text in watermark_texts:
+        for inst in page.search_for(text):
+            # Add pad around the found texti
+            padding = 5  # Adjust as needed
+            area = fitz.Rect(
+                max(0, inst.x0 - padding),
+                max(0, inst.y0 - padding),
+                min(page.rect.width, inst.x1 + padding),
+                min(page.rect.height, inst.y1 + padding)
+            )
+            
+            page.add_redact_annot(area, fill=(1, 1, 1))
+    
+    page.apply_redactions()
+
+
+@PDF_CLEAN_TIME.time()
+@traced('pdf.remove_watermarks')
 def remove_watermarks(input_pdf_bytes):
     input_buffer = io.BytesIO(input_pdf_bytes)
     output_buffer = io.BytesIO()
     
     doc = fitz.open(stream=input_buffer.read(), filetype="pdf")
+    PDF_CLEAN_PAGES.observe(doc.page_count)
+    set_attributes(**{'pdf.pages': doc.page_count})
     
-    for page in doc:
-        # Search watermarkss
-        watermark_texts = [
-            "OceanofPDF", "oceanofpdf.com",
-            "www.oceanofpdf.com", "Downloaded from",
-            "Ocean of PDF"
-        ]
-        
-        # First pass: TO Remove all links
-        for link in page.get_links():
-            if "oceanofpdf" in str(link.get("uri", "")).lower():
-                page.delete_link(link)
-        
-        # Second pass: Redact alltext instances
-        for text in watermark_texts:
-            for inst in page.search_for(text):
-                # Add pad around the found texti
-                padding = 5  # Adjust as needed
-                area = fitz.Rect(
-                    max(0, inst.x0 - padding),
-                    max(0, inst.y0 - padding),
-                    min(page.rect.width, inst.x1 + padding),
-                    min(page.rect.height, inst.y1 + padding)
-                )
-                
-                page.add_redact_annot(area, fill=(1, 1, 1))
-        
-       
-        page.apply_redactions()
+    for first in range(0, doc.page_count, REDACT_SPAN_PAGES):
+        last = min(first + REDACT_SPAN_PAGES, doc.page_count)
+        with span('pdf.redact_pages', **{'pdf.first_page': first, 'pdf.last_page': last - 1}):
+            for page in doc.pages(first, last):
+                redact_page(page)
     
     doc.save(output_buffer)
     doc.close()
     return output_buffer.getvalue()
 
+@offload
 @api_view(['POST'])
 def clean_and_download(request):
     try:
@@ -463,6 +681,7 @@ def clean_and_download(request):
         return Response({"error": f"PDF processing failed: {str(e)}"}, status=500)
     
 
+@offload
 @api_view(['POST'])
 @ratelimit(key='ip', rate='20/h', block=True)
 def download_magazine(request):
@@ -482,7 +701,7 @@ def download_magazine(request):
     try:
         # 1. Validate input (same simple check as download_proxy)
         magazine_url = request.data.get('url')
-        if not magazine_url or 'oceanofpdf.com' not in magazine_url:
+        if not magazine_url or not is_upstream_url(magazine_url):
             raise ValueError("Valid OceanofPDF URL required")
 
         # 2. Configure scraper (identical to download_proxy)
@@ -549,39 +768,42 @@ def download_magazine(request):
         )
 from .utils import scrape_genres, parse_genres, parse_books_from_genre, scrape_books_by_genre, get_genre_by_slug
 
+@offload
 @api_view(['GET'])
 @ratelimit(key='ip', rate='20/m', block=True)
+@conditional(lambda request: 'genres_list', GENRES_TIMEOUT, precompress_params=())
+@paginated
 def genres(request):
     cache_key = 'genres_list'
 
-    if cached := cache.get(cache_key):
+    if cached := get_parsed(cache_key):
         return Response({
             'source': 'OceanofPDF Genres',
-            'count': len(cached),
-            'cached': True,
-            'results': cached
-        })
+            **listing_page(request, cached)
+        }, headers=CACHE_HIT)
 
     # This calls scrape_genres() which uses th main link
     results = scrape_genres()
+    if results is None:
+        return degraded_response(cache_key, {'source': 'OceanofPDF Genres'}, request)
+
     parsed_results = parse_genres(results)
-    cache.set(cache_key, parsed_results, timeout=60 * 60 * 24 * 7)
+    cache_parsed(cache_key, parsed_results, timeout=GENRES_TIMEOUT)
 
     return Response({
         'source': 'OceanofPDF Genres',
-        'count': len(parsed_results),
-        'cached': False,
-        'results': parsed_results
-    })
+        **listing_page(request, parsed_results)
+    }, headers=CACHE_MISS)
 
 
+@offload
 @api_view(['GET'])
 @ratelimit(key='ip', rate='20/m', block=True)
 def genre_detail(request, genre_slug):
     """Get detailed information about a specific genre"""
     cache_key = f'genre_detail_{genre_slug}'
     
-    if cached := cache.get(cache_key):
+    if cached := cache_lookup(cache_key):
         return Response({
             'source': 'OceanofPDF Genre Detail',
             'genre': cached
@@ -600,76 +822,122 @@ def genre_detail(request, genre_slug):
         'genre': genre
     })
 
-@api_view(['GET'])
-@ratelimit(key='ip', rate='20/m', block=True)
-def genre_books(request, genre_slug):
+@require_GET
+@async_ratelimit('scraper.genre_books', '20/m')
+@conditional(lambda request, genre_slug: genre_books_key(genre_slug, page_param(request)), GENRE_BOOKS_TIMEOUT, precompress_params=('page',))
+@paginated
+async def genre_books(request, genre_slug):
     """Get books for a specific genre using its URL"""
-    try:
-        # Convert page parameter to integer with error handling
-        page_str = request.GET.get('page', '1')
-        page = int(page_str)
-        if page < 1:
-            page = 1
-    except (ValueError, TypeError):
-        page = 1
-    cache_key = f'genre_books_{genre_slug}_page_{page}'
+    cache_key = genre_books_key(genre_slug, page_param(request))
     page = request.GET.get('page', 1)
     
-    if cached := cache.get(cache_key):
-        return Response({
+    if cached := await run_blocking(get_parsed, cache_key):
+        # Only known genres ever get a cached page
+        await run_blocking(record_genre_hit, genre_slug)
+        return JsonResponse({
             'source': f'OceanofPDF Books - {genre_slug}',
             'page': page,
-            'count': len(cached),
-            'results': cached,
-            'cached': True
-        })
+            **listing_page(request, cached)
+        }, headers=CACHE_HIT)
     
     # Get the genre to access its URL
-    genre = get_genre_by_slug(genre_slug)
+    genre = await aget_genre_by_slug(genre_slug)
     if not genre:
-        return Response({
+        return JsonResponse({
             'error': f'Genre with slug "{genre_slug}" not found'
         }, status=404)
+    # Counted only once the slug is known, so made-up paths can't grow the hits zset
+    await run_blocking(record_genre_hit, genre_slug)
     
     # Scrape books using the genre's URL
-    html_content = scrape_books_by_genre(genre['url'], page)
+    html_content = await ascrape_html(*genre_page(genre['url'], page))
     if not html_content:
-        return Response({
-            'error': f'Failed to fetch books for genre: {genre_slug}',
-            'results': []
-        }, status=503)
+        return await run_blocking(degraded_response, cache_key, {
+            'source': f'OceanofPDF Books - {genre_slug}',
+            'page': page,
+        }, request, response_class=JsonResponse)
     
-    books = parse_books_from_genre(html_content, genre['name'])
+    books = await asyncio.to_thread(parse_books_from_genre, html_content, genre['name'])
     # base_url = request.build_absolute_uri().split('?')[0]
-    cache.set(cache_key, books, timeout=60 * 60 * 24)
+    await run_blocking(cache_parsed, cache_key, books, timeout=GENRE_BOOKS_TIMEOUT)
     
-    return Response({
+    return JsonResponse({
         'source': f'OceanofPDF Books - {genre_slug}',
         'page': page,
-        'count': len(books),
-        'results': books,
-        'cached': False
-    })
+        **listing_page(request, books)
+    }, headers=CACHE_MISS)
 
+@offload
 @api_view(['GET'])
+@conditional(lambda request: 'genres_list', GENRES_TIMEOUT)
+@paginated
 def popular_genres(request):
     """Get top genres by book count"""
     cache_key = 'genres_list'
 
-    if cached := cache.get(cache_key):
+    degraded = False
+    hit = False
+    if cached := get_parsed(cache_key):
         genres = cached
+        hit = True
     else:
         html_content = scrape_genres()
-        if not html_content:
-            return Response({'error': 'No genre data available'}, status=404)
-        genres = parse_genres(html_content)
-        cache.set(cache_key, genres, timeout=60 * 60 * 24)  # 24 hours
+        if html_content:
+            genres = parse_genres(html_content)
+            cache_parsed(cache_key, genres, timeout=GENRES_TIMEOUT)
+        elif backup := last_known_good(cache_key):
+            genres = backup
+            degraded = True
+        else:
+            return Response({'error': 'No genre data available'}, status=503)
 
     popular = sorted(genres, key=lambda x: x['book_count'], reverse=True)[:20]
 
     return Response({
         'source': 'OceanofPDF Popular Genres',
-        'count': len(popular),
-        'results': popular,
-        'cached': False
-    })
+        **listing_page(request, popular),
+        'degraded': degraded
+    }, headers=CACHE_HIT if hit else CACHE_MISS)
+
+
+async def cover_image(request):
+    """
+    Resized cover thumbnail: ``/api/cover/?src=<upstream image URL>&w=<width>``.
+    WebP when the browser accepts it (or ``fmt=webp``), JPEG otherwise.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if await run_blocking(is_ratelimited, request, group='scraper.cover_image', key='ip', rate='600/m', increment=True):
+        return HttpResponse('Too many requests', status=429)
+
+    src = request.GET.get('src', '')
+    if not allowed_image_source(src):
+        return HttpResponse('Image source not allowed', status=400)
+    try:
+        width = snap_width(int(request.GET.get('w', settings.COVER_THUMB_DEFAULT_WIDTH)))
+    except ValueError:
+        return HttpResponse('Invalid width', status=400)
+
+    fmt = request.GET.get('fmt')
+    negotiated = fmt not in FORMATS
+    if negotiated:
+        fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+
+    try:
+        thumbnail = await get_thumbnail(src, width, fmt)
+    except ImageTooLarge:
+        return HttpResponse('Cover image too large', status=502)
+    if thumbnail is None:
+        # Let the browser try the upstream copy itself
+        return HttpResponseRedirect(src)
+    data, content_type, etag = thumbnail
+
+    if etag_matches(request, etag):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(data, content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={settings.COVER_CACHE_MAX_AGE}"
+    if negotiated:
+        response['Vary'] = 'Accept'
+    return response
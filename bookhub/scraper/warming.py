@@ -0,0 +1,138 @@
+"""
+Cache warming for the hottest scraper keys.
+
+The ``warm_cache`` management command (scheduled through CRONJOBS) calls
+:func:`warm_cache`, which re-scrapes any hot key that is missing or close to
+expiry. Hot genres are the top genres by book count (what
+``/api/genres/popular/`` shows) plus the genres users actually requested
+over the last week, counted by :func:`record_genre_hit`.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from .async_fetch import fetch_html_many
+from .caching import (
+    GENRE_BOOKS_TIMEOUT,
+    GENRES_TIMEOUT,
+    MAGAZINES_TIMEOUT,
+    NEW_RELEASES_TIMEOUT,
+    cache_parsed,
+    genre_books_key,
+    last_known_good,
+)
+from .utils import parse_books_from_genre, parse_genres, parse_magazines, parse_new_releases
+
+logger = logging.getLogger(__name__)
+
+HIT_WINDOW_DAYS = 7
+
+
+def _hits_key(day):
+    return f"genre_hits:{day:%Y%m%d}"
+
+
+def record_genre_hit(genre_slug):
+    """Count a genre page request; one sorted set per day, kept for a week."""
+    try:
+        key = _hits_key(date.today())
+        pipe = get_redis_connection("default").pipeline()
+        pipe.zincrby(key, 1, genre_slug)
+        pipe.expire(key, 60 * 60 * 24 * (HIT_WINDOW_DAYS + 1))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record genre hit for {genre_slug}: {e}")
+
+
+def requested_genres(limit):
+    """Most requested genre slugs over the last HIT_WINDOW_DAYS days."""
+    totals = {}
+    try:
+        conn = get_redis_connection("default")
+        for offset in range(HIT_WINDOW_DAYS):
+            day = date.today() - timedelta(days=offset)
+            for slug, score in conn.zrange(_hits_key(day), 0, -1, withscores=True):
+                slug = slug.decode() if isinstance(slug, bytes) else slug
+                totals[slug] = totals.get(slug, 0) + score
+    except Exception as e:
+        logger.warning(f"Could not read genre hits: {e}")
+    return sorted(totals, key=totals.get, reverse=True)[:limit]
+
+
+def hot_genres(genres, limit):
+    """Requested genres first, then the largest genres, without duplicates."""
+    by_slug = {genre['slug']: genre for genre in genres}
+    popular = [g['slug'] for g in sorted(genres, key=lambda x: x['book_count'], reverse=True)[:limit]]
+
+    slugs = []
+    for slug in requested_genres(limit) + popular:
+        if slug in by_slug and slug not in slugs:
+            slugs.append(slug)
+    return [by_slug[slug] for slug in slugs]
+
+
+def needs_refresh(cache_key, timeout):
+    """True if the key is missing or will expire before the next warm run."""
+    ttl = cache.ttl(cache_key)
+    if ttl is None:
+        return False  # persisted without expiry
+    margin = max(2 * settings.CACHE_WARM_INTERVAL, timeout * 0.1)
+    return ttl <= margin
+
+
+def _refresh(jobs, force):
+    """
+    ``jobs`` is a list of ``(cache_key, url, parse, timeout)``. Fetches every
+    stale job concurrently and stores the parsed result.
+    """
+    stale = [job for job in jobs if force or needs_refresh(job[0], job[3])]
+    if not stale:
+        return [], []
+
+    refreshed, failed = [], []
+    pages = fetch_html_many([url for _, url, _, _ in stale])
+    for (cache_key, url, parse, timeout), html in zip(stale, pages):
+        if not html:
+            failed.append(cache_key)
+            continue
+        cache_parsed(cache_key, parse(html), timeout)
+        refreshed.append(cache_key)
+    return refreshed, failed
+
+
+def warm_cache(genre_limit=None, force=False):
+    """Refresh hot listing keys and popular genre pages; returns a summary dict."""
+    genre_limit = genre_limit or settings.CACHE_WARM_GENRES
+    base = settings.API_BASE_URL
+
+    refreshed, failed = _refresh([
+        ('new_releases', f"{base}/new-releases/", parse_new_releases, NEW_RELEASES_TIMEOUT),
+        ('magazines', f"{base}/magazines-newspapers/", parse_magazines, MAGAZINES_TIMEOUT),
+        ('genres_list', f"{base}/books-by-genre/", parse_genres, GENRES_TIMEOUT),
+    ], force)
+
+    genres = cache.get('genres_list') or last_known_good('genres_list') or []
+    genre_jobs = [
+        (
+            genre_books_key(genre['slug'], 1),
+            genre['url'],
+            lambda html, name=genre['name']: parse_books_from_genre(html, name),
+            GENRE_BOOKS_TIMEOUT,
+        )
+        for genre in hot_genres(genres, genre_limit)
+    ]
+    genre_refreshed, genre_failed = _refresh(genre_jobs, force)
+
+    summary = {
+        'refreshed': refreshed + genre_refreshed,
+        'failed': failed + genre_failed,
+        'hot_genres': len(genre_jobs),
+    }
+    logger.info(
+        f"Cache warm: {len(summary['refreshed'])} refreshed, {len(summary['failed'])} failed, "
+        f"{summary['hot_genres']} hot genres checked"
+    )
+    return summary
@@ -0,0 +1,242 @@
+"""
+Trial-expiry billing run, used by the ``handle_expired_trials`` command and task.
+
+Expired trials are read in id order, one keyset page (``pk > checkpoint``)
+of BILLING_CHUNK_SIZE at a time, so no cursor stays open across the chunk
+transactions (server-side cursors don't survive the Supabase transaction
+pooler). Each chunk:
+
+1. the emails of the chunk's users are fetched in one query (UserProfile),
+2. the charges go through a pool of BILLING_CONCURRENCY threads,
+3. the results are written back with one ``bulk_update``, their ledger
+   entries with one ``bulk_create``, and the run's checkpoint
+   (:class:`~subscriptions.models.BillingRun`) is advanced in the same
+   transaction.
+
+Each charge uses a reference derived from the subscription and its trial
+end. A charge that doesn't come back as a clear success or decline (timeout,
+or a duplicate reference after a crash) is looked up with
+``verify_transaction``, so resuming a run never charges a user twice. If the
+outcome is still unknown, the trial is left alone for the next run.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from customers.models import UserProfile
+
+from .entitlements import invalidate_entitlement
+from .ledger import entry, record
+from .models import BillingRun, Subscription
+from .utils import charge_authorization, verify_transaction
+
+logger = logging.getLogger(__name__)
+
+MONTHLY_AMOUNT_KOBO = 50000
+MONTHLY_AMOUNT = Decimal("5.00")
+
+# Paystack test emails, used with test_mode
+TEST_EMAILS = [
+    "test@example.com",
+    "customer@email.com",
+    "test@paystack.com",
+    "test.customer@email.com",
+]
+
+UPDATE_FIELDS = ["plan", "status", "amount", "trial_used", "current_period_start", "current_period_end", "updated_at"]
+
+
+@dataclass
+class ChargeResult:
+    subscription: Subscription
+    outcome: str  # charged, failed, canceled, unknown
+    message: str = ""
+
+
+def charge_reference(subscription):
+    return f"trial-{subscription.pk}-{subscription.trial_end:%Y%m%d%H%M%S}"
+
+
+def fallback_email(user_id):
+    return f"user_{user_id}@example.com"
+
+
+def test_email(user_id):
+    digest = hashlib.md5(str(user_id).encode()).hexdigest()
+    return TEST_EMAILS[int(digest, 16) % len(TEST_EMAILS)]
+
+
+def emails_for(subscriptions):
+    supabase_ids = {str(s.user_id) for s in subscriptions}
+    return dict(
+        UserProfile.objects.filter(supabase_id__in=supabase_ids).values_list("supabase_id", "user__email")
+    )
+
+
+def charge_outcome(resp):
+    """``charged``/``failed`` from a charge or verify response, ``None`` if it doesn't say."""
+    if resp and resp.get("status") and resp.get("data"):
+        tx_status = resp["data"].get("status")
+        if tx_status == "success":
+            return "charged"
+        if tx_status in ("failed", "abandoned", "reversed"):
+            return "failed"
+    return None
+
+
+def charge(subscription, email):
+    reference = charge_reference(subscription)
+    resp = charge_authorization(
+        subscription.payment_method.authorization_code,
+        email,
+        MONTHLY_AMOUNT_KOBO,
+        reference=reference,
+        metadata={"user_id": str(subscription.user_id), "type": "trial_conversion"},
+    )
+    if outcome := charge_outcome(resp):
+        return ChargeResult(subscription, outcome, (resp.get("data") or {}).get("gateway_response", ""))
+
+    # Timed out, duplicate reference after a crash, ...: ask Paystack what actually happened
+    verification = verify_transaction(reference)
+    if outcome := charge_outcome(verification):
+        return ChargeResult(subscription, outcome, "resolved by verification")
+    if verification.get("message", "").lower().startswith("transaction reference not found"):
+        return ChargeResult(subscription, "failed", (resp or {}).get("message", "charge failed"))
+    return ChargeResult(subscription, "unknown", (resp or {}).get("message", "no response from Paystack"))
+
+
+def apply(result, now):
+    subscription = result.subscription
+    subscription.trial_used = True
+    subscription.updated_at = now
+    if result.outcome == "charged":
+        subscription.plan = "monthly"
+        subscription.status = "active"
+        subscription.amount = MONTHLY_AMOUNT
+        subscription.current_period_start = now
+        subscription.current_period_end = now + timedelta(days=30)
+    elif result.outcome == "failed":
+        subscription.status = "past_due"
+    elif result.outcome == "canceled":
+        subscription.status = "canceled"
+
+
+LEDGER_EVENTS = {
+    "charged": "charge_succeeded",
+    "failed": "charge_failed",
+    "canceled": "subscription_canceled",
+}
+
+
+def ledger_entry(result):
+    subscription = result.subscription
+    charged = subscription.payment_method_id is not None
+    return entry(
+        LEDGER_EVENTS[result.outcome],
+        "billing",
+        subscription=subscription,
+        reference=charge_reference(subscription) if charged else "",
+        amount=MONTHLY_AMOUNT if charged else None,
+        message=result.message,
+    )
+
+
+def expired_trials(cutoff, after_id=0):
+    return (
+        Subscription.objects.filter(status="trialing", trial_end__isnull=False, trial_end__lte=cutoff, pk__gt=after_id)
+        .select_related("payment_method")
+        .order_by("pk")
+    )
+
+
+def expired_trial_pages(cutoff, after_id=0):
+    """Keyset pages of expired trials after ``after_id``."""
+    while page := list(expired_trials(cutoff, after_id)[:settings.BILLING_CHUNK_SIZE]):
+        yield page
+        after_id = page[-1].pk
+
+
+def process_chunk(subscriptions, pool, test_mode=False):
+    emails = {} if test_mode else emails_for(subscriptions)
+    results = []
+    to_charge = []
+    for subscription in subscriptions:
+        if not subscription.payment_method:
+            results.append(ChargeResult(subscription, "canceled", "no payment method"))
+            continue
+        user_id = str(subscription.user_id)
+        email = test_email(user_id) if test_mode else emails.get(user_id) or fallback_email(user_id)
+        to_charge.append((subscription, email))
+
+    results.extend(pool.map(lambda args: charge(*args), to_charge))
+    return results
+
+
+def get_run(resume=True):
+    """The unfinished run to resume, or a new one."""
+    if resume:
+        run = BillingRun.objects.filter(status__in=("running", "failed")).order_by("-pk").first()
+        if run:
+            return run, True
+    return BillingRun.objects.create(cutoff=timezone.now()), False
+
+
+def run_billing(dry_run=False, test_mode=False, resume=True, log=logger.info):
+    """Bill every expired trial; returns the (saved) BillingRun, or counts for a dry run."""
+    if dry_run:
+        trials = expired_trials(timezone.now())
+        counts = {
+            "charged": trials.filter(payment_method__isnull=False).count(),
+            "canceled": trials.filter(payment_method__isnull=True).count(),
+        }
+        log(f"[DRY RUN] Would charge {counts['charged']} and cancel {counts['canceled']} expired trial(s)")
+        return counts
+
+    run, resumed = get_run(resume)
+    if resumed:
+        log(f"Resuming billing run {run.pk} after subscription #{run.last_subscription_id}")
+
+    run.status = "running"
+    run.save(update_fields=["status"])
+    try:
+        with ThreadPoolExecutor(max_workers=settings.BILLING_CONCURRENCY, thread_name_prefix="billing") as pool:
+            for subscriptions in expired_trial_pages(run.cutoff, run.last_subscription_id):
+                results = process_chunk(subscriptions, pool, test_mode)
+                now = timezone.now()
+                done = [r for r in results if r.outcome != "unknown"]
+                for result in done:
+                    apply(result, now)
+                    if result.outcome == "failed":
+                        log(f"Failed to charge user {result.subscription.user_id}: {result.message}")
+                for result in results:
+                    if result.outcome == "unknown":
+                        log(f"Charge outcome unknown for user {result.subscription.user_id}, left for the next run: {result.message}")
+
+                with transaction.atomic():
+                    Subscription.objects.bulk_update([r.subscription for r in done], UPDATE_FIELDS)
+                    record(ledger_entry(r) for r in done)
+                    run.last_subscription_id = subscriptions[-1].pk
+                    run.charged += sum(r.outcome == "charged" for r in done)
+                    run.failed += sum(r.outcome == "failed" for r in done)
+                    run.canceled += sum(r.outcome == "canceled" for r in done)
+                    run.save(update_fields=["last_subscription_id", "charged", "failed", "canceled"])
+                    user_ids = [r.subscription.user_id for r in done]
+                    transaction.on_commit(lambda user_ids=user_ids: invalidate_entitlement(*user_ids))
+                log(f"Billed through subscription #{run.last_subscription_id}: {run.charged} charged, {run.failed} failed, {run.canceled} canceled")
+    except Exception as e:
+        run.status = "failed"
+        run.last_error = f"{type(e).__name__}: {e}"
+        run.save(update_fields=["status", "last_error"])
+        raise
+
+    run.status = "completed"
+    run.finished_at = timezone.now()
+    run.save(update_fields=["status", "finished_at"])
+    return run
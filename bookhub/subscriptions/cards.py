@@ -0,0 +1,59 @@
+"""
+Per-user card summary cache behind ``get_customer_cards`` and the card limit
+check in ``initialize_card_update``.
+
+The summary is the response of ``get_customer_cards``: the user's reusable
+cards (built from a ``values()`` projection, no model instances), their
+count, the card limit and whether another card may be added. It is kept in
+Redis as JSON-native values.
+
+Every code path that creates, updates or deletes a ``PaymentMethod`` must
+call :func:`invalidate_card_summary` for the user afterwards (from
+``transaction.on_commit`` when inside a transaction).
+CARD_SUMMARY_CACHE_TIMEOUT bounds how long a missed invalidation can go
+unnoticed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PaymentMethod
+
+MAX_CARDS_PER_USER = 3
+
+CARD_FIELDS = ("id", "authorization_code", "last4", "card_type", "bank", "exp_month", "exp_year", "is_default", "created_at")
+
+
+def card_summary_key(user_id):
+    return f"cards:{user_id}"
+
+
+def build_card_summary(user_id):
+    cards = []
+    for card in PaymentMethod.objects.filter(user_id=user_id, reusable=True).values(*CARD_FIELDS):
+        created_at = card["created_at"]
+        cards.append({
+            **card,
+            "brand": card["card_type"],  # Same as card_type for Paystack
+            "created_at": created_at.isoformat() if created_at else None,
+        })
+    return {
+        "cards": cards,
+        "card_count": len(cards),
+        "max_cards": MAX_CARDS_PER_USER,
+        "can_add_more": len(cards) < MAX_CARDS_PER_USER,
+    }
+
+
+def get_card_summary(user_id):
+    key = card_summary_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_card_summary(user_id)
+        cache.set(key, summary, timeout=settings.CARD_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_card_summary(*user_ids):
+    keys = [card_summary_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,162 @@
+"""
+Per-user entitlement cache behind ``check_subscription_status``.
+
+The frontend asks for the subscription status on every navigation, so the
+latest subscription of each user is kept in Redis as a small record of
+JSON-native values (the cache codec is orjson). The record stores the exact
+trial / period end timestamps; whether the user still has access is decided
+at read time, so an entry never has to be expired just because time passed.
+
+Every code path that writes a ``Subscription`` must call
+:func:`invalidate_entitlement` for the affected users afterwards.
+ENTITLEMENT_CACHE_TIMEOUT bounds how long a missed invalidation can go
+unnoticed.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger
+
+from .models import LAPSED_STATUS, Subscription
+
+NO_SUBSCRIPTION = {'status': 'none'}
+
+
+def entitlement_key(user_id):
+    return f"entitlement:{user_id}"
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def build_entitlement(subscription):
+    if subscription is None:
+        return NO_SUBSCRIPTION
+    return {
+        'id': subscription.pk,
+        'status': subscription.status,
+        'plan': subscription.plan,
+        'amount': float(subscription.amount or 0),
+        'trial_end': _iso(subscription.trial_end),
+        'current_period_end': _iso(subscription.current_period_end),
+        'subscription_code': subscription.subscription_code,
+        'created_at': _iso(subscription.created_at),
+    }
+
+
+def get_entitlement(user_id):
+    key = entitlement_key(user_id)
+    record = cache.get(key)
+    if record is None:
+        subscription = Subscription.objects.filter(user_id=user_id).order_by("-created_at").first()
+        record = build_entitlement(subscription)
+        cache.set(key, record, timeout=settings.ENTITLEMENT_CACHE_TIMEOUT)
+    return record
+
+
+def invalidate_entitlement(*user_ids):
+    keys = [entitlement_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys)
+
+
+def _expire(user_id, record):
+    """
+    Persist a lapsed trial/period once (same rules as the expiry sweep) and
+    return the lapsed record, now cached. Returns None, after dropping the
+    cached record, when the row has been renewed or changed since it was cached.
+    """
+    now = timezone.now()
+    new_status = LAPSED_STATUS[record['status']]
+    lapsed = Subscription.objects.filter(pk=record['id'], status=record['status'])
+    if record['status'] == "trialing":
+        lapsed = lapsed.filter(trial_end__lte=now)
+        # Trials with a card are converted (or marked past_due) by the billing run
+        billed_later = lapsed.filter(payment_method__isnull=False)
+        lapsed = lapsed.filter(payment_method__isnull=True)
+    else:
+        lapsed = lapsed.filter(current_period_end__lte=now)
+        billed_later = None
+    with transaction.atomic():
+        updated = lapsed.update(status=new_status, updated_at=now)
+        if updated:
+            ledger.record([ledger.entry(
+                "subscription_expired", "expiry", user_id=user_id, status=new_status, plan=record['plan'],
+                trial_end=record['trial_end'], current_period_end=record['current_period_end'],
+                subscription_code=record['subscription_code'], subscription_amount=record['amount'],
+            )])
+    if not updated and not (billed_later is not None and billed_later.exists()):
+        invalidate_entitlement(user_id)
+        return None
+    record = {**record, 'status': new_status}
+    cache.set(entitlement_key(user_id), record, timeout=settings.ENTITLEMENT_CACHE_TIMEOUT)
+    return record
+
+
+def subscription_status(user_id):
+    """The ``check_subscription_status`` response body for ``user_id``."""
+    record = get_entitlement(user_id)
+
+    if record['status'] == 'none':
+        return {
+            "has_access": False,
+            "status": "none",
+            "plan": None,
+            "amount": 0,
+            "trial_end": None,
+            "current_period_end": None,
+            "in_trial": False,
+            "trial_has_ended": False,
+            "days_remaining": 0,
+            "is_active": False,
+            "subscription_code": None,
+            "created_at": None,
+        }
+
+    now = timezone.now()
+    days_remaining = 0
+    in_trial = False
+    trial_has_ended = False
+    status = record['status']
+    ended = False
+
+    if status == "trialing" and record['trial_end']:
+        trial_end = datetime.fromisoformat(record['trial_end'])
+        days_remaining = max(0, (trial_end - now).days)
+        in_trial = True
+        trial_has_ended = now > trial_end
+        ended = trial_has_ended
+
+    elif status == "active" and record['current_period_end']:
+        period_end = datetime.fromisoformat(record['current_period_end'])
+        days_remaining = max(0, (period_end - now).days)
+        ended = now > period_end
+
+    if ended:
+        lapsed = _expire(user_id, record)
+        if lapsed is None:
+            # Renewed since the record was cached: answer from the database instead
+            return subscription_status(user_id)
+        status = lapsed['status']
+
+    has_access = status in ["active", "trialing"] and not trial_has_ended
+
+    return {
+        "has_access": has_access,
+        "status": status,
+        "plan": record['plan'],
+        "amount": record['amount'],
+        "trial_end": record['trial_end'],
+        "current_period_end": record['current_period_end'],
+        "in_trial": in_trial,
+        "trial_has_ended": trial_has_ended,
+        "days_remaining": days_remaining,
+        "is_active": has_access,
+        "subscription_code": record['subscription_code'],
+        "created_at": record['created_at'],
+    }
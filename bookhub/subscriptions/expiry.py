@@ -0,0 +1,52 @@
+"""
+Set-based expiry of lapsed subscriptions (the ``expire_subscriptions`` cron job).
+
+One ``UPDATE … RETURNING`` per status transition flips every lapsed
+row at once; the partial indexes on ``trial_end`` (trialing rows) and
+``current_period_end`` (active rows) keep each statement a range scan. The
+returned rows are written to the event ledger in the same transaction, and
+their users get their entitlement cache entries dropped.
+
+Trials that have a saved card are left alone: ``handle_expired_trials``
+charges them and moves them to active or past_due itself.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .entitlements import invalidate_entitlement
+from .ledger import entry, record
+from .models import LAPSED_STATUS, Subscription
+
+# Column holding the end of the trial / paid time, per status that can lapse
+END_COLUMNS = {
+    "trialing": "trial_end",
+    "active": "current_period_end",
+}
+
+
+def _sweep_sql(status):
+    new_status, end_column = LAPSED_STATUS[status], END_COLUMNS[status]
+    table = connection.ops.quote_name(Subscription._meta.db_table)
+    sql = (
+        f"UPDATE {table} SET status = %s, updated_at = %s "
+        f"WHERE status = %s AND {end_column} <= %s"
+    )
+    if status == "trialing":
+        sql += " AND payment_method_id IS NULL"
+    return sql + " RETURNING *", new_status
+
+
+def sweep(now=None):
+    """Expire everything that lapsed before ``now``; returns ``{old_status: [user_id, ...]}``."""
+    now = now or timezone.now()
+    db_now = connection.ops.adapt_datetimefield_value(now)
+    expired = {}
+    for status in LAPSED_STATUS:
+        sql, new_status = _sweep_sql(status)
+        with transaction.atomic():
+            # raw() maps the returned rows back onto (already updated) Subscription instances
+            lapsed = list(Subscription.objects.raw(sql, [new_status, db_now, status, db_now]))
+            record(entry("subscription_expired", "expiry", subscription=s) for s in lapsed)
+        expired[status] = [s.user_id for s in lapsed]
+        invalidate_entitlement(*expired[status])
+    return expired
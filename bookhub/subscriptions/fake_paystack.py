@@ -0,0 +1,287 @@
+"""
+Local stand-in for the Paystack API, used for tests and load tests of the
+subscription flows (served by ``manage.py fake_paystack``).
+
+Implements the endpoints ``subscriptions/utils.py`` calls, with Paystack's
+response shapes and the error behaviour the callers depend on:
+
+* transactions are kept in memory by reference; verifying an unknown
+  reference answers 400 "Transaction reference not found";
+* a second ``charge_authorization`` with the same reference answers 400
+  "Duplicate Transaction Reference";
+* a transaction can be refunded once;
+* authorization codes containing ``declined`` are declined (the charge is
+  ``failed``, ``check_authorization`` answers 400).
+
+Initialized transactions verify as ``success``, as if the customer completed
+checkout. Latency, jitter and error rate are configurable like the upstream
+stub (``scraper/stub_site.py``), and every request is counted per route.
+"""
+import hashlib
+import json
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _code(prefix):
+    return f"{prefix}_{secrets.token_hex(6)}"
+
+
+class FakePaystackState:
+    """Transactions, refunds and per-route counters shared by all handler threads."""
+
+    def __init__(self, base_url, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.transactions = {}
+        self.refunded = set()
+        self.next_id = 1
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, route):
+        with self.lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.transactions.clear()
+            self.refunded.clear()
+
+    def add_transaction(self, reference, **fields):
+        """Store a new transaction; returns None when the reference is taken."""
+        with self.lock:
+            if reference in self.transactions:
+                return None
+            tx = {
+                "id": self.next_id,
+                "reference": reference,
+                "status": "success",
+                "gateway_response": "Successful",
+                "currency": "USD",
+                "paid_at": _now(),
+                "created_at": _now(),
+                **fields,
+            }
+            self.next_id += 1
+            self.transactions[reference] = tx
+            return dict(tx)
+
+    def get_transaction(self, reference):
+        with self.lock:
+            tx = self.transactions.get(reference)
+            return dict(tx) if tx else None
+
+    def refund(self, transaction):
+        """``(transaction, refunded)`` for a transaction id or reference; refunded is False the second time."""
+        with self.lock:
+            tx = next(
+                (t for t in self.transactions.values() if str(t["id"]) == str(transaction) or t["reference"] == transaction),
+                None,
+            )
+            if tx is None or tx["id"] in self.refunded:
+                return tx, False
+            self.refunded.add(tx["id"])
+            return dict(tx), True
+
+
+def authorization(code):
+    return {
+        "authorization_code": code,
+        "bin": "408408",
+        "last4": "4081",
+        "exp_month": "12",
+        "exp_year": "2030",
+        "channel": "card",
+        "card_type": "visa",
+        "bank": "TEST BANK",
+        "reusable": True,
+        "signature": f"SIG_{code}",
+    }
+
+
+def customer(email):
+    return {"email": email, "customer_code": f"CUS_{hashlib.md5(email.encode()).hexdigest()[:12]}"}
+
+
+def route_for(path):
+    if path == "/transaction/initialize":
+        return "initialize"
+    if path.startswith("/transaction/verify/"):
+        return "verify"
+    if path == "/transaction/charge_authorization":
+        return "charge_authorization"
+    if path == "/transaction/check_authorization":
+        return "check_authorization"
+    if path == "/refund":
+        return "refund"
+    if path == "/subscription/disable":
+        return "disable_subscription"
+    if path == "/subscription":
+        return "create_subscription"
+    return "unknown"
+
+
+class FakePaystackHandler(BaseHTTPRequestHandler):
+    state = None  # set on a subclass by the fake_paystack command
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, keep-alive clients wait on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _ok(self, message, data=None):
+        return self._send(200, {"status": True, "message": message, "data": data})
+
+    def _error(self, status, message):
+        return self._send(status, {"status": False, "message": message})
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _handle(self, method):
+        state = self.state
+        path = urlparse(self.path).path
+        body = self._body() if method == "POST" else {}
+
+        if path == "/__stats":
+            return self._send(200, state.snapshot())
+        if path == "/__reset":
+            state.reset()
+            return self._send(200, {})
+
+        route = route_for(path)
+        state.count(route)
+
+        delay = state.latency + random.uniform(0, state.jitter)
+        if delay:
+            time.sleep(delay)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._error(401, "No Authorization Header was found")
+        if state.error_rate and random.random() < state.error_rate:
+            return self._error(503, "Service Unavailable")
+
+        handler = getattr(self, f"handle_{route}", None)
+        if handler is None:
+            return self._error(404, "Not found")
+        return handler(body, path)
+
+    def handle_initialize(self, body, path):
+        reference = body.get("reference") or _code("ref")
+        email = body.get("email", "")
+        tx = self.state.add_transaction(
+            reference,
+            amount=body.get("amount", 0),
+            currency=body.get("currency", "USD"),
+            metadata=body.get("metadata") or {},
+            plan=body.get("plan"),
+            authorization=authorization(_code("AUTH")),
+            customer=customer(email),
+        )
+        if tx is None:
+            return self._error(400, "Duplicate Transaction Reference")
+        return self._ok("Authorization URL created", {
+            "authorization_url": f"{self.state.base_url}/checkout/{tx['reference']}",
+            "access_code": _code("ACC"),
+            "reference": tx["reference"],
+        })
+
+    def handle_verify(self, body, path):
+        reference = path.rsplit("/", 1)[-1]
+        tx = self.state.get_transaction(reference)
+        if tx is None:
+            return self._error(400, "Transaction reference not found")
+        return self._ok("Verification successful", tx)
+
+    def handle_charge_authorization(self, body, path):
+        code = body.get("authorization_code") or ""
+        email = body.get("email", "")
+        if not code or not email:
+            return self._error(400, "Authorization code and email are required")
+        declined = "declined" in code
+        tx = self.state.add_transaction(
+            body.get("reference") or _code("ref"),
+            amount=body.get("amount", 0),
+            metadata=body.get("metadata") or {},
+            status="failed" if declined else "success",
+            gateway_response="Declined" if declined else "Approved",
+            authorization=authorization(code),
+            customer=customer(email),
+        )
+        if tx is None:
+            return self._error(400, "Duplicate Transaction Reference")
+        return self._ok("Charge attempted", tx)
+
+    def handle_check_authorization(self, body, path):
+        code = body.get("authorization_code") or ""
+        if not code or "declined" in code:
+            return self._error(400, "Authorization code is invalid")
+        return self._ok("Authorization is valid for this amount", {"amount": body.get("amount"), "currency": "USD"})
+
+    def handle_refund(self, body, path):
+        tx, refunded = self.state.refund(body.get("transaction"))
+        if tx is None:
+            return self._error(404, "Transaction not found")
+        if not refunded:
+            return self._error(400, "Transaction has been fully reversed")
+        return self._ok("Refund has been queued for processing", {
+            "transaction": {"id": tx["id"], "reference": tx["reference"], "amount": tx["amount"]},
+            "amount": tx["amount"],
+            "status": "pending",
+        })
+
+    def handle_create_subscription(self, body, path):
+        if not body.get("customer") or not body.get("plan"):
+            return self._error(400, "Customer and plan are required")
+        return self._ok("Subscription successfully created", {
+            "customer": body["customer"],
+            "plan": body["plan"],
+            "authorization": body.get("authorization"),
+            "subscription_code": _code("SUB"),
+            "email_token": _code("TOK"),
+            "status": "active",
+            "createdAt": _now(),
+        })
+
+    def handle_disable_subscription(self, body, path):
+        if not re.match(r"SUB_\w+", body.get("code") or ""):
+            return self._error(400, "Subscription not found")
+        return self._ok("Subscription disabled successfully")
@@ -0,0 +1,133 @@
+"""
+Append-only subscription event ledger (:class:`~subscriptions.models.SubscriptionEvent`).
+
+The code paths that change a ``Subscription`` (webhooks, the payment
+callback, the billing run, expiry, the subscription API) build their
+entries with :func:`entry` and write them with one :func:`record` call, in
+the same transaction as the change, so a rolled back change leaves no
+entry. Entries with a Paystack reference are unique per (reference,
+event_type, source): a retried callback, webhook or billing chunk doesn't
+record its events twice.
+
+Every entry snapshots the subscription right after the change (status,
+plan, amount, period ends), so:
+
+* :func:`timeline` answers "why was I charged" with a keyset-paginated
+  walk down the ``(user_id, created_at, id)`` index;
+* :func:`rebuild_state` reconstructs a user's subscription from their
+  latest entry, one index lookup.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import SubscriptionEvent
+
+DEFAULT_TIMELINE_LIMIT = 20
+
+# Served from the covering timeline index; ``details`` adds ``data``
+SUMMARY_FIELDS = ("id", "event_type", "source", "status", "plan", "amount", "reference", "created_at")
+
+# Subscription fields copied into ``data`` so state can be rebuilt from the ledger
+SNAPSHOT_FIELDS = ("trial_end", "current_period_start", "current_period_end", "subscription_code", "payment_method_id")
+
+
+class InvalidTimelineParams(ValueError):
+    pass
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def entry(event_type, source, user_id=None, subscription=None, reference="", amount=None, status="", plan="", **data):
+    """
+    An unsaved ledger entry. ``subscription`` (as it is after the change)
+    supplies the user, status, plan and snapshot; without one, pass them and
+    any snapshot fields explicitly.
+    """
+    if subscription is not None:
+        user_id = user_id or subscription.user_id
+        status, plan = subscription.status, subscription.plan
+        snapshot = {field: getattr(subscription, field) for field in SNAPSHOT_FIELDS}
+        snapshot["subscription_amount"] = float(subscription.amount or 0)
+        data = {**snapshot, **data}
+    return SubscriptionEvent(
+        user_id=user_id,
+        event_type=event_type,
+        source=source,
+        status=status,
+        plan=plan,
+        amount=amount,
+        reference=reference or "",
+        data={key: _json_value(value) for key, value in data.items()},
+    )
+
+
+def record(entries):
+    entries = [e for e in entries if e is not None]
+    if entries:
+        SubscriptionEvent.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    return entries
+
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidTimelineParams('Invalid cursor')
+
+
+def timeline(user_id, limit=DEFAULT_TIMELINE_LIMIT, cursor=None, details=False):
+    """
+    One page of a user's events, newest first. Returns ``{"events": [...],
+    "next_cursor": ...}``; raises :class:`InvalidTimelineParams` on bad input.
+    """
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidTimelineParams('limit must be an integer')
+    if not 1 <= limit <= settings.SUBSCRIPTION_TIMELINE_MAX_LIMIT:
+        raise InvalidTimelineParams(f'limit must be between 1 and {settings.SUBSCRIPTION_TIMELINE_MAX_LIMIT}')
+
+    events = SubscriptionEvent.objects.filter(user_id=user_id)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        events = events.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    fields = SUMMARY_FIELDS + ("data",) if details else SUMMARY_FIELDS
+    rows = list(events.order_by("-created_at", "-id").values(*fields)[:limit + 1])
+
+    page, more = rows[:limit], len(rows) > limit
+    next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"]) if more else None
+    for row in page:
+        row["created_at"] = row["created_at"].isoformat()
+        row["amount"] = float(row["amount"]) if row["amount"] is not None else None
+    return {"events": page, "next_cursor": next_cursor}
+
+
+def rebuild_state(user_id):
+    """The user's subscription as of their latest ledger entry that has one, or None."""
+    latest = (
+        SubscriptionEvent.objects.filter(user_id=user_id)
+        .exclude(status="")
+        .order_by("-created_at", "-id")
+        .values("status", "plan", "data", "created_at")
+        .first()
+    )
+    if latest is None:
+        return None
+    data = latest.pop("data")
+    return {
+        **latest,
+        "amount": data.get("subscription_amount"),
+        **{field: data.get(field) for field in SNAPSHOT_FIELDS},
+    }
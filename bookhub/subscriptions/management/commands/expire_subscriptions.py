@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from subscriptions.expiry import sweep
+from subscriptions.models import LAPSED_STATUS
+
+
+class Command(BaseCommand):
+    help = 'Mark trials and paid periods that have ended as expired / past_due'
+
+    def handle(self, *args, **options):
+        expired = sweep()
+        summary = ", ".join(
+            f"{len(user_ids)} {status} -> {LAPSED_STATUS[status]}" for status, user_ids in expired.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Expiry sweep done: {summary}"))
@@ -0,0 +1,40 @@
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.fake_paystack import FakePaystackHandler, FakePaystackState
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the Paystack API. Point PAYSTACK_BASE_URL at it '
+        '(e.g. PAYSTACK_BASE_URL=http://127.0.0.1:8766) to test and benchmark the subscription flows offline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--latency', type=float, default=0.15, help='Fixed delay per request in seconds')
+        parser.add_argument('--jitter', type=float, default=0.1, help='Extra random delay of up to this many seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+
+    def handle(self, *args, **options):
+        base_url = f"http://{options['host']}:{options['port']}"
+        state = FakePaystackState(
+            base_url,
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+        )
+        handler = type('BoundFakePaystackHandler', (FakePaystackHandler,), {'state': state})
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        server.daemon_threads = True
+
+        self.stdout.write(self.style.SUCCESS(f"Fake Paystack listening on {base_url}"))
+        self.stdout.write(f"Request counts: {base_url}/__stats (reset with {base_url}/__reset)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
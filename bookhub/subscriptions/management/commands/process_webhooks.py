@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subscriptions.models import WebhookEvent
+from subscriptions.webhooks import drain, due_keys
+
+
+class Command(BaseCommand):
+    help = 'Process stored Paystack webhook events that are due (retries and anything a worker left behind)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            type=float,
+            default=0,
+            metavar='SECONDS',
+            help='Keep running, processing due events every SECONDS (the fly.io "webhooks" process)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            return self.process()
+        while True:
+            close_old_connections()
+            try:
+                self.process(quiet=True)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Webhook processing failed: {e}"))
+            time.sleep(options['loop'])
+
+    def process(self, quiet=False):
+        keys = due_keys()
+        processed = sum(drain(key) for key in keys)
+        if quiet and not keys:
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} webhook event(s) across {len(keys)} key(s)"))
+        dead = WebhookEvent.objects.filter(status="dead").count()
+        if dead:
+            self.stdout.write(self.style.WARNING(f"{dead} dead-lettered webhook event(s) need attention"))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0008_billingrun'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'trialing')), fields=['trial_end'], name='sub_trialing_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['current_period_end'], name='sub_active_period_end_idx'),
+        ),
+    ]
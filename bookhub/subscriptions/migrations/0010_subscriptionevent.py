@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 01:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0009_subscription_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriptionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.UUIDField()),
+                ('event_type', models.CharField(choices=[('card_saved', 'Card saved'), ('trial_started', 'Trial started'), ('subscription_activated', 'Subscription activated'), ('subscription_renewed', 'Subscription renewed'), ('charge_succeeded', 'Charge succeeded'), ('charge_failed', 'Charge failed'), ('refunded', 'Refunded'), ('subscription_canceled', 'Subscription canceled'), ('subscription_expired', 'Subscription expired')], max_length=50)),
+                ('source', models.CharField(choices=[('webhook', 'Paystack webhook'), ('callback', 'Payment callback'), ('billing', 'Trial billing run'), ('expiry', 'Expiry'), ('api', 'API')], max_length=20)),
+                ('status', models.CharField(blank=True, default='', max_length=20)),
+                ('plan', models.CharField(blank=True, default='', max_length=20)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('reference', models.CharField(blank=True, default='', max_length=255)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', '-created_at', '-id'], include=('event_type', 'source', 'status', 'plan', 'amount', 'reference'), name='subevent_user_timeline_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('reference', ''), _negated=True), fields=('reference', 'event_type', 'source'), name='subevent_unique_reference')],
+            },
+        ),
+    ]
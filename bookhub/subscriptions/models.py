@@ -28,6 +28,13 @@ class PaymentMethod(models.Model):
     def __str__(self):
         return f"PaymentMethod for {self.user_id}, {self.card_type}, (****{self.last4})"
 
+# What a trialing / active subscription becomes once its trial or paid period is over
+LAPSED_STATUS = {
+    "trialing": "expired",
+    "active": "past_due",
+}
+
+
 class Subscription(models.Model):
     """
     Represents a trial or paid subscription.
@@ -72,6 +79,9 @@ class Subscription(models.Model):
             models.Index(fields=['user_id', 'status']),
             models.Index(fields=['user_id', 'trial_used']),
             models.Index(fields=['subscription_code']),
+            # Range scans for the expiry sweep and the trial billing run
+            models.Index(fields=['trial_end'], condition=models.Q(status="trialing"), name='sub_trialing_end_idx'),
+            models.Index(fields=['current_period_end'], condition=models.Q(status="active"), name='sub_active_period_end_idx'),
         ]
 
     def in_trial(self):
@@ -119,4 +129,133 @@ class Subscription(models.Model):
         return True, "Eligible for trial"
 
     def __str__(self):
-        return f"Subscription for {self.user_id} ({self.status} - {self.plan})"
\ No newline at end of file
+        return f"Subscription for {self.user_id} ({self.status} - {self.plan})"
+
+class WebhookEvent(models.Model):
+    """
+    A Paystack webhook delivery, stored before it is processed
+    (see subscriptions/webhooks.py). ``event_id`` makes redeliveries no-ops;
+    events sharing an ``ordering_key`` (the user, or the event itself when
+    no user can be found) are processed one at a time in the order received.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("retrying", "Retrying"),
+        ("processed", "Processed"),
+        ("dead", "Dead"),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    ordering_key = models.CharField(max_length=255)
+    payload = models.JSONField()
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ordering_key', 'received_at']),
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"WebhookEvent {self.event_id} ({self.status})"
+
+
+class BillingRun(models.Model):
+    """
+    Checkpoint of a trial-expiry billing run (subscriptions/billing.py).
+    ``last_subscription_id`` is advanced after each chunk is written back,
+    so a crashed run resumes after the last completed chunk.
+    """
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="running")
+    cutoff = models.DateTimeField()  # trials ending at or before this are billed
+    last_subscription_id = models.BigIntegerField(default=0)
+
+    charged = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    canceled = models.PositiveIntegerField(default=0)
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return f"BillingRun {self.pk} ({self.status}, up to #{self.last_subscription_id})"
+
+
+class SubscriptionEvent(models.Model):
+    """
+    Append-only ledger of subscription and billing changes (see
+    subscriptions/ledger.py). Each row records what happened, where it came
+    from and the subscription's status and plan right after it. Rows are
+    only ever inserted, in bulk, in the same transaction as the change; an
+    event already recorded for the same reference is skipped.
+    """
+    EVENT_TYPES = [
+        ("card_saved", "Card saved"),
+        ("trial_started", "Trial started"),
+        ("subscription_activated", "Subscription activated"),
+        ("subscription_renewed", "Subscription renewed"),
+        ("charge_succeeded", "Charge succeeded"),
+        ("charge_failed", "Charge failed"),
+        ("refunded", "Refunded"),
+        ("subscription_canceled", "Subscription canceled"),
+        ("subscription_expired", "Subscription expired"),
+    ]
+
+    SOURCES = [
+        ("webhook", "Paystack webhook"),
+        ("callback", "Payment callback"),
+        ("billing", "Trial billing run"),
+        ("expiry", "Expiry"),
+        ("api", "API"),
+    ]
+
+    user_id = models.UUIDField()  # Supabase user.id
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPES)
+    source = models.CharField(max_length=20, choices=SOURCES)
+    status = models.CharField(max_length=20, blank=True, default="")  # subscription status after the event
+    plan = models.CharField(max_length=20, blank=True, default="")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # in dollars
+    reference = models.CharField(max_length=255, blank=True, default="")  # Paystack reference or webhook event id
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Keyset-paginated timeline; INCLUDE makes the summary listing an index-only scan on PostgreSQL
+            models.Index(
+                fields=['user_id', '-created_at', '-id'],
+                include=['event_type', 'source', 'status', 'plan', 'amount', 'reference'],
+                name='subevent_user_timeline_idx',
+            ),
+        ]
+        constraints = [
+            # A retried callback/webhook or a resumed billing chunk records its events once
+            models.UniqueConstraint(
+                fields=['reference', 'event_type', 'source'],
+                condition=~models.Q(reference=""),
+                name='subevent_unique_reference',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("SubscriptionEvent rows are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"SubscriptionEvent {self.event_type} for {self.user_id} ({self.source})"
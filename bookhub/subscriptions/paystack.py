@@ -0,0 +1,105 @@
+"""
+Paystack API client shared by the helpers in ``subscriptions/utils.py``.
+
+One pooled ``requests.Session`` per process, so calls reuse the TLS
+connections to Paystack instead of opening a new one each time. Timeouts
+are split into connect (PAYSTACK_CONNECT_TIMEOUT) and read
+(PAYSTACK_READ_TIMEOUT).
+
+Retries (PAYSTACK_RETRIES, with exponential backoff and ``Retry-After``) are
+limited to requests that are safe to repeat:
+
+* GETs (verify, lookups) on connection errors, read timeouts, 429 and 5xx;
+* every request when the connection could not be established, since
+  nothing reached Paystack.
+
+A POST that may have been received is never resent, e.g. a charge that
+timed out while its response was on the way. Callers resolve those by
+reference (see ``subscriptions/billing.py``).
+
+Every call is timed and traced through ``bookhub.metrics.external_call``
+under the ``paystack`` service. Point PAYSTACK_BASE_URL at the
+``fake_paystack`` server to run tests and benchmarks offline.
+"""
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from bookhub.metrics import external_call
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PaystackClient:
+    def __init__(self, secret_key, base_url, connect_timeout=3.05, read_timeout=20, retries=2, pool_size=20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {secret_key}",
+            "Content-Type": "application/json",
+        })
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=0.3,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def call(self, method, path, operation, **kwargs):
+        """
+        The decoded JSON body of a successful call, or ``{"status": False,
+        "message": ...}`` carrying Paystack's own error message when there is one.
+        """
+        @external_call("paystack", operation)
+        def send():
+            try:
+                resp = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                return {"status": False, "message": str(e)}
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            if resp.ok and isinstance(body, dict) and body:
+                return body
+            message = body.get("message") if isinstance(body, dict) else None
+            return {"status": False, "message": message or resp.text or resp.reason, "http_status": resp.status_code}
+        return send()
+
+    def get(self, path, operation, **kwargs):
+        return self.call("GET", path, operation, **kwargs)
+
+    def post(self, path, operation, payload):
+        return self.call("POST", path, operation, json=payload)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaystackClient(
+                    settings.PAYSTACK_SECRET_KEY,
+                    settings.PAYSTACK_BASE_URL,
+                    connect_timeout=settings.PAYSTACK_CONNECT_TIMEOUT,
+                    read_timeout=settings.PAYSTACK_READ_TIMEOUT,
+                    retries=settings.PAYSTACK_RETRIES,
+                    pool_size=settings.PAYSTACK_POOL_SIZE,
+                )
+    return _client
@@ -1,3 +1,331 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import billing, paystack, verification, webhooks
+from .entitlements import get_entitlement, subscription_status
+from .fake_paystack import FakePaystackHandler, FakePaystackState
+from .models import BillingRun, PaymentMethod, Subscription, SubscriptionEvent, WebhookEvent
+from .utils import charge_authorization, verify_transaction
+from .webhooks import handle_invoice_payment_succeeded
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients that time out close the socket before the fake answers
+
+
+class FakePaystackMixin:
+    """Runs the fake Paystack server for the test class and points the Paystack client at it."""
+
+    client_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = _QuietServer(("127.0.0.1", 0), FakePaystackHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.server.RequestHandlerClass = type("Handler", (FakePaystackHandler,), {"state": FakePaystackState(cls.base_url)})
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.paystack = self.server.RequestHandlerClass.state
+        self.paystack.reset()
+        self.paystack.latency = 0.0
+        patcher = mock.patch.object(paystack, "_client", paystack.PaystackClient("sk_test", self.base_url, **self.client_options))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def webhook(event_type, **data):
+    event = {"event": event_type, "data": data}
+    return event, json.dumps(event).encode()
+
+
+@override_settings(WEBHOOK_RETRY_BASE=60, WEBHOOK_MAX_ATTEMPTS=3)
+class WebhookQueueTests(FakePaystackMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.handled = []
+        self.failures = {}
+        patcher = mock.patch.dict(webhooks.HANDLERS, {"test.step": self.step})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def step(self, data):
+        if self.failures.get(data["id"], 0):
+            self.failures[data["id"]] -= 1
+            raise RuntimeError(f"step {data['id']} failed")
+        self.handled.append(data["id"])
+
+    def deliver(self, user_id, step_id):
+        event, body = webhook("test.step", id=step_id, metadata={"user_id": str(user_id)})
+        return webhooks.record_event(event, body)[0]
+
+    def make_due(self, *events):
+        WebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(next_attempt_at=timezone.now())
+
+    def test_duplicate_delivery_refunds_the_trial_once(self):
+        user_id = uuid.uuid4()
+        tx = self.paystack.add_transaction("ref_trial", amount=5000)
+        event, body = webhook(
+            "charge.success", id=tx["id"], reference="ref_trial", amount=5000,
+            metadata={"user_id": str(user_id), "type": "subscription_payment", "plan": "trial"},
+        )
+
+        first, created = webhooks.record_event(event, body)
+        self.assertTrue(created)
+        self.assertFalse(webhooks.record_event(event, body)[1])
+        webhooks.drain(first.ordering_key)
+
+        # Redelivered after it was processed: stored once, nothing left to run
+        self.assertFalse(webhooks.record_event(event, body)[1])
+        self.assertEqual(webhooks.drain(first.ordering_key), 0)
+
+        self.assertEqual(WebhookEvent.objects.get().status, "processed")
+        self.assertEqual(self.paystack.snapshot().get("refund"), 1)
+        self.assertEqual(Subscription.objects.get(user_id=user_id).status, "trialing")
+        self.assertEqual(SubscriptionEvent.objects.filter(user_id=user_id, event_type="refunded").count(), 1)
+
+    def test_failing_event_is_retried_then_dead_lettered(self):
+        user_id = uuid.uuid4()
+        self.failures[1] = 10
+        failing = self.deliver(user_id, 1)
+        later = self.deliver(user_id, 2)
+
+        for attempt in range(1, 4):
+            webhooks.drain(failing.ordering_key)
+            failing.refresh_from_db()
+            self.assertEqual(failing.attempts, attempt)
+            if attempt < 3:
+                self.assertEqual(failing.status, "retrying")
+                self.assertGreater(failing.next_attempt_at, timezone.now())
+                self.assertEqual(self.handled, [])  # not due yet, and it holds up the user's next event
+                self.make_due(failing)
+
+        self.assertEqual(failing.status, "dead")
+        self.assertIn("step 1 failed", failing.last_error)
+        later.refresh_from_db()
+        self.assertEqual(later.status, "processed")
+        self.assertEqual(self.handled, [2])
+
+    def test_events_of_a_user_run_in_order_received(self):
+        user_id, other_user = uuid.uuid4(), uuid.uuid4()
+        self.failures[1] = 1
+        first = self.deliver(user_id, 1)
+        second = self.deliver(user_id, 2)
+        other = self.deliver(other_user, 3)
+        self.assertEqual(first.ordering_key, second.ordering_key)
+        self.assertNotEqual(first.ordering_key, other.ordering_key)
+
+        for event in (first, second, other):
+            webhooks.drain(event.ordering_key)
+        self.assertEqual(self.handled, [3])  # another user's event isn't held up
+
+        self.make_due(first)
+        webhooks.drain(first.ordering_key)
+        self.assertEqual(self.handled, [3, 1, 2])
+
+    def test_events_without_metadata_are_keyed_by_the_subscription_owner(self):
+        user_id = uuid.uuid4()
+        Subscription.objects.create(user_id=user_id, status="active", plan="monthly", subscription_code="SUB_owner")
+        metadata_event = self.deliver(user_id, 1)
+
+        event, body = webhook("subscription.disable", subscription_code="SUB_owner")
+        disable_event = webhooks.record_event(event, body)[0]
+
+        self.assertEqual(disable_event.ordering_key, metadata_event.ordering_key)
+
+
+@override_settings(BILLING_CHUNK_SIZE=2, BILLING_CONCURRENCY=2)
+class BillingRunTests(FakePaystackMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trials = []
+        for i in range(5):
+            card = PaymentMethod.objects.create(user_id=uuid.uuid4(), authorization_code=f"AUTH_trial{i}", customer_code=f"CUS_{i}")
+            self.trials.append(Subscription.objects.create(
+                user_id=card.user_id, payment_method=card, trial_end=timezone.now() - timedelta(hours=1),
+            ))
+
+    def test_resumed_run_does_not_charge_twice(self):
+        real_record = billing.record
+        chunks = []
+
+        def crash_on_second_chunk(entries):
+            chunks.append(1)
+            if len(chunks) == 2:
+                raise RuntimeError("worker killed")
+            return real_record(entries)
+
+        # The second chunk is charged at Paystack but never written back
+        with mock.patch.object(billing, "record", crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                billing.run_billing(test_mode=True)
+
+        crashed = BillingRun.objects.get()
+        self.assertEqual((crashed.status, crashed.last_subscription_id, crashed.charged), ("failed", self.trials[1].pk, 2))
+        self.assertEqual(len(self.paystack.transactions), 4)
+
+        run = billing.run_billing(test_mode=True)
+
+        self.assertEqual(run.pk, crashed.pk)
+        self.assertEqual((run.status, run.charged, run.failed), ("completed", 5, 0))
+        # The retried chunk's charges were refused as duplicates and resolved by verifying them
+        self.assertEqual(len(self.paystack.transactions), 5)
+        self.assertEqual(self.paystack.snapshot()["charge_authorization"], 7)
+        self.assertEqual(self.paystack.snapshot()["verify"], 2)
+        self.assertEqual(Subscription.objects.filter(status="active", plan="monthly").count(), 5)
+        self.assertEqual(SubscriptionEvent.objects.filter(event_type="charge_succeeded").count(), 5)
+
+
+class PaystackClientTests(FakePaystackMixin, TestCase):
+    client_options = {"read_timeout": 0.2, "retries": 1}
+
+    def wait_for(self, reference):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if tx := self.paystack.get_transaction(reference):
+                return tx
+            time.sleep(0.05)
+        self.fail(f"{reference} never reached the fake Paystack")
+
+    def test_charge_is_not_resent_after_a_read_timeout(self):
+        self.paystack.latency = 0.5
+
+        resp = charge_authorization("AUTH_slow", "test@example.com", 50000, reference="ref_slow")
+
+        self.assertFalse(resp["status"])
+        self.assertEqual(self.wait_for("ref_slow")["status"], "success")  # Paystack did charge
+        time.sleep(0.6)  # long enough for a resent charge to land too
+        self.assertEqual(self.paystack.snapshot()["charge_authorization"], 1)
+
+        # Safe to repeat, so the lookup that resolves it is retried
+        self.assertFalse(verify_transaction("ref_slow")["status"])
+        self.assertEqual(self.paystack.snapshot()["verify"], 2)
+        self.paystack.latency = 0.0
+        self.assertEqual(verify_transaction("ref_slow")["data"]["status"], "success")
+
+
+class VerificationCacheTests(FakePaystackMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.paystack.add_transaction(
+            "ref_card", amount=5000, metadata={"user_id": "42"},
+            authorization={"authorization_code": "AUTH_card", "last4": "4081", "bin": "408408", "signature": "SIG_x", "reusable": True},
+            customer={"customer_code": "CUS_card", "email": "reader@example.com", "phone": "+2348000000000"},
+        )
+
+    def test_terminal_result_is_cached_without_the_customer_details(self):
+        with mock.patch.object(verification.cache, "set", wraps=verification.cache.set) as cache_set:
+            fresh = verification.verify_transaction_cached("ref_card")
+        cached = verification.verify_transaction_cached("ref_card")
+
+        self.assertEqual(self.paystack.snapshot()["verify"], 1)
+        self.assertEqual(fresh["data"]["customer"]["email"], "reader@example.com")
+        self.assertEqual(cached["data"]["customer"], {"customer_code": "CUS_card"})
+        self.assertEqual(cached["data"]["authorization"], {"authorization_code": "AUTH_card", "last4": "4081", "reusable": True})
+        self.assertEqual((cached["data"]["status"], cached["data"]["amount"], cached["data"]["metadata"]), ("success", 5000, {"user_id": "42"}))
+        self.assertEqual(cache_set.call_args.kwargs["timeout"], settings.VERIFICATION_RESULT_TIMEOUT)
+
+    def test_concurrent_threads_share_one_verification(self):
+        self.paystack.latency = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(verification.verify_transaction_cached("ref_card"))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.paystack.snapshot()["verify"], 1)
+        self.assertEqual([r["data"]["status"] for r in results], ["success"] * 5)
+
+    def test_waits_for_the_result_of_another_process(self):
+        key = verification.verification_key("ref_card")
+        cache.add(f"{key}:lock", 1)  # another worker is verifying
+        written = {"status": True, "message": "Verification successful", "data": {"reference": "ref_card", "status": "success"}}
+        threading.Timer(0.2, cache.set, (key, written)).start()
+
+        self.assertEqual(verification.verify_transaction_cached("ref_card"), written)
+        self.assertNotIn("verify", self.paystack.snapshot())
+
+    @override_settings(VERIFICATION_COALESCE_WAIT=0.2)
+    def test_verifies_itself_when_the_other_process_gives_up(self):
+        cache.add(f"{verification.verification_key('ref_card')}:lock", 1)
+
+        self.assertEqual(verification.verify_transaction_cached("ref_card")["data"]["status"], "success")
+        self.assertEqual(self.paystack.snapshot()["verify"], 1)
+
+
+class EntitlementExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.subscription = Subscription.objects.create(
+            user_id=uuid.uuid4(), plan="monthly", status="active",
+            current_period_end=timezone.now() - timedelta(minutes=1),
+        )
+
+    def test_lapsed_period_is_persisted_once(self):
+        self.assertEqual(subscription_status(self.subscription.user_id)["status"], "past_due")
+        self.assertEqual(subscription_status(self.subscription.user_id)["status"], "past_due")
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, "past_due")
+        self.assertEqual(SubscriptionEvent.objects.filter(event_type="subscription_expired").count(), 1)
+
+    def test_renewal_after_the_record_was_cached_is_not_expired(self):
+        get_entitlement(self.subscription.user_id)  # cached before the renewal commits
+        Subscription.objects.filter(pk=self.subscription.pk).update(current_period_end=timezone.now() + timedelta(days=30))
+
+        status = subscription_status(self.subscription.user_id)
+
+        self.assertEqual((status["status"], status["has_access"]), ("active", True))
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, "active")
+        self.assertFalse(SubscriptionEvent.objects.filter(event_type="subscription_expired").exists())
+        self.assertEqual(get_entitlement(self.subscription.user_id)["status"], "active")
+
+
+class InvoicePaymentSucceededTests(TestCase):
+    def setUp(self):
+        self.subscription = Subscription.objects.create(
+            user_id=uuid.uuid4(),
+            plan="monthly",
+            status="past_due",
+            subscription_code="SUB_renew",
+            current_period_end=timezone.now() - timedelta(days=1),
+        )
+
+    def test_renewal_reactivates_lapsed_subscription(self):
+        handle_invoice_payment_succeeded({
+            "subscription": {"subscription_code": "SUB_renew"},
+            "invoice_code": "INV_1",
+            "amount": 50000,
+        })
+
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, "active")
+        self.assertGreater(self.subscription.current_period_end, timezone.now() + timedelta(days=29))
+        self.assertTrue(self.subscription.is_active())
+
+        event = SubscriptionEvent.objects.get(user_id=self.subscription.user_id)
+        self.assertEqual((event.event_type, event.status, event.reference), ("subscription_renewed", "active", "INV_1"))
@@ -0,0 +1,136 @@
+"""
+Cached, coalesced ``verify_transaction`` for the payment views.
+
+The frontend retries the Paystack callbacks, so ``payment_callback``,
+``verify_card``, ``verify_card_update`` and ``card_update_callback`` often
+verify the same reference several times within seconds. Results are cached
+by reference:
+
+* terminal outcomes (success, failed, abandoned) never change, so they are
+  kept for VERIFICATION_RESULT_TIMEOUT seconds (days);
+* anything else Paystack reports (ongoing, pending, ...) is kept for
+  VERIFICATION_PENDING_TIMEOUT seconds;
+* errors (unknown reference, timeouts) are not cached.
+
+Only the fields the payment views read are cached (see :func:`cached_fields`),
+not Paystack's full payload with the customer's details, card BIN and
+signature, or the transaction log. The authorization code stays: the views
+store or look up the card by it, so a retried callback must see it too.
+
+Concurrent verifications of one reference make a single upstream call: the
+threads of a process share the leader's result, and across processes a
+short cache lock makes the other workers wait (up to
+VERIFICATION_COALESCE_WAIT) for the leader's cached result.
+
+``billing.charge`` keeps calling ``verify_transaction`` directly: it only
+verifies when a charge outcome is in doubt, and must see Paystack's answer.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from bookhub.metrics import record_cache
+
+from .utils import verify_transaction
+
+TERMINAL_STATUSES = ("success", "failed", "abandoned")
+
+TRANSACTION_FIELDS = ("id", "reference", "status", "amount", "currency", "gateway_response", "paid_at", "metadata")
+CUSTOMER_FIELDS = ("customer_code",)
+AUTHORIZATION_FIELDS = ("authorization_code", "last4", "card_type", "bank", "exp_month", "exp_year", "reusable")
+
+POLL_INTERVAL = 0.05
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = {"status": False, "message": "Verification failed"}
+
+
+def verification_key(reference):
+    return f"paystack_verify:{reference}"
+
+
+def cache_timeout(resp):
+    """Cache timeout for a verify response, or False to not cache it."""
+    if not resp.get("status") or not isinstance(resp.get("data"), dict):
+        return False
+    if resp["data"].get("status") in TERMINAL_STATUSES:
+        return settings.VERIFICATION_RESULT_TIMEOUT
+    return settings.VERIFICATION_PENDING_TIMEOUT
+
+
+def _pick(data, fields):
+    return {field: data[field] for field in fields if field in data}
+
+
+def cached_fields(resp):
+    """The part of a verify response that is cached: what the payment views read."""
+    data = resp["data"]
+    return {
+        "status": resp["status"],
+        "message": resp.get("message"),
+        "data": {
+            **_pick(data, TRANSACTION_FIELDS),
+            "customer": _pick(data.get("customer") or {}, CUSTOMER_FIELDS),
+            "authorization": _pick(data.get("authorization") or {}, AUTHORIZATION_FIELDS),
+        },
+    }
+
+
+def verify_transaction_cached(reference):
+    key = verification_key(reference)
+    cached = cache.get(key)
+    if cached is not None:
+        record_cache(key, "hit")
+        return cached
+
+    with _inflight_lock:
+        call = _inflight.get(reference)
+        leader = call is None
+        if leader:
+            call = _inflight[reference] = _Call()
+    if not leader:
+        call.done.wait()
+        record_cache(key, "coalesced")
+        return call.result
+
+    try:
+        call.result = _verify(reference, key)
+    finally:
+        with _inflight_lock:
+            del _inflight[reference]
+        call.done.set()
+    return call.result
+
+
+def _verify(reference, key):
+    """One upstream verification per reference across processes, as far as possible."""
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, 1, timeout=settings.PAYSTACK_CONNECT_TIMEOUT + settings.PAYSTACK_READ_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + settings.VERIFICATION_COALESCE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            cached = cache.get(key)
+            if cached is not None:
+                record_cache(key, "coalesced")
+                return cached
+        # The other worker failed (errors aren't cached) or is stuck: ask Paystack ourselves
+
+    record_cache(key, "miss")
+    try:
+        resp = verify_transaction(reference)
+        timeout = cache_timeout(resp)
+        if timeout is not False:
+            cache.set(key, cached_fields(resp), timeout=timeout)
+        return resp
+    finally:
+        if locked:
+            cache.delete(lock_key)
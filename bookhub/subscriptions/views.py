@@ -1,14 +1,23 @@
-from django.http import JsonResponse, HttpResponse
+from django.http import HttpResponse
+from bookhub.http import JsonResponse
+from bookhub.async_views import offload
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from datetime import timedelta
-import json, hmac, hashlib
+import json, hmac, hashlib, uuid
 
 from django.conf import settings
+from django.db import transaction
 from supabase_auth import User
+from customers.auth_utils import supabase_required
 from .models import Subscription, PaymentMethod
-from .utils import initialize_transaction, verify_transaction, refund_transaction
+from .cards import MAX_CARDS_PER_USER, get_card_summary, invalidate_card_summary
+from .entitlements import invalidate_entitlement, subscription_status
+from .ledger import DEFAULT_TIMELINE_LIMIT, InvalidTimelineParams, entry, record, timeline
+from .webhooks import dispatch, record_event
+from .utils import initialize_transaction, refund_transaction
+from .verification import verify_transaction_cached
 from django_ratelimit.decorators import ratelimit
 from django.shortcuts import redirect
 import requests
@@ -52,6 +61,7 @@ def check_trial_eligibility(user_id):
     
     return True, "Eligible for free trial", None
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='10/m', block=True)
@@ -85,6 +95,7 @@ def check_trial_eligibility_endpoint(request):
         return JsonResponse({"error": "Internal server error"}, status=500)
 
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='10/h', block=True)
@@ -143,6 +154,7 @@ def start_trial(request):
             "code": "SERVER_ERROR"
         }, status=500)
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def verify_card(request):
@@ -158,7 +170,7 @@ def verify_card(request):
         if not reference or not user_id:
             return JsonResponse({"error": "Reference and user_id are required"}, status=400)
 
-        resp = verify_transaction(reference)
+        resp = verify_transaction_cached(reference)
         if not resp.get("status"):
             return JsonResponse({"error": "Verification failed"}, status=400)
 
@@ -181,6 +193,7 @@ def verify_card(request):
 
 
         Subscription.objects.filter(user_id=user_id, status="trialing").update(payment_method=pm)
+        invalidate_card_summary(user_id)
 
         return JsonResponse({"success": True, "card_last4": pm.last4})
 
@@ -191,9 +204,13 @@ def verify_card(request):
 
 
 
+@offload(db=True)
 @csrf_exempt
 def paystack_webhook(request):
-    # Verify signature
+    """
+    Verify, store and acknowledge a Paystack event. Processing happens in
+    the background (subscriptions/webhooks.py); redeliveries are no-ops.
+    """
     paystack_signature = request.headers.get('X-Paystack-Signature')
     body = request.body
     
@@ -206,179 +223,41 @@ def paystack_webhook(request):
         hashlib.sha512
     ).hexdigest()
 
-    if computed_signature != paystack_signature:
+    if not hmac.compare_digest(computed_signature, paystack_signature):
         return HttpResponse(status=401)
 
     try:
         event = json.loads(body)
-        event_type = event.get("event")
-        data = event.get("data", {})
-
-        if event_type == "charge.success":
-            metadata = data.get("metadata", {})
-            user_id = metadata.get("user_id")
-            plan_type = metadata.get("plan_type")
-            payment_type = metadata.get("type")
-            plan = metadata.get("plan")  # ADD THIS LINE
-            
-            if not user_id:
-                return HttpResponse(status=400)
-            
-            # 🔥 CRITICAL: CAPTURE AND SAVE CARD AUTHORIZATION
-            authorization_data = data.get("authorization", {})
-            authorization_code = authorization_data.get("authorization_code")
-            reusable = authorization_data.get("reusable", False)
-            
-            if authorization_code and reusable:
-                # Save payment method to database
-                customer_data = data.get("customer", {})
-                
-                try:
-                    payment_method, created = PaymentMethod.objects.update_or_create(
-                        authorization_code=authorization_code,
-                        defaults={
-                            'user_id': user_id,
-                            'customer_code': customer_data.get('customer_code', ''),
-                            'last4': authorization_data.get('last4', ''),
-                            'card_type': authorization_data.get('card_type', ''),
-                            'bank': authorization_data.get('bank', ''),
-                            'exp_month': str(authorization_data.get('exp_month', '')),
-                            'exp_year': str(authorization_data.get('exp_year', '')),
-                            'reusable': reusable
-                        }
-                    )
-                    
-                    if created:
-                        print(f"💳 NEW card saved for user {user_id}: ****{authorization_data.get('last4', '')}")
-                    else:
-                        print(f"💳 EXISTING card updated for user {user_id}: ****{authorization_data.get('last4', '')}")
-                        
-                except Exception as card_error:
-                    print(f"❌ Error saving card: {card_error}")
-            else:
-                if authorization_code:
-                    print(f"⚠️ Card not reusable: {authorization_code}")
-                else:
-                    print("⚠️ No authorization code in webhook")
-
-            # FIXED LOGIC: Check for trial first, then paid subscriptions
-            if payment_type == "subscription_payment" and plan == "trial":
-                # Handle trial verification
-                print(f"🎯 PROCESSING TRIAL for user {user_id}")
-                
-                tx_id = data.get("id")
-                
-                # Refund the trial verification payment
-                refund_response = refund_transaction(tx_id)
-                if refund_response.get("status"):
-                    print(f"💰 Refund successful for trial transaction {tx_id}")
-                else:
-                    print(f"❌ Refund failed: {refund_response.get('message')}")
-
-                # Create trial subscription
-                trial_length_days = 7
-                sub, created = Subscription.objects.get_or_create(
-                    user_id=user_id,
-                    defaults={
-                        "plan": "trial",
-                        "status": "trialing",
-                        "amount": 0,
-                        "trial_used": True,
-                        "trial_end": timezone.now() + timedelta(days=trial_length_days),
-                        "current_period_start": timezone.now(),
-                    },
-                )
-                if not created:
-                    sub.plan = "trial"
-                    sub.status = "trialing"
-                    sub.amount = 0
-                    sub.trial_used = True
-                    sub.trial_end = timezone.now() + timedelta(days=trial_length_days)
-                    sub.current_period_start = timezone.now()
-                    sub.current_period_end = None
-                    sub.save()
-
-                print(f"✅ Trial subscription started for user {user_id}")
-
-            elif payment_type == "subscription_payment" and plan_type in ["monthly", "yearly"]:
-                # Handle paid subscription
-                print(f"💰 Processing paid subscription for user {user_id}, plan: {plan_type}")
-                
-                # Create or update subscription
-                subscription, created = Subscription.objects.get_or_create(
-                    user_id=user_id,
-                    defaults={
-                        "plan": plan_type,
-                        "status": "active",
-                        "amount": 5.00 if plan_type == "monthly" else 50.00,
-                        "current_period_start": timezone.now(),
-                        "current_period_end": timezone.now() + timedelta(days=30 if plan_type == "monthly" else 365),
-                        "trial_used": True,
-                    }
-                )
-                
-                if not created:
-                    subscription.plan = plan_type
-                    subscription.status = "active"
-                    subscription.amount = 5.00 if plan_type == "monthly" else 50.00
-                    subscription.current_period_start = timezone.now()
-                    subscription.current_period_end = timezone.now() + timedelta(days=30 if plan_type == "monthly" else 365)
-                    subscription.trial_used = True
-                    subscription.save()
-                
-                print(f"✅ Paid subscription created for user {user_id}: {plan_type}")
-
-        elif event_type == "subscription.create":
-            # Subscription created in Paystack
-            subscription_code = data.get("subscription_code")
-            customer_code = data.get("customer", {}).get("customer_code")
-            
-            # Find subscription by customer code or other means and update with subscription_code
-            print(f"Subscription created: {subscription_code}")
-
-        elif event_type == "invoice.payment_succeeded":
-            # Recurring payment succeeded
-            subscription_code = data.get("subscription", {}).get("subscription_code")
-            
-            # Update subscription period
-            subscription = Subscription.objects.filter(subscription_code=subscription_code).first()
-            if subscription:
-                subscription.current_period_start = timezone.now()
-                if subscription.plan == "monthly":
-                    subscription.current_period_end = timezone.now() + timedelta(days=30)
-                else:
-                    subscription.current_period_end = timezone.now() + timedelta(days=365)
-                subscription.save()
-                print(f"Recurring payment succeeded for subscription: {subscription_code}")
-
-        elif event_type == "subscription.disable":
-            # Subscription disabled/cancelled
-            subscription_code = data.get("subscription_code")
-            Subscription.objects.filter(subscription_code=subscription_code).update(
-                status="canceled"
-            )
-            print(f"Subscription disabled: {subscription_code}")
-
-        return HttpResponse(status=200)
-        
     except json.JSONDecodeError:
         return HttpResponse(status=400)
+    if not isinstance(event, dict) or not event.get("event"):
+        return HttpResponse(status=400)
+
+    try:
+        webhook_event, created = record_event(event, body)
     except Exception as e:
         print(f"Webhook error: {e}")
         return HttpResponse(status=500)
 
+    if created:
+        dispatch(webhook_event.ordering_key)
+    else:
+        print(f"Duplicate webhook ignored: {webhook_event.event_id}")
+    return HttpResponse(status=200)
+
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import redirect
-from django.http import JsonResponse
+from bookhub.http import JsonResponse
 import requests
 from subscriptions.models import PaymentMethod, Subscription
-from subscriptions.utils import verify_transaction
+from subscriptions.verification import verify_transaction_cached
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
 
 User = get_user_model()
 
+@offload(db=True)
 @csrf_exempt
 def payment_callback(request):
     """
@@ -390,7 +269,7 @@ def payment_callback(request):
         return redirect("/login?error=no_reference")
     
     # Verify the transaction with Paystack
-    verification = verify_transaction(reference)
+    verification = verify_transaction_cached(reference)
     
     if not verification.get('status'):
         return redirect(f"/login?error=verification_failed&message={verification.get('message', 'Unknown error')}")
@@ -425,34 +304,41 @@ def payment_callback(request):
         return redirect("/login?error=user_not_found")
     
     try:
-        # Create or update payment method
-        payment_method, created = PaymentMethod.objects.update_or_create(
-            user_id=user_id,
-            defaults={
-                'authorization_code': authorization_code,
-                'customer_code': transaction_data.get('customer', {}).get('customer_code', ''),
-                'last4': authorization_data.get('last4', ''),
-                'card_type': authorization_data.get('card_type', ''),
-                'bank': authorization_data.get('bank', ''),
-                'exp_month': str(authorization_data.get('exp_month', '')),
-                'exp_year': str(authorization_data.get('exp_year', '')),
-                'reusable': authorization_data.get('reusable', False)
-            }
-        )
+        with transaction.atomic():
+            # Create or update payment method
+            payment_method, created = PaymentMethod.objects.update_or_create(
+                user_id=user_id,
+                defaults={
+                    'authorization_code': authorization_code,
+                    'customer_code': transaction_data.get('customer', {}).get('customer_code', ''),
+                    'last4': authorization_data.get('last4', ''),
+                    'card_type': authorization_data.get('card_type', ''),
+                    'bank': authorization_data.get('bank', ''),
+                    'exp_month': str(authorization_data.get('exp_month', '')),
+                    'exp_year': str(authorization_data.get('exp_year', '')),
+                    'reusable': authorization_data.get('reusable', False)
+                }
+            )
         
-        # Create or update subscription
-        subscription, sub_created = Subscription.objects.update_or_create(
-            user_id=user_id,
-            defaults={
-                'payment_method': payment_method,
-                'plan': 'trial',
-                'status': 'trialing',
-                'trial_start': timezone.now(),
-                'trial_end': timezone.now() + timedelta(days=7),
-                'trial_used': False,
-                'current_period_start': timezone.now(),
-            }
-        )
+            # Create or update subscription
+            subscription, sub_created = Subscription.objects.update_or_create(
+                user_id=user_id,
+                defaults={
+                    'payment_method': payment_method,
+                    'plan': 'trial',
+                    'status': 'trialing',
+                    'trial_start': timezone.now(),
+                    'trial_end': timezone.now() + timedelta(days=7),
+                    'trial_used': False,
+                    'current_period_start': timezone.now(),
+                }
+            )
+            record([
+                entry("card_saved", "callback", user_id=user_id, reference=reference, last4=payment_method.last4) if created else None,
+                entry("trial_started", "callback", subscription=subscription, reference=reference),
+            ])
+        invalidate_entitlement(user_id)
+        invalidate_card_summary(user_id)
         
         # Call logout API (assuming it's exposed at /api/logout/)
         try:
@@ -469,6 +355,7 @@ def payment_callback(request):
         return redirect(f"/login?error=processing_error&message={str(e)}")
 
 
+@offload(db=True)
 @csrf_exempt
 def check_subscription_status(request):
     try:
@@ -478,74 +365,8 @@ def check_subscription_status(request):
         if not user_id:
             return JsonResponse({"error": "user_id is required"}, status=400)
         
-        active_sub = Subscription.objects.filter(user_id=user_id).order_by("-created_at").first()
-
-        if not active_sub:
-            return JsonResponse({
-                "has_access": False,
-                "status": "none",
-                "plan": None,
-                "amount": 0,
-                "trial_end": None,
-                "current_period_end": None,
-                "in_trial": False,
-                "trial_has_ended": False,
-                "days_remaining": 0,
-                "is_active": False,
-                "subscription_code": None,
-                "created_at": None,
-            })
-
-        now = timezone.now()
-        days_remaining = 0
-        in_trial = False
-        trial_has_ended = False
-        status = active_sub.status
-
-        # Check if trial has ended
-        if active_sub.status == "trialing" and active_sub.trial_end:
-            delta = active_sub.trial_end - now
-            days_remaining = max(0, delta.days)
-            in_trial = True
-            trial_has_ended = now > active_sub.trial_end
-            
-            # 🔥 CRITICAL: Update status to "expired" if trial has ended
-            if trial_has_ended:
-                status = "expired"
-                active_sub.status = "expired"
-                active_sub.save()
-
-        # Check if active subscription has ended
-        elif active_sub.status == "active" and active_sub.current_period_end:
-            delta = active_sub.current_period_end - now
-            days_remaining = max(0, delta.days)
-            
-            # 🔥 CRITICAL: Update status to "expired" if period has ended
-            if now > active_sub.current_period_end:
-                status = "expired"
-                # Also update the database record
-                active_sub.status = "expired"
-                active_sub.save()
-
-        # Calculate has_access based on the updated status
-        has_access = status in ["active", "trialing"] and not trial_has_ended
-
-        response = {
-            "has_access": has_access,
-            "status": status,  # Use the updated status
-            "plan": active_sub.plan,
-            "amount": float(active_sub.amount or 0),
-            "trial_end": active_sub.trial_end.isoformat() if active_sub.trial_end else None,
-            "current_period_end": active_sub.current_period_end.isoformat() if active_sub.current_period_end else None,
-            "in_trial": in_trial,
-            "trial_has_ended": trial_has_ended,
-            "days_remaining": days_remaining,
-            "is_active": has_access,  # Use the same logic as has_access
-            "subscription_code": active_sub.subscription_code,
-            "created_at": active_sub.created_at.isoformat() if active_sub.created_at else None,
-        }
-
-        return JsonResponse(response)
+        # Served from the entitlement cache; see subscriptions/entitlements.py
+        return JsonResponse(subscription_status(user_id))
 
     except Exception as e:
         import traceback
@@ -553,9 +374,41 @@ def check_subscription_status(request):
         return JsonResponse({"error": "Internal server error"}, status=500)
 
 
+@offload(db=True)
+@csrf_exempt
+@require_POST
+@supabase_required
+def subscription_timeline(request):
+    """
+    The signed-in user's billing timeline from the subscription event ledger, newest first.
+    Pass the returned next_cursor back as cursor for the next page; details=true adds each event's data.
+    """
+    try:
+        data = json.loads(request.body or "{}")
+        try:
+            user_id = uuid.UUID(str(request.supabase_user.get("sub")))
+        except ValueError:
+            return JsonResponse({"error": "Invalid user id in token"}, status=400)
+
+        return JsonResponse(timeline(
+            user_id,
+            limit=data.get("limit", DEFAULT_TIMELINE_LIMIT),
+            cursor=data.get("cursor"),
+            details=bool(data.get("details")),
+        ))
+
+    except InvalidTimelineParams as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": "Internal server error"}, status=500)
+
+
 from .utils import create_subscription, disable_subscription, PAYSTACK_PLAN_CODES
 
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 @ratelimit(key='ip', rate='5/h', block=True)
@@ -621,6 +474,7 @@ def start_paid_subscription(request):
 
     
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def create_recurring_subscription(request):
@@ -664,7 +518,13 @@ def create_recurring_subscription(request):
         else:
             subscription.current_period_end = timezone.now() + timedelta(days=365)
             
-        subscription.save()
+        with transaction.atomic():
+            subscription.save()
+            record([entry(
+                "subscription_activated", "api", subscription=subscription,
+                reference=subscription.subscription_code, amount=subscription.amount,
+            )])
+        invalidate_entitlement(user_id)
 
         return JsonResponse({
             "success": True,
@@ -680,6 +540,7 @@ def create_recurring_subscription(request):
         return JsonResponse({"error": "Internal server error"}, status=500)
     
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def cancel_subscription(request):
@@ -710,7 +571,10 @@ def cancel_subscription(request):
 
         # Update our record
         subscription.status = "canceled"
-        subscription.save()
+        with transaction.atomic():
+            subscription.save()
+            record([entry("subscription_canceled", "api", subscription=subscription, reference=subscription.subscription_code)])
+        invalidate_entitlement(user_id)
 
         return JsonResponse({
             "success": True,
@@ -774,6 +638,7 @@ def create_test_payment(request):
                 'amount': 0.00
             }
         )
+        invalidate_card_summary(user.id)
         
         return redirect("/login?payment=success&test_mode=true")
         
@@ -789,6 +654,7 @@ import uuid
 from django.core.cache import cache
 
 # Add these views to your existing views.py
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def get_customer_cards(request):
@@ -802,35 +668,14 @@ def get_customer_cards(request):
         if not user_id:
             return JsonResponse({"error": "user_id is required"}, status=400)
             
-        payment_methods = PaymentMethod.objects.filter(user_id=user_id, reusable=True)
-        
-        cards = []
-        for pm in payment_methods:
-            cards.append({
-                "id": pm.id,
-                "authorization_code": pm.authorization_code,
-                "last4": pm.last4,
-                "card_type": pm.card_type,
-                "bank": pm.bank,
-                "exp_month": pm.exp_month,
-                "exp_year": pm.exp_year,
-                "brand": pm.card_type,  # Same as card_type for Paystack
-                "is_default": pm.is_default if hasattr(pm, 'is_default') else False,
-                "created_at": pm.created_at.isoformat() if pm.created_at else None
-            })
-        
-        return JsonResponse({
-            "cards": cards,
-            "card_count": len(cards),
-            "max_cards": 3,
-            "can_add_more": len(cards) < 3
-            })
+        return JsonResponse(get_card_summary(user_id))
         
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
     except Exception as e:
         return JsonResponse({"error": "Internal server error"}, status=500)
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def initialize_card_update(request):
@@ -846,8 +691,7 @@ def initialize_card_update(request):
         if not email or not user_id:
             return JsonResponse({"error": "Email and user_id are required"}, status=400)
 
-        current_card_count = PaymentMethod.objects.filter(user_id=user_id, reusable=True).count()
-        MAX_CARDS_PER_USER = 3
+        current_card_count = get_card_summary(user_id)["card_count"]
         
         if current_card_count >= MAX_CARDS_PER_USER:
             return JsonResponse({
@@ -901,6 +745,7 @@ def initialize_card_update(request):
     except Exception as e:
         return JsonResponse({"error": "Internal server error"}, status=500)
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def verify_card_update(request):
@@ -916,7 +761,7 @@ def verify_card_update(request):
             return JsonResponse({"error": "Reference and user_id are required"}, status=400)
 
         # Verify the transaction with Paystack
-        resp = verify_transaction(reference)
+        resp = verify_transaction_cached(reference)
         if not resp.get("status"):
             return JsonResponse({"error": "Card verification failed"}, status=400)
 
@@ -958,6 +803,7 @@ def verify_card_update(request):
             exp_year=str(authorization_data.get("exp_year", "")),
             reusable=authorization_data.get("reusable", False)
         )
+        invalidate_card_summary(user_id)
 
         # Refund the verification payment (optional)
         try:
@@ -980,6 +826,7 @@ def verify_card_update(request):
     except Exception as e:
         return JsonResponse({"error": "Internal server error"}, status=500)
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def set_default_card(request):
@@ -1016,6 +863,7 @@ def set_default_card(request):
             new_card = PaymentMethod.objects.get(id=card_id)
             active_subscription.payment_method = new_card
             active_subscription.save()
+        invalidate_card_summary(user_id)
 
         return JsonResponse({
             "success": True,
@@ -1027,6 +875,7 @@ def set_default_card(request):
     except Exception as e:
         return JsonResponse({"error": "Internal server error"}, status=500)
 
+@offload(db=True)
 @csrf_exempt
 @require_POST
 def remove_card(request):
@@ -1060,6 +909,7 @@ def remove_card(request):
 
         card_last4 = card.last4
         card.delete()
+        invalidate_card_summary(user_id)
 
         return JsonResponse({
             "success": True,
@@ -1071,6 +921,7 @@ def remove_card(request):
     except Exception as e:
         return JsonResponse({"error": "Internal server error"}, status=500)
 
+@offload(db=True)
 @csrf_exempt
 def card_update_callback(request):
     """
@@ -1082,7 +933,7 @@ def card_update_callback(request):
         return redirect(f"{settings.FRONTEND_URL}/billing?error=no_reference")
     
     # Verify the transaction
-    verification = verify_transaction(reference)
+    verification = verify_transaction_cached(reference)
     
     if not verification.get('status'):
         return redirect(f"{settings.FRONTEND_URL}/billing?error=verification_failed")
@@ -1121,6 +972,7 @@ def card_update_callback(request):
             exp_year=str(authorization_data.get('exp_year', '')),
             reusable=authorization_data.get('reusable', False)
         )
+        invalidate_card_summary(user_id)
         
         # Refund the verification payment
         try:
@@ -1162,6 +1014,7 @@ def test_add_card(request):
             reusable=True,
             is_default=False
         )
+        invalidate_card_summary(user_id)
 
         return JsonResponse({
             "success": True,
@@ -0,0 +1,386 @@
+"""
+Asynchronous Paystack webhook processing.
+
+``paystack_webhook`` only verifies the signature, stores the delivery as a
+:class:`~subscriptions.models.WebhookEvent` and answers 200. Paystack
+redelivers until it gets a 2xx, so anything slow (the trial refund, the
+subscription upserts) happens afterwards on a small worker pool.
+
+* Idempotency: ``event_id`` is unique, so a redelivered event is stored
+  once and processed once.
+* Ordering: all events of a user share one ``ordering_key`` (the user id
+  from the metadata, or looked up from the subscription code or customer)
+  and are processed strictly in the order received.
+  The oldest unfinished event of a key is the only one that may run, and
+  its row is locked while it does.
+* Exactly-once: the handler's writes and the ``processed`` mark commit in
+  the same transaction. A failure rolls the writes back and schedules a
+  retry with exponential backoff; after WEBHOOK_MAX_ATTEMPTS the event is
+  marked ``dead`` and later events of the key go ahead. Paystack refuses a
+  second refund of the same transaction, so retrying a trial event never
+  refunds twice.
+
+Retries are scheduled in the process that failed (a timer re-drains the key
+at ``next_attempt_at``). Events whose timer was lost to a restart or a
+stopped machine are picked up by the due-event sweep every worker runs after
+a drain (at most once per WEBHOOK_RETRY_BASE), and by the ``webhooks``
+process (``manage.py process_webhooks --loop``, see fly.toml).
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from .cards import invalidate_card_summary
+from .entitlements import invalidate_entitlement
+from .ledger import entry, record
+from .models import PaymentMethod, Subscription, WebhookEvent
+from .utils import refund_transaction
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ("pending", "retrying")
+
+_executor = None
+_last_due_sweep = 0.0
+
+
+class InvalidEvent(Exception):
+    """The event can never be processed; it goes straight to the dead letters."""
+
+
+def event_id(event, body):
+    data = event.get("data") or {}
+    subject = data.get("id") or data.get("reference") or data.get("invoice_code") or data.get("subscription_code")
+    if not subject:
+        subject = hashlib.sha256(body).hexdigest()
+    return f"{event.get('event')}:{subject}"
+
+
+def _user_key(user_id):
+    try:
+        return f"user:{uuid.UUID(str(user_id))}"
+    except ValueError:
+        return f"user:{user_id}"
+
+
+def event_user_id(event):
+    """The user an event belongs to: its metadata, else the owner of its subscription or card."""
+    data = event.get("data") or {}
+    metadata = data.get("metadata") or {}
+    if isinstance(metadata, dict) and metadata.get("user_id"):
+        return metadata["user_id"]
+    subscription_code = data.get("subscription_code") or (data.get("subscription") or {}).get("subscription_code")
+    if subscription_code:
+        user_id = Subscription.objects.filter(subscription_code=subscription_code).values_list("user_id", flat=True).first()
+        if user_id:
+            return user_id
+    customer_code = (data.get("customer") or {}).get("customer_code")
+    if customer_code:
+        return PaymentMethod.objects.filter(customer_code=customer_code).values_list("user_id", flat=True).first()
+    return None
+
+
+def ordering_key(event, event_id):
+    """
+    ``user:<id>`` for every event of a user, whatever its type, so they are
+    applied in order. An event that can't be tied to a user gets a key of its
+    own, so it never holds up anything else.
+    """
+    user_id = event_user_id(event)
+    return _user_key(user_id) if user_id else f"event:{event_id}"
+
+
+def record_event(event, body):
+    """Store a verified delivery; returns ``(webhook_event, created)``."""
+    eid = event_id(event, body)
+    return WebhookEvent.objects.get_or_create(
+        event_id=eid,
+        defaults={
+            "event_type": event.get("event", ""),
+            "ordering_key": ordering_key(event, eid),
+            "payload": event,
+        },
+    )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.WEBHOOK_WORKERS, thread_name_prefix="webhooks")
+    return _executor
+
+
+def _submit(key):
+    get_executor().submit(_drain_in_worker, key)
+
+
+def dispatch(key):
+    """Process the open events of ``key`` in the background once the current transaction commits."""
+    transaction.on_commit(lambda: _submit(key))
+
+
+def schedule_retry(key, at):
+    """Drain ``key`` again in the background at ``at``."""
+    timer = threading.Timer(max(0.0, (at - timezone.now()).total_seconds()), _submit, args=(key,))
+    timer.daemon = True
+    timer.start()
+
+
+def _drain_in_worker(key):
+    close_old_connections()
+    try:
+        drain(key)
+        drain_due()
+    except Exception:
+        logger.exception(f"Webhook worker failed for {key}")
+    finally:
+        close_old_connections()
+
+
+def drain_due(min_interval=None):
+    """Drain every key with a due event, at most once per ``min_interval`` seconds per process."""
+    global _last_due_sweep
+    min_interval = settings.WEBHOOK_RETRY_BASE if min_interval is None else min_interval
+    now = time.monotonic()
+    if now - _last_due_sweep < min_interval:
+        return 0
+    _last_due_sweep = now
+    return sum(drain(key) for key in due_keys())
+
+
+def drain(key):
+    """Process due events of ``key`` in order until one is not due, fails or is held elsewhere."""
+    processed = 0
+    while process_next(key):
+        processed += 1
+    return processed
+
+
+def process_next(key):
+    """
+    Process the oldest open event of ``key``. Returns True when it was
+    processed (so the next one may run), False when there is nothing due,
+    the event is being handled by another worker, or it failed.
+    """
+    head = (
+        WebhookEvent.objects.filter(ordering_key=key, status__in=OPEN_STATUSES)
+        .order_by("received_at", "id")
+        .first()
+    )
+    if head is None or head.next_attempt_at > timezone.now():
+        return False
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                event = WebhookEvent.objects.select_for_update(nowait=True).get(pk=head.pk, status__in=OPEN_STATUSES)
+        except (DatabaseError, WebhookEvent.DoesNotExist):
+            return False
+
+        event.attempts += 1
+        try:
+            with transaction.atomic():
+                handle(event.event_type, event.payload.get("data") or {})
+        except Exception as e:
+            event.last_error = f"{type(e).__name__}: {e}"
+            if isinstance(e, InvalidEvent) or event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                event.status = "dead"
+                logger.error(f"Webhook {event.event_id} dead-lettered after {event.attempts} attempt(s): {event.last_error}")
+            else:
+                event.status = "retrying"
+                event.next_attempt_at = timezone.now() + timedelta(seconds=settings.WEBHOOK_RETRY_BASE * 2 ** (event.attempts - 1))
+                transaction.on_commit(lambda: schedule_retry(key, event.next_attempt_at))
+                logger.warning(f"Webhook {event.event_id} failed (attempt {event.attempts}), retrying at {event.next_attempt_at}: {event.last_error}")
+            event.save(update_fields=["status", "attempts", "next_attempt_at", "last_error"])
+            # A dead event no longer holds up the rest of the key
+            return event.status == "dead"
+
+        event.status = "processed"
+        event.processed_at = timezone.now()
+        event.last_error = ""
+        event.save(update_fields=["status", "attempts", "processed_at", "last_error"])
+        return True
+
+
+def due_keys():
+    return list(
+        WebhookEvent.objects.filter(status__in=OPEN_STATUSES, next_attempt_at__lte=timezone.now())
+        .values_list("ordering_key", flat=True)
+        .distinct()
+    )
+
+
+def _invalidate_after_commit(*user_ids):
+    transaction.on_commit(lambda: invalidate_entitlement(*user_ids))
+
+
+def handle(event_type, data):
+    handler = HANDLERS.get(event_type)
+    if handler is None:
+        print(f"Ignoring webhook event: {event_type}")
+        return
+    handler(data)
+
+
+def handle_charge_success(data):
+    metadata = data.get("metadata") or {}
+    user_id = metadata.get("user_id")
+    plan_type = metadata.get("plan_type")
+    payment_type = metadata.get("type")
+    plan = metadata.get("plan")
+
+    if not user_id:
+        raise InvalidEvent("charge.success without metadata.user_id")
+
+    reference = data.get("reference", "")
+    events = []
+
+    # 🔥 CRITICAL: CAPTURE AND SAVE CARD AUTHORIZATION
+    authorization_data = data.get("authorization", {})
+    authorization_code = authorization_data.get("authorization_code")
+    reusable = authorization_data.get("reusable", False)
+
+    if authorization_code and reusable:
+        customer_data = data.get("customer", {})
+        payment_method, created = PaymentMethod.objects.update_or_create(
+            authorization_code=authorization_code,
+            defaults={
+                'user_id': user_id,
+                'customer_code': customer_data.get('customer_code', ''),
+                'last4': authorization_data.get('last4', ''),
+                'card_type': authorization_data.get('card_type', ''),
+                'bank': authorization_data.get('bank', ''),
+                'exp_month': str(authorization_data.get('exp_month', '')),
+                'exp_year': str(authorization_data.get('exp_year', '')),
+                'reusable': reusable
+            }
+        )
+        transaction.on_commit(lambda: invalidate_card_summary(user_id))
+        if created:
+            events.append(entry("card_saved", "webhook", user_id=user_id, reference=reference, last4=payment_method.last4, card_type=payment_method.card_type))
+            print(f"💳 NEW card saved for user {user_id}: ****{authorization_data.get('last4', '')}")
+        else:
+            print(f"💳 EXISTING card updated for user {user_id}: ****{authorization_data.get('last4', '')}")
+    elif authorization_code:
+        print(f"⚠️ Card not reusable: {authorization_code}")
+    else:
+        print("⚠️ No authorization code in webhook")
+
+    if payment_type == "subscription_payment" and plan == "trial":
+        print(f"🎯 PROCESSING TRIAL for user {user_id}")
+
+        tx_id = data.get("id")
+
+        # Refund the trial verification payment
+        refund_response = refund_transaction(tx_id)
+        if refund_response.get("status"):
+            events.append(entry("refunded", "webhook", user_id=user_id, reference=reference, amount=(data.get("amount") or 0) / 100, transaction=tx_id))
+            print(f"💰 Refund successful for trial transaction {tx_id}")
+        else:
+            print(f"❌ Refund failed: {refund_response.get('message')}")
+
+        trial_length_days = 7
+        sub, created = Subscription.objects.get_or_create(
+            user_id=user_id,
+            defaults={
+                "plan": "trial",
+                "status": "trialing",
+                "amount": 0,
+                "trial_used": True,
+                "trial_end": timezone.now() + timedelta(days=trial_length_days),
+                "current_period_start": timezone.now(),
+            },
+        )
+        if not created:
+            sub.plan = "trial"
+            sub.status = "trialing"
+            sub.amount = 0
+            sub.trial_used = True
+            sub.trial_end = timezone.now() + timedelta(days=trial_length_days)
+            sub.current_period_start = timezone.now()
+            sub.current_period_end = None
+            sub.save()
+        events.append(entry("trial_started", "webhook", subscription=sub, reference=reference))
+
+        print(f"✅ Trial subscription started for user {user_id}")
+
+    elif payment_type == "subscription_payment" and plan_type in ["monthly", "yearly"]:
+        print(f"💰 Processing paid subscription for user {user_id}, plan: {plan_type}")
+
+        subscription, created = Subscription.objects.get_or_create(
+            user_id=user_id,
+            defaults={
+                "plan": plan_type,
+                "status": "active",
+                "amount": 5.00 if plan_type == "monthly" else 50.00,
+                "current_period_start": timezone.now(),
+                "current_period_end": timezone.now() + timedelta(days=30 if plan_type == "monthly" else 365),
+                "trial_used": True,
+            }
+        )
+        if not created:
+            subscription.plan = plan_type
+            subscription.status = "active"
+            subscription.amount = 5.00 if plan_type == "monthly" else 50.00
+            subscription.current_period_start = timezone.now()
+            subscription.current_period_end = timezone.now() + timedelta(days=30 if plan_type == "monthly" else 365)
+            subscription.trial_used = True
+            subscription.save()
+        events.append(entry("subscription_activated", "webhook", subscription=subscription, reference=reference, amount=subscription.amount))
+
+        print(f"✅ Paid subscription created for user {user_id}: {plan_type}")
+
+    record(events)
+    _invalidate_after_commit(user_id)
+
+
+def handle_subscription_create(data):
+    # Nothing to store yet; the subscription_code is saved by create_recurring_subscription
+    print(f"Subscription created: {data.get('subscription_code')}")
+
+
+def handle_invoice_payment_succeeded(data):
+    subscription_code = (data.get("subscription") or {}).get("subscription_code")
+    subscription = Subscription.objects.filter(subscription_code=subscription_code).first()
+    if subscription:
+        # A renewal paid after the period ended brings a lapsed (past_due) subscription back
+        subscription.status = "active"
+        subscription.current_period_start = timezone.now()
+        if subscription.plan == "monthly":
+            subscription.current_period_end = timezone.now() + timedelta(days=30)
+        else:
+            subscription.current_period_end = timezone.now() + timedelta(days=365)
+        subscription.save()
+        record([entry(
+            "subscription_renewed", "webhook", subscription=subscription,
+            reference=data.get("invoice_code") or subscription_code, amount=(data.get("amount") or 0) / 100,
+        )])
+        _invalidate_after_commit(subscription.user_id)
+        print(f"Recurring payment succeeded for subscription: {subscription_code}")
+
+
+def handle_subscription_disable(data):
+    subscription_code = data.get("subscription_code")
+    disabled = list(Subscription.objects.filter(subscription_code=subscription_code).exclude(status="canceled"))
+    Subscription.objects.filter(pk__in=[s.pk for s in disabled]).update(status="canceled")
+    for subscription in disabled:
+        subscription.status = "canceled"
+    record(entry("subscription_canceled", "webhook", subscription=s, reference=subscription_code) for s in disabled)
+    _invalidate_after_commit(*{s.user_id for s in disabled})
+    print(f"Subscription disabled: {subscription_code}")
+
+
+HANDLERS = {
+    "charge.success": handle_charge_success,
+    "subscription.create": handle_subscription_create,
+    "invoice.payment_succeeded": handle_invoice_payment_succeeded,
+    "subscription.disable": handle_subscription_disable,
+}